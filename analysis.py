@@ -0,0 +1,218 @@
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from metrics import queue_stats
+from plots import draw_cwnd_plot, draw_fairness_plot, draw_queue_plot
+from trace_cache import cached_parse_iperf, cached_parse_iperf3, cached_parse_sockstats, cached_parse_tcpprobe
+from traces import (iperf3_files, iperf3_origin, iperf_files, iperf_origin, parse_iperf, parse_iperf3,
+                    parse_qdiscstats, parse_sockstats, parse_tcpprobe, qdisc_filename, sockstats_files,
+                    sockstats_origin)
+
+
+def _newer(files, others):
+    # True if every one of `files` was written after all of `others`.
+    return bool(files) and (not others or min(os.path.getmtime(f) for f in files) >=
+                            max(os.path.getmtime(f) for f in others))
+
+
+def iperf_source(alg, delay):
+    # Where the cell's throughput series comes from: ('iperf3', files) for its iperf3 JSON streams,
+    # unless iperf2 logs were written after them, else ('iperf', files).
+    files = iperf3_files(alg, delay)
+    if _newer(files.values(), iperf_files(alg, delay).values()):
+        return 'iperf3', files
+    return 'iperf', iperf_files(alg, delay)
+
+
+def cwnd_source(alg, delay):
+    # Where the cell's cwnd traces come from: ('sockstats', files) for its socket-stats logs, unless
+    # a tcpprobe trace was recorded after them, else ('tcpprobe', filename).
+    filename = 'tcpprobe_{0}_{1}ms.txt'.format(alg, delay)
+    files = sockstats_files(alg, delay)
+    if _newer(files.values(), [filename] if os.path.exists(filename) else []):
+        return 'sockstats', files
+    return 'tcpprobe', filename
+
+
+def cell_origins(alg, delay):
+    # The epochs the cell's throughput and cwnd series count from, so that they (and the queue stats)
+    # can be put on one time base. tcpprobe stamps are not wall-clock times, so that origin is None.
+    kind, files = iperf_source(alg, delay)
+    throughput = iperf3_origin(files) if kind == 'iperf3' else iperf_origin(files)
+    kind, files = cwnd_source(alg, delay)
+    return dict(throughput=throughput, cwnd=sockstats_origin(files) if kind == 'sockstats' else None)
+
+
+def parse_iperf_data(alg, delay, host_addrs, use_cache=True):
+    kind, files = iperf_source(alg, delay)
+    if kind == 'iperf3':
+        print('*** Parsing iperf3 data...')
+        data = cached_parse_iperf3(files) if use_cache else parse_iperf3(files)
+    else:
+        print('*** Parsing iperf data...')
+        data = cached_parse_iperf(files, host_addrs) if use_cache else parse_iperf(files, host_addrs)
+    for flow in sorted(data):
+        if len(data[flow]['time']):
+            print('{0}: time={1}, bandwidth={2}'.format(flow, data[flow]['time'][-1], data[flow]['Mbps'][-1]))
+    return data
+
+
+def sender_addrs(host_addrs):
+    # The senders of {host: ip}: every pair is h<2i+1> -> h<2i+2>. tcp_probe logs the receivers'
+    # sockets too, and those are not flows.
+    return dict((host, addr) for host, addr in host_addrs.items() if host[1:].isdigit() and int(host[1:]) % 2)
+
+
+def parse_tcpprobe_data(alg, delay, host_addrs, use_mmap=False, use_cache=True):
+    kind, source = cwnd_source(alg, delay)
+    if kind == 'sockstats':
+        print('*** Parsing socket-stats data...')
+        return cached_parse_sockstats(source) if use_cache else parse_sockstats(source)
+    print('*** Parsing tcpprobe data...')
+    host_addrs = sender_addrs(host_addrs)
+    if use_cache:
+        return cached_parse_tcpprobe(source, host_addrs, use_mmap=use_mmap)
+    return parse_tcpprobe(source, host_addrs, use_mmap=use_mmap)
+
+
+def parse_queue_data(alg, delay, origins=None):
+    # The cell's qdisc stats on the throughput series' time base, or None if it has no qdisc log as
+    # recent as its throughput logs.
+    filename = qdisc_filename(alg, delay)
+    if not os.path.exists(filename) or not _newer([filename], iperf_source(alg, delay)[1].values()):
+        return None
+    print('*** Parsing qdisc data...')
+    origins = origins or cell_origins(alg, delay)
+    return parse_qdiscstats(filename, origins['throughput'])
+
+
+def align_cwnd(data_cwnd, origins):
+    # data_cwnd shifted onto the throughput series' time base (as is, if the origins are unknown).
+    if origins['cwnd'] is None or origins['throughput'] is None:
+        return data_cwnd
+    shift = origins['cwnd'] - origins['throughput']
+    return dict((flow, dict(cols, time=cols['time'] + shift)) for flow, cols in data_cwnd.items())
+
+
+def process_cell(alg, delay, host_addrs, use_cache=True, plot_format='png'):
+    data_cwnd = parse_tcpprobe_data(alg, delay, host_addrs, use_cache=use_cache)
+    data_fairness = parse_iperf_data(alg, delay, host_addrs, use_cache=use_cache)
+
+    draw_cwnd_plot(dict((flow, (cols['time'], cols['cwnd'])) for flow, cols in data_cwnd.items()
+                        if len(cols['time'])), alg, delay, plot_format)
+    draw_fairness_plot(dict((flow, (cols['time'], cols['Mbps'])) for flow, cols in data_fairness.items()
+                            if len(cols['time'])), alg, delay, plot_format)
+    origins = cell_origins(alg, delay)
+    queues = parse_queue_data(alg, delay, origins)
+    if queues:
+        for intf, stats in sorted(queue_stats(queues).items()):
+            print('{0} ({1}): mean {2:.1f} pkts ({3:.1%} of {4}), max {5}, {6} drops, mean delay {7:.2f}ms'
+                  .format(intf, stats['role'], stats['mean_qlen'], stats['occupancy'], stats['limit'],
+                          stats['max_qlen'], stats['drops'], stats['delay_ms']))
+        draw_queue_plot(data_fairness, align_cwnd(data_cwnd, origins), queues, alg, delay, plot_format)
+
+
+def _process_cell_task(alg, delay, host_addrs, use_cache, plot_format):
+    try:
+        process_cell(alg, delay, host_addrs, use_cache, plot_format)
+    except Exception:
+        # Tracebacks do not survive the trip back from the worker, so send the formatted one.
+        raise RuntimeError(traceback.format_exc())
+
+
+class AnalysisPipeline(object):
+    # Runs process_cell for finished cells in worker processes while the next cell is emulated.
+    # At most `max_pending` cells are queued; submit() blocks beyond that so parsing can never fall
+    # arbitrarily far behind. workers=0 processes inline. Failures are collected, not raised.
+    def __init__(self, workers=1, max_pending=2, use_cache=True, plot_format='png'):
+        self.use_cache = use_cache
+        self.plot_format = plot_format
+        self.max_pending = max(1, max_pending)
+        self.pending = dict()
+        self.failures = []
+        self.executor = None
+        if workers > 0:
+            # forkserver: workers must not inherit the Mininet node shells of the parent.
+            self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver'))
+
+    def submit(self, alg, delay, host_addrs):
+        if self.executor is None:
+            try:
+                process_cell(alg, delay, host_addrs, self.use_cache, self.plot_format)
+            except Exception:
+                self.failures.append((alg, delay, traceback.format_exc()))
+            return
+        while len(self.pending) >= self.max_pending:
+            self._collect(wait(self.pending, return_when=FIRST_COMPLETED).done)
+        future = self.executor.submit(_process_cell_task, alg, delay, host_addrs, self.use_cache, self.plot_format)
+        self.pending[future] = (alg, delay)
+
+    def _collect(self, futures):
+        for future in futures:
+            alg, delay = self.pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                self.failures.append((alg, delay, str(e)))
+
+    def close(self):
+        # Wait for the queued cells and report every failure; returns the failures.
+        if self.executor is not None:
+            self._collect(wait(self.pending).done)
+            self.executor.shutdown()
+        for alg, delay, error in self.failures:
+            print('*** Processing failed for algorithm={0}, delay={1}ms:\n{2}'.format(alg, delay, error.rstrip()))
+        return self.failures
+
+
+def default_host_addrs(hosts=4):
+    # Mininet hands out 10.0.0.x to h1..hN in creation order.
+    return dict(('h{0}'.format(i), '10.0.0.{0}'.format(i)) for i in range(1, hosts + 1))
+
+
+def parse_cells(algs, delays, host_addrs, use_cache=True):
+    # Parse every (alg, delay) cell on disk; with the cache on this also warms it for plot/report.
+    cells = dict()
+    for alg in algs:
+        for delay in delays:
+            print('*** Parsing data for algorithm={0}, delay={1}ms...'.format(alg, delay))
+            cells[(alg, delay)] = (parse_tcpprobe_data(alg, delay, host_addrs, use_cache=use_cache),
+                                   parse_iperf_data(alg, delay, host_addrs, use_cache=use_cache))
+    return cells
+
+
+def plot_cells(algs, delays, host_addrs, use_cache=True, workers=0, plot_format='png'):
+    # Re-plot the traces already on disk, without running Mininet, optionally in `workers` processes.
+    pipeline = AnalysisPipeline(workers, max_pending=len(algs) * len(delays), use_cache=use_cache,
+                                plot_format=plot_format)
+    for alg in algs:
+        for delay in delays:
+            print('*** Processing data for algorithm={0}, delay={1}ms...'.format(alg, delay))
+            pipeline.submit(alg, delay, host_addrs)
+    return pipeline.close()
+
+
+def duration(times):
+    # Seconds covered by a series of interval end times: first to last plus the first interval
+    # (iperf2 reports every second, iperf3 down to every 0.1s).
+    if not len(times):
+        return 0.0
+    interval = float(np.median(np.diff(times))) if len(times) > 1 else 1.0
+    return float(times[-1] - times[0]) + interval
+
+
+def report_cells(cells):
+    # One line per (cell, flow): iperf duration and mean throughput, tcpprobe sample count and mean cwnd.
+    print('{0:<8} {1:>6} {2:<5} {3:>8} {4:>10} {5:>10} {6:>10}'
+          .format('alg', 'delay', 'flow', 'secs', 'mean Mbps', 'cwnd rows', 'mean cwnd'))
+    for (alg, delay), (data_cwnd, data_fairness) in sorted(cells.items()):
+        for flow in sorted(data_fairness):
+            bw = data_fairness[flow]
+            cwnd = data_cwnd.get(flow, dict()).get('cwnd', [])
+            print('{0:<8} {1:>6} {2:<5} {3:>8.1f} {4:>10.1f} {5:>10} {6:>10.1f}'
+                  .format(alg, delay, flow, duration(bw['time']), bw['Mbps'].mean() if len(bw['Mbps']) else 0.0,
+                          len(cwnd), cwnd.mean() if len(cwnd) else 0.0))
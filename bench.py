@@ -0,0 +1,394 @@
+import argparse
+import csv
+from datetime import datetime
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from time import mktime, perf_counter
+
+from traces import iperf_csv_header, iperf_files, parse_iperf, parse_tcpprobe, tcpprobe_csv_header
+
+
+def legacy_parse_tcpprobe(filename, flow_addrs):
+    # The csv.DictReader parser that script.py used before traces.parse_tcpprobe, kept as a baseline,
+    # for the flows of {flow: 'ip'}.
+    flows = dict((addr, flow) for flow, addr in flow_addrs.items())
+    data = dict((flow, {'cwnd': list(), 'time': list()}) for flow in flow_addrs)
+    time_init = None
+    with open(filename, 'r') as fcsv:
+        r = csv.DictReader(fcsv, delimiter=' ', fieldnames=tcpprobe_csv_header, restval=-1000)
+        for row in r:
+            flow = flows.get(row['src_addr_port'].rpartition(':')[0])
+            if flow is None:
+                continue
+            time = float(row['time'])
+            if time_init is None:
+                time_init = time
+            data[flow]['time'].append(time - time_init)
+            data[flow]['cwnd'].append(int(row['cwnd']))
+    return data
+
+
+def legacy_parse_iperf(filename, src_addr):
+    # Per-row strptime + mktime, as parse_iperf_data did before traces.parse_iperf.
+    data = dict({'Mbps': list(), 'time': list()})
+    first_row = True
+    with open(filename, 'r') as fcsv:
+        r = csv.DictReader(fcsv, delimiter=',', fieldnames=iperf_csv_header)
+        for row in r:
+            if src_addr in row['src_addr']:
+                time = mktime(datetime.strptime(str(row['time']), '%Y%m%d%H%M%S').timetuple())
+                if first_row:
+                    time_init = time
+                    first_row = False
+                    data['time'].append(time - time_init)
+                elif time-time_init == data['time'][-1]:
+                    data['time'].append(time - time_init + 1)
+                else:
+                    data['time'].append(time - time_init)
+                data['Mbps'].append(int(row['bps'])/1000000)
+    return data
+
+
+def write_iperf_logs(directory, flows, seconds):
+    # One iperf -y C client log per pair, in the file layout tcp_tests writes.
+    rnd = random.Random(1)
+    host_addrs = dict()
+    for i in range(flows):
+        client, server = 'h{0}'.format(2 * i + 1), 'h{0}'.format(2 * i + 2)
+        host_addrs[client] = '10.0.{0}.1'.format(i)
+        t = mktime(datetime(2021, 12, 1, 3, 57, 45).timetuple()) + i
+        with open(os.path.join(directory, 'iperf_bench_{0}-{1}_21ms.txt'.format(client, server)), 'w') as f:
+            for s in range(seconds):
+                nbytes = rnd.randint(20000000, 40000000)
+                f.write('{0},{1},5{2:04d},10.0.{2}.2,5001,5,{3:.1f}-{4:.1f},{5},{6}\n'
+                        .format(datetime.fromtimestamp(t + s + 1).strftime('%Y%m%d%H%M%S'),
+                                host_addrs[client], i, s, s + 1, nbytes, nbytes * 8))
+            f.write('{0},{1},5{2:04d},10.0.{2}.2,5001,5,0.0-{3:.1f},1,8\n'
+                    .format(datetime.fromtimestamp(t + seconds).strftime('%Y%m%d%H%M%S'),
+                            host_addrs[client], i, seconds + 0.3))
+    return host_addrs
+
+
+def bench_iperf(flows, seconds):
+    directory = tempfile.mkdtemp(prefix='iperf_')
+    try:
+        host_addrs = write_iperf_logs(directory, flows, seconds)
+        files = iperf_files('bench', 21, directory)
+        print('*** iperf logs: {0} flows x {1} rows'.format(flows, seconds))
+        start = perf_counter()
+        for flow, filename in files.items():
+            legacy_parse_iperf(filename, host_addrs[flow])
+        legacy_time = perf_counter() - start
+        start = perf_counter()
+        data = parse_iperf(files, host_addrs)
+        new_time = perf_counter() - start
+        assert all(len(data[flow]['time']) == seconds for flow in files)
+        print('strptime per row: {0:.3f}s'.format(legacy_time))
+        print('parse_iperf:      {0:.3f}s, {1:.1f}x faster'.format(new_time, legacy_time / new_time))
+    finally:
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+        os.rmdir(directory)
+
+
+def bench_startup(repeats):
+    # Wall-clock time of short script.py invocations, best of `repeats`, against the cost of the
+    # matplotlib import that script.py used to pay up front on every start.
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = [('import matplotlib.pyplot', ['-c', 'import matplotlib.pyplot']),
+                ('script.py --help', ['script.py', '--help']),
+                ('script.py report -a reno -d 21', ['script.py', 'report', '-a', 'reno', '-d', '21'])]
+    for label, argv in commands:
+        best = None
+        for _ in range(repeats):
+            start = perf_counter()
+            subprocess.run([sys.executable] + argv, cwd=here, stdout=subprocess.DEVNULL, check=True)
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('{0:<32} {1:.3f}s'.format(label, best))
+
+
+def bench_plot(sizes):
+    # Render time of draw_cwnd_plot as the trace grows; decimation should keep it flat.
+    import numpy as np
+    from plots import draw_cwnd_plot
+    directory = tempfile.mkdtemp(prefix='plot_')
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        rnd = np.random.default_rng(1)
+        for n in sizes:
+            t = np.linspace(0, 1000, n)
+            cwnd = rnd.integers(10, 5000, n).astype(np.uint32)
+            start = perf_counter()
+            draw_cwnd_plot(dict(h1=(t, cwnd), h3=(t, cwnd)), 'bench', n)
+            print('{0:>10} points per flow: {1:.2f}s'.format(n, perf_counter() - start))
+    finally:
+        os.chdir(cwd)
+        for filename in os.listdir(directory):
+            os.remove(os.path.join(directory, filename))
+        os.rmdir(directory)
+
+
+def bench_topo(sizes, delay):
+    # ManyDumbbellTopo setup (build + shaping + start) and teardown for growing host counts, with
+    # bulk tc -batch shaping and with one TCLink per link. Needs root and Mininet.
+    from mininet.log import setLogLevel
+    from dumbbell import start_many_net
+    setLogLevel('warning')
+    print('{0:>6} {1:>10} {2:>10}'.format('hosts', 'bulk', 'TCLink'))
+    for hosts in sizes:
+        times = []
+        for bulk in (True, False):
+            start = perf_counter()
+            net = start_many_net(hosts // 2, delay, bulk=bulk)
+            times.append(perf_counter() - start)
+            net.stop()
+        print('{0:>6} {1:>9.2f}s {2:>9.2f}s'.format(hosts, times[0], times[1]))
+
+
+def bench_topogen(sizes, kinds):
+    # compile_spec time for generated topologies of growing size, plus SpecTopo construction
+    # (Mininet's in-memory graph, no namespaces) when Mininet is importable.
+    from topogen import compile_spec, generators
+    try:
+        from routers import SpecTopo
+    except ImportError:
+        SpecTopo = None
+    print('{0:<8} {1:>7} {2:>7} {3:>10} {4:>10}'.format('kind', 'routers', 'links', 'compile', 'SpecTopo'))
+    for kind in kinds:
+        for n in sizes:
+            if kind == 'grid':
+                side = max(2, int(round(n ** 0.5)))
+                spec = generators[kind](side, side)
+            elif kind == 'fat_tree':
+                k = 2
+                while 5 * (k + 2) * (k + 2) // 4 <= n:
+                    k += 2
+                spec = generators[kind](k)
+            else:
+                spec = generators[kind](n)
+            start = perf_counter()
+            model = compile_spec(spec)
+            compile_time = perf_counter() - start
+            topo_time = ''
+            if SpecTopo is not None:
+                start = perf_counter()
+                SpecTopo(model=model)
+                topo_time = '{0:.3f}s'.format(perf_counter() - start)
+            print('{0:<8} {1:>7} {2:>7} {3:>9.3f}s {4:>10}'
+                  .format(kind, len(model['routers']), len(model['links']), compile_time, topo_time))
+
+
+def bench_routes(sizes, degree, install, per_route):
+    # static_routes() for random router graphs of growing size; with install (root + Mininet) also
+    # the concurrent ip -batch install and, with per_route, one node.cmd('ip route add') per route.
+    from topogen import compile_spec, random_graph, route_batch_lines, static_routes
+    if install:
+        from mininet.log import setLogLevel
+        from mininet.net import Mininet
+        from routers import SpecTopo, install_static_routes
+        setLogLevel('warning')
+    print('{0:>7} {1:>8} {2:>10} {3:>10} {4:>10}'.format('routers', 'routes', 'compute', 'ip -batch', 'per route'))
+    for n in sizes:
+        model = compile_spec(random_graph(n, degree))
+        start = perf_counter()
+        routes = static_routes(model)
+        compute = perf_counter() - start
+        batch = cmds = ''
+        if install:
+            net = Mininet(topo=SpecTopo(model=model), controller=None)
+            try:
+                start = perf_counter()
+                errors = install_static_routes(net, model)
+                batch = '{0:.2f}s'.format(perf_counter() - start)
+                if errors:
+                    raise RuntimeError('ip -batch failed:\n{0}'.format('\n'.join(errors)))
+                if per_route:
+                    start = perf_counter()
+                    for router, lines in routes.items():
+                        for line in route_batch_lines(lines):
+                            net[router].cmd('ip ' + line)
+                    cmds = '{0:.2f}s'.format(perf_counter() - start)
+            finally:
+                net.stop()
+        print('{0:>7} {1:>8} {2:>9.2f}s {3:>10} {4:>10}'
+              .format(n, sum(len(r) for r in routes.values()), compute, batch, cmds))
+
+
+def iperf_sum_mbps(output):
+    # Whole-run throughput from `iperf -y C` output: the last SUM row (id -1) with -P, else the last row.
+    rows = [line.split(',') for line in output.splitlines() if line.count(',') >= 8]
+    sums = [row for row in rows if row[5] == '-1']
+    return float((sums or rows)[-1][8]) / 1e6 if rows else float('nan')
+
+
+def bench_ecmp(flows, seconds, profile):
+    # Aggregate h1 -> h2 throughput across the diamond for growing numbers of parallel flows, single
+    # path against ECMP. The router-router links get `profile`; the host links stay unshaped so the
+    # two r1 -> r4 paths are the only bottleneck. Needs root and Mininet.
+    from mininet.log import setLogLevel
+    from mininet.net import Mininet
+    from routers import install_static_routes, load_topo, shape_net
+    from shaping import shaping_plan
+    setLogLevel('warning')
+    results = dict()
+    for multipath in (False, True):
+        topo = load_topo('diamond.json')
+        core = dict((intf, profile) for link in topo.model['links']
+                    if all(node in topo.model['routers'] for node in link['nodes']) for intf in link['intfs'])
+        net = Mininet(topo=topo, controller=None)
+        try:
+            errors = install_static_routes(net, multipath=multipath)
+            if errors:
+                raise RuntimeError('ip -batch failed:\n{0}'.format('\n'.join(errors)))
+            net.start()
+            shape_net(net, shaping_plan(topo.model, intfs=core))
+            h1, h2 = net.get('h1', 'h2')
+            server = h2.popen(['iperf', '-s', '-p', '5001', '-w', '16m'])
+            try:
+                for n in flows:
+                    output = h1.cmd('iperf -c {0} -p 5001 -w 16m -P {1} -t {2} -y C'.format(h2.IP(), n, seconds))
+                    results[multipath, n] = iperf_sum_mbps(output)
+            finally:
+                server.terminate()
+                server.wait()
+        finally:
+            net.stop()
+    print('{0:>5} {1:>12} {2:>12} {3:>7}'.format('flows', 'single Mbps', 'ECMP Mbps', 'ratio'))
+    for n in flows:
+        print('{0:>5} {1:>12.1f} {2:>12.1f} {3:>6.2f}x'
+              .format(n, results[False, n], results[True, n], results[True, n] / results[False, n]))
+
+
+def write_tcpprobe_trace(filename, lines, host_addrs):
+    # Synthetic tcpprobe trace: the two senders plus ack-direction rows from the receivers.
+    srcs = ['{0}:5001'.format(addr) for addr in host_addrs.values()]
+    rnd = random.Random(1)
+    with open(filename, 'w') as f:
+        t = 1000.0
+        for i in range(lines):
+            t += 0.0001
+            f.write('{0:.9f} {1} 10.0.0.254:40000 1448 0x{2:08x} 0x{2:08x} {3} 2147483647 29312 {4} 29312\n'
+                    .format(t, srcs[i % len(srcs)], i, rnd.randint(10, 5000), rnd.randint(40000, 400000)))
+
+
+def bench_tcpprobe(lines, use_mmap):
+    host_addrs = dict({'h1': '10.0.0.1', 'h2': '10.0.0.2', 'h3': '10.0.0.3', 'h4': '10.0.0.4'})
+    fd, filename = tempfile.mkstemp(suffix='.txt', prefix='tcpprobe_')
+    os.close(fd)
+    try:
+        write_tcpprobe_trace(filename, lines, host_addrs)
+        size = os.path.getsize(filename) / 1e6
+        print('*** tcpprobe trace: {0} lines, {1:.1f} MB'.format(lines, size))
+        start = perf_counter()
+        flow_addrs = dict((h, host_addrs[h]) for h in ('h1', 'h3'))
+        legacy = legacy_parse_tcpprobe(filename, flow_addrs)
+        legacy_time = perf_counter() - start
+        start = perf_counter()
+        data = parse_tcpprobe(filename, flow_addrs, use_mmap=use_mmap)
+        new_time = perf_counter() - start
+        for flow in flow_addrs:
+            assert list(legacy[flow]['cwnd']) == data[flow]['cwnd'].tolist()
+        print('csv.DictReader:  {0:.2f}s ({1:.1f} MB/s)'.format(legacy_time, size / legacy_time))
+        print('parse_tcpprobe:  {0:.2f}s ({1:.1f} MB/s), {2:.1f}x faster'
+              .format(new_time, size / new_time, legacy_time / new_time))
+    finally:
+        os.remove(filename)
+
+
+def bench_sockstats(connections, samples, interval_ms):
+    # Cost of one socket-stats sample (a sock_diag dump plus the port filter) with `connections`
+    # established loopback connections besides the one flow that is kept, against a ss -tin per sample.
+    import socket
+    from sockstats import diag_socket, dump
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(connections + 1)
+    port = server.getsockname()[1]
+    socks = []
+    try:
+        for _ in range(connections + 1):
+            socks.append(socket.create_connection(('127.0.0.1', port)))
+            socks.append(server.accept()[0])
+        sock = diag_socket()
+        keep = frozenset([socks[0].getsockname()[1]])
+        start = perf_counter()
+        for i in range(samples):
+            rows = dump(sock, keep, i + 1)
+        per_sample = (perf_counter() - start) / samples
+        sock.close()
+        assert len(rows) == 2  # both ends of the kept connection live in this namespace
+        runs = min(samples, 50)
+        start = perf_counter()
+        for _ in range(runs):
+            subprocess.run(['ss', '-tin'], stdout=subprocess.DEVNULL, check=True)
+        ss_per_sample = (perf_counter() - start) / runs
+    finally:
+        for s in socks:
+            s.close()
+        server.close()
+    print('*** {0} loopback connections in the namespace'.format(connections + 1))
+    print('sock_diag dump: {0:.1f}us per sample, {1:.2f}% of a core at {2:g}ms'
+          .format(per_sample * 1e6, 100 * per_sample / (interval_ms / 1000.0), interval_ms))
+    print('ss -tin:        {0:.1f}us per sample, {1:.2f}% of a core at {2:g}ms'
+          .format(ss_per_sample * 1e6, 100 * ss_per_sample / (interval_ms / 1000.0), interval_ms))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the trace processing pipeline.')
+    sub = parser.add_subparsers(dest='bench', required=True)
+    p = sub.add_parser('tcpprobe', help='Compare parse_tcpprobe against the csv.DictReader parser.')
+    p.add_argument('-n', '--lines', type=int, default=2000000, help='Number of synthetic tcpprobe lines.')
+    p.add_argument('--mmap', action='store_true', help='Read the trace through mmap.')
+    p = sub.add_parser('iperf', help='Compare parse_iperf against per-row strptime parsing.')
+    p.add_argument('-f', '--flows', type=int, default=50, help='Number of client/server pairs.')
+    p.add_argument('-s', '--seconds', type=int, default=1000, help='Report rows per flow.')
+    p = sub.add_parser('startup', help='Time script.py start-up for the commands that do not need Mininet.')
+    p.add_argument('-r', '--repeats', type=int, default=5, help='Runs per command; the best one is reported.')
+    p = sub.add_parser('plot', help='Time draw_cwnd_plot for growing trace lengths.')
+    p.add_argument('-n', '--sizes', nargs='+', type=int, default=[10000, 100000, 1000000, 10000000],
+                   help='Samples per flow.')
+    p = sub.add_parser('topo', help='Time N-pair dumbbell setup, bulk tc against TCLink (root + Mininet).')
+    p.add_argument('-n', '--sizes', nargs='+', type=int, default=[4, 16, 64, 256, 1000], help='Host counts.')
+    p.add_argument('-d', '--delay', type=int, default=21, help='Bottleneck delay (ms).')
+    p = sub.add_parser('topogen', help='Time compiling generated router topologies (SpecTopo too with Mininet).')
+    p.add_argument('-n', '--sizes', nargs='+', type=int, default=[10, 100, 1000], help='Approximate router counts.')
+    p.add_argument('-k', '--kinds', nargs='+', default=['line', 'ring', 'grid', 'fat_tree', 'random'],
+                   help='Generators to time.')
+    p = sub.add_parser('routes', help='Time computing (and with --install, installing) shortest-path static routes.')
+    p.add_argument('-n', '--sizes', nargs='+', type=int, default=[10, 100, 500], help='Router counts.')
+    p.add_argument('--degree', type=int, default=3, help='Average degree of the random router graph.')
+    p.add_argument('--install', action='store_true', help='Also install them in a Mininet net (root + Mininet).')
+    p.add_argument('--per-route', action='store_true', help='With --install, also time one node.cmd per route.')
+    p = sub.add_parser('ecmp', help='h1 -> h2 throughput across the diamond, single path vs ECMP (root + Mininet).')
+    p.add_argument('-n', '--flows', nargs='+', type=int, default=[1, 2, 4, 8, 16], help='Parallel flow counts.')
+    p.add_argument('-t', '--seconds', type=int, default=20, help='iperf runtime per measurement.')
+    p.add_argument('-p', '--profile', default='wan100', help='Shaping profile of the router-router links.')
+    p = sub.add_parser('sockstats', help='Time one socket-stats sample against running ss -tin.')
+    p.add_argument('-c', '--connections', type=int, default=100, help='Unrelated loopback connections.')
+    p.add_argument('-n', '--samples', type=int, default=2000, help='Samples to time.')
+    p.add_argument('-i', '--interval', type=float, default=10, help='Sampling interval to express the cost at (ms).')
+    args = parser.parse_args()
+
+    if args.bench == 'tcpprobe':
+        bench_tcpprobe(args.lines, args.mmap)
+    elif args.bench == 'iperf':
+        bench_iperf(args.flows, args.seconds)
+    elif args.bench == 'startup':
+        bench_startup(args.repeats)
+    elif args.bench == 'plot':
+        bench_plot(args.sizes)
+    elif args.bench == 'topo':
+        bench_topo(args.sizes, args.delay)
+    elif args.bench == 'topogen':
+        bench_topogen(args.sizes, args.kinds)
+    elif args.bench == 'routes':
+        bench_routes(args.sizes, args.degree, args.install, args.per_route)
+    elif args.bench == 'ecmp':
+        bench_ecmp(args.flows, args.seconds, args.profile)
+    elif args.bench == 'sockstats':
+        bench_sockstats(args.connections, args.samples, args.interval)
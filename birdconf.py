@@ -0,0 +1,226 @@
+import functools
+import ipaddress
+import os
+import subprocess
+
+# BIRD 2.0.8 configuration for every node of a topogen model. Each node gets a private run
+# directory (<run_dir>/<node>/) holding bird.conf, the control socket bird.ctl, bird.log and
+# bird.pid, so no node depends on the current directory the way `cd rX; bird -l` did.
+run_dir = os.environ.get('FCN_BIRD_RUN', '.bird_run')
+protocols = ('rip', 'ospf', 'bgp')
+ecmp_limit = 16
+base_asn = 65000
+
+# Timer presets, in whole seconds as BIRD 2.0.8 wants them. 'default' is BIRD's own defaults (RIP
+# updates every 30 s); 'fast' and 'fastest' keep convergence experiments from waiting on them.
+presets = dict(
+    default=dict(scan=60, rip_update=30, rip_timeout=180, rip_garbage=120,
+                 ospf_hello=10, ospf_dead=40, ospf_wait=40, ospf_retransmit=5,
+                 bgp_hold=240, bgp_keepalive=80, bgp_connect_retry=120),
+    fast=dict(scan=5, rip_update=5, rip_timeout=30, rip_garbage=20,
+              ospf_hello=2, ospf_dead=8, ospf_wait=8, ospf_retransmit=2,
+              bgp_hold=9, bgp_keepalive=3, bgp_connect_retry=5),
+    fastest=dict(scan=1, rip_update=1, rip_timeout=6, rip_garbage=4,
+                 ospf_hello=1, ospf_dead=3, ospf_wait=2, ospf_retransmit=2,
+                 bgp_hold=3, bgp_keepalive=1, bgp_connect_retry=1),
+)
+
+_header = '''log "{log}" all;
+router id {router_id};
+
+protocol device {{
+	scan time {scan};
+}}
+
+protocol direct {{
+	ipv4;
+	interface "-lo", "*";
+}}
+
+protocol kernel {{
+	ipv4 {{
+		export where source != RTS_DEVICE;
+	}};
+	scan time {scan};
+	merge paths {ecmp};
+}}
+'''
+
+_rip = '''
+protocol rip {{
+	ipv4 {{
+		import all;
+		export all;
+	}};
+	ecmp {ecmp};
+	interface "-lo", "*" {{
+		update time {rip_update};
+		timeout time {rip_timeout};
+		garbage time {rip_garbage};
+	}};
+}}
+'''
+
+_ospf = '''
+protocol ospf v2 {{
+	ipv4 {{
+		import all;
+		export none;
+	}};
+	ecmp {ecmp};
+{areas}}}
+'''
+
+_ospf_area = '''	area {area} {{
+{interfaces}	}};
+'''
+
+_ospf_interface = '''		interface "{intf}" {{
+{body}		}};
+'''
+
+_ospf_interface_body = '''			type {type};
+			hello {ospf_hello};
+			dead {ospf_dead};
+			wait {ospf_wait};
+			retransmit {ospf_retransmit};{cost}
+'''
+
+_bgp = '''
+protocol bgp {name} {{
+	local {local} as {asn};
+	neighbor {neighbor} as {peer_asn};
+	direct;
+	hold time {bgp_hold};
+	keepalive time {bgp_keepalive};
+	connect retry time {bgp_connect_retry};{ibgp}
+	ipv4 {{
+		import all;
+		export where source ~ [RTS_DEVICE, RTS_BGP];{next_hop_self}
+	}};
+}}
+'''
+
+
+def node_dir(node, base=None):
+    return os.path.abspath(os.path.join(base or run_dir, node))
+
+
+def _timers(preset):
+    if preset not in presets:
+        raise KeyError('Unknown timer preset {0!r}, use one of {1}'.format(preset, ', '.join(sorted(presets))))
+    return presets[preset]
+
+
+def _switch(ecmp):
+    return 'yes limit {0}'.format(ecmp_limit) if ecmp else 'no'
+
+
+# Everything that only depends on the protocol, the preset and ECMP is rendered once and shared by all nodes.
+@functools.lru_cache(maxsize=None)
+def _rip_block(preset, ecmp):
+    return _rip.format(ecmp=_switch(ecmp), **_timers(preset))
+
+
+@functools.lru_cache(maxsize=None)
+def _ospf_interface_body_block(intf_type, cost, preset):
+    return _ospf_interface_body.format(type=intf_type, cost='' if cost is None else '\n\t\t\tcost {0};'.format(cost),
+                                       **_timers(preset))
+
+
+def node_links(model):
+    # {node: [(intf, own address, peer node, peer address, link)]} in link order.
+    links = dict()
+    for link in model['links']:
+        ends = list(zip(link['nodes'], link['intfs'], link['ips']))
+        for (node, intf, ip), (peer, _, peer_ip) in (ends, ends[::-1]):
+            links.setdefault(node, []).append((intf, ip, peer, peer_ip, link))
+    return links
+
+
+def router_asns(model):
+    # {router: AS}: a router's own 'asn', else one private AS per router (pure eBGP).
+    return dict((router, model['routers'][router].get('asn') or base_asn + i + 1)
+                for i, router in enumerate(sorted(model['routers'])))
+
+
+def _ospf_area_of(model, node, link):
+    if link.get('area') is not None:
+        return link['area']
+    areas = set(model['routers'][n].get('area', 0) for n in link['nodes'] if n in model['routers'])
+    return areas.pop() if len(areas) == 1 else 0
+
+
+def bird_config(model, node, protocol='rip', preset='default', ecmp=False, base=None, links=None, asns=None):
+    # bird.conf text for one router or host. Hosts run the same IGP as the routers (like the old
+    # per-node configs did) but take no part in BGP.
+    if protocol not in protocols:
+        raise ValueError('Unsupported protocol {0!r}, use one of {1}'.format(protocol, ', '.join(protocols)))
+    links = (links or node_links(model)).get(node, [])
+    is_router = node in model['routers']
+    ip = model['routers'][node]['ip'] if is_router else model['hosts'][node]['ip']
+    timers = _timers(preset)
+    text = _header.format(log=os.path.join(node_dir(node, base), 'bird.log'),
+                          router_id=ipaddress.ip_interface(ip).ip, scan=timers['scan'], ecmp=_switch(ecmp))
+    if protocol == 'rip':
+        text += _rip_block(preset, ecmp)
+    elif protocol == 'ospf':
+        areas = dict()
+        for intf, _, peer, _, link in links:
+            ptp = is_router and peer in model['routers']
+            body = _ospf_interface_body_block('ptp' if ptp else 'broadcast', link.get('cost'), preset)
+            areas.setdefault(_ospf_area_of(model, node, link), []).append(_ospf_interface.format(intf=intf, body=body))
+        text += _ospf.format(ecmp=_switch(ecmp), areas=''.join(
+            _ospf_area.format(area=area, interfaces=''.join(blocks)) for area, blocks in sorted(areas.items())))
+    elif is_router:
+        asns = asns or router_asns(model)
+        asn = asns[node]
+        names = set()
+        for intf, ip, peer, peer_ip, _ in links:
+            if peer not in model['routers']:
+                continue
+            peer_asn = asns[peer]
+            ibgp = peer_asn == asn
+            name = 'bgp_{0}'.format(peer)
+            while name in names:  # parallel links to the same neighbour
+                name += '_'
+            names.add(name)
+            # iBGP sessions only run between neighbours, so each side reflects to the other to get
+            # routes across more than one hop without a full mesh.
+            text += _bgp.format(name=name, local=ipaddress.ip_interface(ip).ip, asn=asn,
+                                neighbor=ipaddress.ip_interface(peer_ip).ip, peer_asn=peer_asn,
+                                ibgp='\n\trr client;' if ibgp else '',
+                                next_hop_self='\n\t\tnext hop self;' if ibgp else '', **timers)
+    return text
+
+
+def bird_configs(model, protocol='rip', preset='default', ecmp=False, base=None, nodes=None):
+    # {node: bird.conf text} for every router and host (or just `nodes`).
+    links = node_links(model)
+    asns = router_asns(model)
+    nodes = nodes or list(model['routers']) + list(model['hosts'])
+    return dict((node, bird_config(model, node, protocol, preset, ecmp, base, links, asns)) for node in nodes)
+
+
+def write_configs(configs, base=None):
+    # Write every node's bird.conf into its run directory; returns {node: run directory}.
+    dirs = dict()
+    for node, text in configs.items():
+        directory = node_dir(node, base)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'bird.conf'), 'w') as f:
+            f.write(text)
+        dirs[node] = directory
+    return dirs
+
+
+def bird_command(directory, bird='bird'):
+    return [bird, '-c', os.path.join(directory, 'bird.conf'), '-s', os.path.join(directory, 'bird.ctl'),
+            '-P', os.path.join(directory, 'bird.pid')]
+
+
+def check_config(directory, bird='bird'):
+    # `bird -p` only parses the configuration; returns its complaint, or '' if it is fine.
+    proc = subprocess.run([bird, '-p', '-c', os.path.join(directory, 'bird.conf')],
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return proc.stdout.strip() if proc.returncode != 0 else ''
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from metrics import bdp_packets, cell_metrics, queue_stats, throughput_matrix
+
+result_columns = ['alg', 'delay', 'buffer_bdp', 'buffer_pkts', 'mbps', 'utilization', 'mean_jain', 'qdelay_ms',
+                  'qdelay_p99_ms', 'drops', 'drop_pct', 'retrans_per_s']
+# Buffers of the queue the flows build up in, as multiples of that link's BDP at the base RTT.
+default_buffers = [0.05, 0.1, 0.25, 0.5, 1, 2, 4]
+
+
+def buffer_directory(buffer_bdp, base='buffers'):
+    # Every buffer size runs the whole (alg, delay) matrix in its own directory, so the cells keep the
+    # usual file names.
+    return os.path.join(base, 'bdp_{0:g}'.format(buffer_bdp))
+
+
+def run_sweep(algs, delays, buffers, iperf_runtime, iperf_delayed_start, base='buffers', parallel=False, **kwargs):
+    # tcp_tests (or run_matrix) once per buffer size. The cells are processed inline, in the
+    # buffer's directory; kwargs go to tcp_tests/run_matrix.
+    from dumbbell import tcp_tests
+    from scheduler import run_matrix
+    cwd = os.getcwd()
+    for buffer_bdp in buffers:
+        directory = buffer_directory(buffer_bdp, base)
+        os.makedirs(directory, exist_ok=True)
+        print('*** Buffer {0:g}x BDP, results in {1}...'.format(buffer_bdp, directory))
+        os.chdir(directory)
+        try:
+            if parallel:
+                run_matrix(algs, delays, iperf_runtime, iperf_delayed_start, analysis_workers=0,
+                           buffer_bdp=buffer_bdp, **kwargs)
+            else:
+                tcp_tests(algs, delays, iperf_runtime, iperf_delayed_start, analysis_workers=0, buffer_bdp=buffer_bdp,
+                          **kwargs)
+        finally:
+            os.chdir(cwd)
+
+
+def buffer_queue(queues):
+    # The data-direction queue under test: the narrowest shaped link, the one that dropped most if
+    # several are equally narrow.
+    data = [q for q in queues.values() if q['role'] in ('bottleneck', 'access') and q['mbps']]
+    if not data:
+        return None
+    narrowest = min(q['mbps'] for q in data)
+    return max((q for q in data if q['mbps'] == narrowest), key=lambda q: int(q['drops'][-1]) if len(q['drops']) else 0)
+
+
+def aggregate_mbps(data_fairness):
+    # Mean of the flows' summed throughput over the intervals where any flow is running.
+    flows, _, m = throughput_matrix(data_fairness)
+    if not flows:
+        return np.nan
+    return float(np.nanmean(np.nansum(m, axis=0)[np.any(~np.isnan(m), axis=0)]))
+
+
+def cell_tradeoff(alg, delay, buffer_bdp, host_addrs, use_cache=True):
+    # One trade-off row for the cell in the current directory. Throughput is the flows' own sum;
+    # utilization is relative to the queue under test's rate. Queueing delay is the flows' smoothed
+    # RTT above the base RTT (2 * delay), from the socket stats; without an RTT series it falls back
+    # to the backlog of the queue under test. Loss is that queue's drops.
+    from analysis import parse_iperf_data, parse_queue_data, parse_tcpprobe_data
+    data_cwnd = parse_tcpprobe_data(alg, delay, host_addrs, use_cache=use_cache)
+    data_fairness = parse_iperf_data(alg, delay, host_addrs, use_cache=use_cache)
+    queues = parse_queue_data(alg, delay) or dict()
+    queue = buffer_queue(queues)
+    stats = queue_stats(dict(q=queue)).get('q') if queue is not None else None
+    capacity = queue['mbps'] if queue is not None else None
+    metrics = cell_metrics(data_fairness, data_cwnd, capacity=capacity) if capacity else \
+        cell_metrics(data_fairness, data_cwnd)
+    row = dict(alg=alg, delay=delay, buffer_bdp=buffer_bdp, mbps=aggregate_mbps(data_fairness),
+               utilization=metrics['utilization'], mean_jain=metrics['mean_jain'], buffer_pkts=np.nan, drops=np.nan,
+               drop_pct=np.nan)
+    if stats is not None:
+        row['buffer_pkts'] = int(round(stats['limit'] - bdp_packets(queue['mbps'], queue['delay_ms'])))
+        row['drops'], row['drop_pct'] = stats['drops'], stats['drop_pct']
+    srtt = [np.asarray(cols['srtt'], dtype=np.float64) for cols in data_cwnd.values() if 'srtt' in cols]
+    srtt = np.concatenate(srtt) if srtt else np.empty(0)
+    srtt = srtt[srtt > 0]
+    if len(srtt):
+        qdelay = np.maximum(srtt / 1000.0 - 2 * delay, 0.0)
+        row['qdelay_ms'], row['qdelay_p99_ms'] = float(qdelay.mean()), float(np.percentile(qdelay, 99))
+    else:
+        row['qdelay_ms'], row['qdelay_p99_ms'] = (stats['delay_ms'] if stats else np.nan), np.nan
+    retrans = []
+    for cols in data_cwnd.values():
+        if 'retrans' in cols and len(cols['time']) > 1 and cols['time'][-1] > cols['time'][0]:
+            retrans.append((int(cols['retrans'][-1]) - int(cols['retrans'][0])) / (cols['time'][-1] - cols['time'][0]))
+    row['retrans_per_s'] = sum(retrans) if retrans else np.nan
+    return row
+
+
+def sweep_results(algs, delays, buffers, host_addrs, base='buffers', use_cache=True):
+    # Trade-off rows of every cell on disk, in (alg, delay, buffer) order.
+    rows = []
+    cwd = os.getcwd()
+    for alg in algs:
+        for delay in delays:
+            for buffer_bdp in buffers:
+                directory = buffer_directory(buffer_bdp, base)
+                if not os.path.isdir(directory):
+                    print('*** No results for {0:g}x BDP in {1}'.format(buffer_bdp, directory))
+                    continue
+                print('*** Parsing {0} {1}ms at {2:g}x BDP...'.format(alg, delay, buffer_bdp))
+                os.chdir(directory)
+                try:
+                    rows.append(cell_tradeoff(alg, delay, buffer_bdp, host_addrs, use_cache))
+                finally:
+                    os.chdir(cwd)
+    return rows
+
+
+def knee(rows, fraction=0.95):
+    # {(alg, delay): row} of the smallest buffer whose throughput is within `fraction` of the best one.
+    best = dict()
+    for key in sorted(set((row['alg'], row['delay']) for row in rows)):
+        runs = sorted([row for row in rows if (row['alg'], row['delay']) == key and not np.isnan(row['mbps'])],
+                      key=lambda row: row['buffer_bdp'])
+        if runs:
+            top = max(row['mbps'] for row in runs)
+            best[key] = [row for row in runs if row['mbps'] >= fraction * top][0]
+    return best
+
+
+def print_results(rows, filename=None, fraction=0.95):
+    # One throughput / queueing delay / loss table per congestion control algorithm.
+    for alg in sorted(set(row['alg'] for row in rows)):
+        print('*** {0}'.format(alg))
+        print('{0:>6} {1:>7} {2:>7} {3:>8} {4:>6} {5:>6} {6:>9} {7:>9} {8:>8} {9:>7} {10:>10}'
+              .format('delay', 'x BDP', 'pkts', 'Mbps', 'util', 'jain', 'qdelay ms', 'p99 ms', 'drops', 'loss %',
+                      'retrans/s'))
+        for row in rows:
+            if row['alg'] != alg:
+                continue
+            print('{delay:>6} {buffer_bdp:>7g} {buffer_pkts:>7.0f} {mbps:>8.1f} {utilization:>6.1%} {mean_jain:>6.3f} '
+                  '{qdelay_ms:>9.2f} {qdelay_p99_ms:>9.2f} {drops:>8.0f} {drop_pct:>7.3f} {retrans_per_s:>10.1f}'
+                  .format(**row))
+    for (alg, delay), row in sorted(knee(rows, fraction).items()):
+        print('*** {0} {1}ms: {2:g}x BDP ({3:.0f} packets) reaches {4:.0%} of the best throughput with {5:.2f}ms '
+              'queueing delay and {6:.3f}% loss'.format(alg, delay, row['buffer_bdp'], row['buffer_pkts'], fraction,
+                                                        row['qdelay_ms'], row['drop_pct']))
+    if filename:
+        with open(filename, 'w') as f:
+            w = csv.DictWriter(f, fieldnames=result_columns)
+            w.writeheader()
+            for row in rows:
+                w.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep the dumbbell buffer as a fraction of the BDP.')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-a', '--algorithms', nargs='+', default=['reno', 'cubic'],
+                        help='TCP Congestion Control algorithms to test.')
+    common.add_argument('-d', '--delays', nargs='+', type=int, default=[21, 81, 162],
+                        help='Backbone router one-way propagation delays to test.')
+    common.add_argument('-b', '--buffers', nargs='+', type=float, default=default_buffers,
+                        help='Buffer sizes as multiples of the BDP at the base RTT.')
+    common.add_argument('-o', '--output', default='buffers', help='Directory of the per-buffer results.')
+    common.add_argument('--csv', help='Also write the trade-off table to this CSV file.')
+    common.add_argument('--no-cache', action='store_true',
+                        help='Always re-parse raw traces, bypassing the parse cache.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', parents=[common], help='Run the sweep in Mininet (needs root), then report.')
+    p.add_argument('-i', '--iperf-runtime', type=int, default=1000, help='Time to run the iperf clients.')
+    p.add_argument('-j', '--iperf-delayed-start', type=int, default=250,
+                   help='Time to wait before starting the second iperf client.')
+    p.add_argument('-P', '--parallel', action='store_true', help='Run the cells of every buffer size concurrently.')
+    p.add_argument('-l', '--log-level', default='info', help='Mininet log level.')
+    sub.add_parser('report', parents=[common], help='Print the trade-off table of the results on disk.')
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error('choose run or report')
+    if any(b <= 0 for b in args.buffers):
+        parser.error('buffer sizes must be positive')
+
+    if args.command == 'run':
+        from mininet.log import setLogLevel
+        setLogLevel(args.log_level)
+        run_sweep(args.algorithms, args.delays, args.buffers, args.iperf_runtime, args.iperf_delayed_start,
+                  args.output, args.parallel, use_cache=not args.no_cache)
+    from analysis import default_host_addrs
+    print_results(sweep_results(args.algorithms, args.delays, args.buffers, default_host_addrs(), args.output,
+                                not args.no_cache), args.csv)
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+import argparse
+import csv
+import math
+import os
+import signal
+import sys
+from time import sleep, time
+
+import numpy as np
+
+from birdconf import presets, protocols
+from shaping import parse_time, resolve, topology_plan
+from topogen import compile_spec, generators, load_spec
+from udpprobe import load_records, parse_sender_output
+
+result_columns = ['t', 'event', 'sent', 'lost', 'loss_pct', 'outage_ms', 'outage_start_ms', 'reordered',
+                  'delay_ms', 'delay_max_ms']
+probe_port = 5201
+
+# An event script is a list of 'T ACTION A B [ARGS]' lines, T in seconds from the start of the probe:
+#   down A B / up A B               take the A-B link down or bring it back
+#   flap A B [COUNT [DOWN [UP]]]    COUNT down/up cycles, DOWN and UP seconds each (1 1 1)
+#   delay A B DELAY [JITTER]        netem delay on both ends, on top of the link's shaping
+#   loss A B PERCENT                netem loss on both ends
+#   clear A B                       back to the link's own shaping
+actions = ('down', 'up', 'flap', 'delay', 'loss', 'clear')
+default_events = ['5 down r1 r2', '15 up r1 r2', '25 flap r1 r2 3 1 1', '35 delay r1 r2 50ms', '45 loss r1 r2 5',
+                  '55 clear r1 r2']
+
+
+def parse_events(lines):
+    # Event script lines -> [(t, action, a, b, args)] in time order, flaps expanded into downs and ups.
+    events = []
+    for text in lines:
+        text = text.split('#', 1)[0].strip()
+        if not text:
+            continue
+        fields = text.split()
+        if len(fields) < 4 or fields[1] not in actions:
+            raise ValueError('Events are "T ACTION A B [ARGS]" with ACTION one of {0}, got {1!r}'
+                             .format(', '.join(actions), text))
+        t, action, a, b, args = float(fields[0]), fields[1], fields[2], fields[3], fields[4:]
+        if action == 'flap':
+            count, down, up = (list(map(float, args)) + [1, 1, 1][len(args):])[:3]
+            for i in range(int(count)):
+                events.append((t, 'down', a, b, ['flap {0}/{1}'.format(i + 1, int(count))]))
+                events.append((t + down, 'up', a, b, ['flap {0}/{1}'.format(i + 1, int(count))]))
+                t += down + up
+        elif action in ('delay', 'loss') and not args:
+            raise ValueError('{0!r} needs a value'.format(text))
+        else:
+            events.append((t, action, a, b, args))
+    return sorted(events, key=lambda e: e[0])
+
+
+def event_label(action, a, b, args):
+    if args and args[0].startswith('flap'):
+        return '{0} {1} {2}-{3}'.format(args[0], action, a, b)
+    return ' '.join(['{0} {1}-{2}'.format(action, a, b)] + list(args))
+
+
+def link_ends(model, a, b):
+    # [(node, intf)] for both ends of the first a-b link.
+    for link in model['links']:
+        if set(link['nodes']) == set((a, b)):
+            return list(zip(link['nodes'], link['intfs']))
+    raise KeyError('No {0}-{1} link in the topology'.format(a, b))
+
+
+class LinkImpairments(object):
+    # The netem state of the links events touch. Every change rebuilds the interface's whole qdisc
+    # tree from its base profile (what bring_up shaped it with, if anything) plus the impairment,
+    # with `qdisc replace`, so delay and loss compose and clear restores the original shaping. An
+    # impairment delay adds to the base profile's own delay.
+    def __init__(self, net, base):
+        self.net = net
+        self.base = base
+        self.current = dict()
+
+    def apply(self, action, ends, args):
+        from routers import apply_shaping
+        plan = []
+        for node, intf in ends:
+            base = self.base.get(intf)
+            if action == 'clear':
+                impaired = self.current.pop(intf, None) is not None
+                if base is None and not impaired:
+                    continue  # untouched and unshaped: nothing to restore
+                plan.append((node, intf, dict(base or resolve(dict()))))
+                continue
+            profile = dict(self.current.get(intf) or base or resolve(dict()))
+            if action == 'delay':
+                base_ms = parse_time(base['delay']) if base and base['delay'] else 0.0
+                profile['delay'] = '{0:g}ms'.format(base_ms + parse_time(args[0]))
+                profile['jitter'] = args[1] if len(args) > 1 else None
+            else:
+                profile['loss'] = args[0]
+            self.current[intf] = profile
+            plan.append((node, intf, profile))
+        return apply_shaping(self.net, plan) if plan else []
+
+
+def event_impact(records, start, rate, count, events, end):
+    # Data-plane impact of every event on the probe stream, from the event to the next one (or `end`):
+    # packets sent and lost, the longest run of lost packets as an outage (ms) and when it started
+    # relative to the event, packets arriving after a later-sent one (reordered) and the one-way delay.
+    # `events` is [(absolute time, label)]; a 'baseline' window covers the time before the first.
+    records = np.sort(records, order='recv')
+    seqs = records['seq'].astype(np.int64)
+    # Reordered: a packet whose seq is below one that arrived before it.
+    reordered = np.zeros(len(seqs), dtype=bool)
+    if len(seqs) > 1:
+        reordered[1:] = seqs[1:] < np.maximum.accumulate(seqs)[:-1]
+    received = np.unique(seqs)
+    windows = [(start, 'baseline')] + list(events)
+    rows = []
+    for i, (t, label) in enumerate(windows):
+        t_next = windows[i + 1][0] if i + 1 < len(windows) else end
+        lo = min(count, max(0, int(math.ceil((t - start) * rate))))
+        hi = min(count, max(lo, int(math.ceil((t_next - start) * rate))))
+        got = received[(received >= lo) & (received < hi)]
+        # The outage is the longest run of missing seqs, counted from the last packet received before
+        # the window so that a gap already open when the event hits is measured whole.
+        before = received[received < lo]
+        after = received[received >= hi]
+        bounds = np.concatenate([before[-1:] if len(before) else [lo - 1], got, after[:1] if len(after) else [hi]])
+        gaps = np.diff(bounds) - 1
+        if len(gaps) and gaps.max() > 0:
+            j = int(np.argmax(gaps))
+            outage_ms = gaps[j] * 1000.0 / rate
+            outage_start_ms = (start + (bounds[j] + 1) / rate - t) * 1000.0
+        else:
+            outage_ms, outage_start_ms = 0.0, float('nan')
+        in_window = (seqs >= lo) & (seqs < hi)
+        delays = (records['recv'][in_window] - records['sent'][in_window]) * 1000.0
+        rows.append(dict(t=t - start, event=label, sent=hi - lo, lost=hi - lo - len(got),
+                         loss_pct=100.0 * (hi - lo - len(got)) / (hi - lo) if hi > lo else float('nan'),
+                         outage_ms=outage_ms, outage_start_ms=outage_start_ms,
+                         reordered=int(np.count_nonzero(reordered & in_window)),
+                         delay_ms=float(np.median(delays)) if len(delays) else float('nan'),
+                         delay_max_ms=float(delays.max()) if len(delays) else float('nan')))
+    return rows
+
+
+def run_churn(model, events, protocol='ospf', preset='fast', routes=False, profile=None, rate=1000, size=64,
+              tail=10, output='churn_probe.bin', timeout=300):
+    # Bring the net up, wait for the routing to converge, then run the probe from h1 to h2 while the
+    # events fire on schedule. Returns the per-event impact rows.
+    from routers import SpecTopo, bring_up, tear_down
+    for _, _, a, b, _ in events:
+        link_ends(model, a, b)
+    topo = SpecTopo(model=model)
+    net, _ = bring_up(topo, routes=routes, protocol=protocol, preset=preset, profile=profile)
+    receiver = sender = None
+    try:
+        if protocol:
+            from convergence import BirdSockets, expected_routes, measure
+            sockets = BirdSockets(list(model['routers']))
+            try:
+                times = measure(sockets.poll, expected_routes(model), time(), timeout)
+            finally:
+                sockets.close()
+            if any(t is None for t in times.values()):
+                raise RuntimeError('Routing did not converge within {0}s'.format(timeout))
+        plan = topology_plan(model, profile)
+        impairments = LinkImpairments(net, dict((intf, p) for _, intf, p in plan))
+        h1, h2 = net['h1'], net['h2']
+        probe = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'udpprobe.py')
+        duration = (events[-1][0] if events else 0) + tail
+        receiver = h2.popen([sys.executable, probe, 'recv', os.path.abspath(output), '-p', str(probe_port)])
+        sleep(0.5)
+        sender = h1.popen([sys.executable, probe, 'send', h2.IP(), '-p', str(probe_port), '-r', str(rate),
+                           '-t', str(duration), '-s', str(size)], universal_newlines=True)
+        t0 = time()
+        fired = []
+        for t, action, a, b, args in events:
+            sleep(max(0, t0 + t - time()))
+            fired.append((time(), event_label(action, a, b, args)))
+            if action in ('down', 'up'):
+                net.configLinkStatus(a, b, action)
+                errors = []
+            else:
+                errors = impairments.apply(action, link_ends(model, a, b), args)
+            if errors:
+                raise RuntimeError('{0} failed:\n{1}'.format(fired[-1][1], '\n'.join(errors)))
+            print('*** {0:7.3f}s {1}'.format(fired[-1][0] - t0, fired[-1][1]))
+        start, rate, count = parse_sender_output(sender.communicate()[0])
+        sender = None
+        sleep(1)
+        receiver.send_signal(signal.SIGTERM)
+        receiver.wait()
+        receiver = None
+    finally:
+        for proc in (sender, receiver):
+            if proc is not None:
+                proc.kill()
+                proc.wait()
+        tear_down(net, protocol)
+    return event_impact(load_records(output), start, rate, count, fired, start + count / rate)
+
+
+def print_results(rows, filename=None):
+    print('{0:>8} {1:<24} {2:>7} {3:>6} {4:>7} {5:>10} {6:>9} {7:>9} {8:>9} {9:>9}'
+          .format('t s', 'event', 'sent', 'lost', 'loss %', 'outage ms', 'after ms', 'reordered', 'delay ms',
+                  'max ms'))
+    for row in rows:
+        print('{t:>8.3f} {event:<24} {sent:>7} {lost:>6} {loss_pct:>7.2f} {outage_ms:>10.1f} {outage_start_ms:>9.1f} '
+              '{reordered:>9} {delay_ms:>9.2f} {delay_max_ms:>9.2f}'.format(**row))
+    if filename:
+        with open(filename, 'w') as f:
+            w = csv.DictWriter(f, fieldnames=result_columns)
+            w.writeheader()
+            for row in rows:
+                w.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scheduled link failures and impairments with a UDP probe '
+                                                 'measuring their data-plane impact (root + Mininet).')
+    parser.add_argument('-s', '--spec', default='diamond.json',
+                        help='Topology spec (file name or name in topologies/).')
+    parser.add_argument('-g', '--generate', nargs='+', metavar=('KIND', 'ARG'),
+                        help='Generated topology instead of a spec: line N, ring N, grid ROWS COLS, fat_tree K '
+                             'or random N.')
+    parser.add_argument('-e', '--events', nargs='*', default=None,
+                        help='Event lines, e.g. "5 down r1 r2" "10 flap r1 r2 3 0.5 0.5" "20 loss r1 r2 5".')
+    parser.add_argument('-f', '--event-file', help='Read the event script from this file, one event per line.')
+    parser.add_argument('-b', '--bird', default='ospf', choices=protocols + ('none',),
+                        help='Routing protocol, or none with --static-routes.')
+    parser.add_argument('--preset', default='fast', choices=sorted(presets), help='BIRD timer preset.')
+    parser.add_argument('-r', '--static-routes', action='store_true', help='Install static routes instead.')
+    parser.add_argument('-p', '--profile', help='Shaping profile for every router interface.')
+    parser.add_argument('--rate', type=float, default=1000, help='Probe packets per second.')
+    parser.add_argument('--size', type=int, default=64, help='Probe payload bytes.')
+    parser.add_argument('--tail', type=float, default=10, help='Seconds to keep probing after the last event.')
+    parser.add_argument('-o', '--output', default='churn_probe.bin', help='Probe record file.')
+    parser.add_argument('--csv', help='Also write the results to this CSV file.')
+    parser.add_argument('-l', '--log-level', default='warning', help='Mininet log level.')
+    args = parser.parse_args()
+
+    from mininet.log import setLogLevel
+    setLogLevel(args.log_level)
+    if args.generate:
+        spec = generators[args.generate[0]](*[int(a) for a in args.generate[1:]])
+    else:
+        spec = load_spec(args.spec)
+    if args.event_file:
+        with open(args.event_file) as f:
+            lines = f.readlines()
+    else:
+        lines = default_events if args.events is None else args.events
+    protocol = None if args.bird == 'none' else args.bird
+    rows = run_churn(compile_spec(spec), parse_events(lines), protocol, args.preset, args.static_routes,
+                     args.profile, args.rate, args.size, args.tail, args.output)
+    print_results(rows, args.csv)
@@ -0,0 +1,284 @@
+#!/usr/bin/python
+import argparse
+import csv
+import ipaddress
+import os
+import re
+import selectors
+import socket
+from time import sleep, time
+
+from birdconf import bird_configs, node_dir, presets, protocols
+from topogen import compile_spec, generators, load_spec, static_routes
+
+result_columns = ['protocol', 'preset', 'event', 'routers', 'converged', 'network_s', 'median_s', 'max_router']
+_prefix_re = re.compile(r'^(\d+\.\d+\.\d+\.\d+/\d+)\s')
+_via_re = re.compile(r'via (\d+\.\d+\.\d+\.\d+)')
+
+
+def expected_routes(model, down=()):
+    # What every router's table should hold once the network has converged with the links in
+    # `down` ((a, b) node pairs) failed: {router: {prefix: set of acceptable gateways, or None for
+    # a connected subnet}}. Any equal-cost next hop is acceptable, since BIRD's tie-breaking is its own.
+    down = set(frozenset(pair) for pair in down)
+    model = dict(model, links=[link for link in model['links'] if frozenset(link['nodes']) not in down])
+    expected = dict((router, dict()) for router in model['routers'])
+    for link in model['links']:
+        for node in link['nodes']:
+            if node in expected:
+                expected[node][str(ipaddress.ip_interface(link['ips'][0]).network)] = None
+    for router, routes in static_routes(model, multipath=True).items():
+        for subnet, nexthops in routes:
+            expected[router][subnet] = set(gateway for gateway, _ in nexthops)
+    return expected
+
+
+def converged(expected, table):
+    # A table {prefix: set of gateways} has converged when it holds exactly the expected prefixes,
+    # each through acceptable gateways only.
+    if table is None or set(table) != set(expected):
+        return False
+    return all(want is None or (table[prefix] and table[prefix] <= want) for prefix, want in expected.items())
+
+
+def parse_bird_routes(reply):
+    # `show route primary` reply from the BIRD control socket -> {prefix: set of gateways}.
+    table = dict()
+    prefix = None
+    for line in reply.splitlines():
+        text = line[5:] if re.match(r'\d{4}[- ]', line) else line[1:] if line.startswith(' ') else line
+        m = _prefix_re.match(text)
+        if m:
+            prefix = m.group(1)
+            table[prefix] = set(_via_re.findall(text))
+        elif prefix is not None:
+            table[prefix].update(_via_re.findall(text))
+    return table
+
+
+def parse_ip_routes(output):
+    # `ip -4 route show` (a netlink dump) -> {prefix: set of gateways}, multipath nexthop lines included.
+    table = dict()
+    prefix = None
+    for line in output.splitlines():
+        if not line.startswith((' ', '\t')):
+            prefix = line.split()[0] if line.strip() else None
+            if prefix is None or prefix == 'default':
+                prefix = None
+                continue
+            table[prefix] = set(_via_re.findall(line))
+        elif prefix is not None:
+            table[prefix].update(_via_re.findall(line))
+    return table
+
+
+class BirdSockets(object):
+    # One persistent control-socket connection per router, all queried at once through a selector,
+    # so a poll of N routers costs one round trip instead of N birdc processes.
+    def __init__(self, routers, base=None):
+        self.paths = dict((router, os.path.join(node_dir(router, base), 'bird.ctl')) for router in routers)
+        self.socks = dict()
+
+    def _connect(self, router):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.paths[router])
+            sock.settimeout(5)
+            banner = b''
+            while not banner.endswith(b'\n'):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise OSError('connection closed')
+                banner += chunk
+        except OSError:
+            sock.close()
+            return None
+        sock.setblocking(False)
+        self.socks[router] = sock
+        return sock
+
+    def poll(self):
+        # {router: table, or None while its daemon is not answering yet}.
+        tables = dict((router, None) for router in self.paths)
+        sel = selectors.DefaultSelector()
+        buffers = dict()
+        for router in self.paths:
+            sock = self.socks.get(router) or self._connect(router)
+            if sock is None:
+                continue
+            try:
+                sock.sendall(b'show route primary\n')
+            except OSError:
+                self.close(router)
+                continue
+            buffers[router] = b''
+            sel.register(sock, selectors.EVENT_READ, router)
+        deadline = time() + 5
+        while buffers and time() < deadline:
+            for key, _ in sel.select(timeout=max(0, deadline - time())):
+                router = key.data
+                try:
+                    chunk = key.fileobj.recv(1 << 16)
+                except OSError:
+                    chunk = b''
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    self.close(router)
+                    del buffers[router]
+                    continue
+                buffers[router] += chunk
+                # A reply ends with a line whose code is followed by a space instead of a dash.
+                if re.search(rb'(^|\n)\d{4} [^\n]*\n$', buffers[router]):
+                    sel.unregister(key.fileobj)
+                    tables[router] = parse_bird_routes(buffers.pop(router).decode())
+        for router in buffers:
+            self.close(router)
+        sel.close()
+        return tables
+
+    def close(self, router=None):
+        for name in [router] if router else list(self.socks):
+            sock = self.socks.pop(name, None)
+            if sock is not None:
+                sock.close()
+
+
+def netlink_poller(net, routers):
+    from routers import run_in_nodes
+    nodes = dict((net[router], router) for router in routers)
+
+    def poll():
+        results = run_in_nodes(dict((node, ['ip', '-4', 'route', 'show']) for node in nodes))
+        return dict((nodes[node], parse_ip_routes(output) if code == 0 else None)
+                    for node, (code, output) in results.items())
+    return poll
+
+
+def measure(poll, expected, t0, timeout=120, hold=3, interval=0.1):
+    # Poll all routers until every table has matched `expected` for `hold` seconds (or `timeout`
+    # passes). Returns {router: seconds from t0 to the start of its final converged stretch, or None}.
+    since = dict()
+    while True:
+        now = time()
+        tables = poll()
+        for router, want in expected.items():
+            if converged(want, tables.get(router)):
+                since.setdefault(router, now)
+            else:
+                since.pop(router, None)
+        if len(since) == len(expected) and now - max(since.values()) >= hold:
+            break
+        if now - t0 >= timeout:
+            break
+        sleep(max(0, interval - (time() - now)))
+    return dict((router, since[router] - t0 if router in since else None) for router in expected)
+
+
+def summarize(times):
+    done = sorted(t for t in times.values() if t is not None)
+    worst = max(times, key=lambda r: float('inf') if times[r] is None else times[r]) if times else None
+    return dict(routers=len(times), converged=len(done),
+                network_s=done[-1] if done and len(done) == len(times) else float('nan'),
+                median_s=done[len(done) // 2] if done else float('nan'), max_router=worst)
+
+
+def parse_event(text):
+    # 'down r1 r2' / 'up r1 r2'
+    action, a, b = text.split()
+    if action not in ('down', 'up'):
+        raise ValueError('Link events are "down A B" or "up A B", got {0!r}'.format(text))
+    return action, a, b
+
+
+def run_benchmark(model, protocol, preset, events=(), source='bird', timeout=120, hold=3, interval=0.1,
+                  bird='bird'):
+    # Start BIRD everywhere at a recorded time and time the convergence, then again after every link event.
+    from mininet.net import Mininet
+    from routers import SpecTopo, start_bird, stop_bird
+    net = Mininet(topo=SpecTopo(model=model), controller=None)
+    routers = list(model['routers'])
+    nodes = routers + list(model['hosts'])
+    rows = []
+    sockets = None
+    try:
+        net.start()
+        if source == 'bird':
+            sockets = BirdSockets(routers)
+            poll = sockets.poll
+        else:
+            poll = netlink_poller(net, routers)
+        down = set()
+        t0 = time()
+        errors = start_bird(net, bird_configs(model, protocol, preset), bird=bird)
+        if errors:
+            raise RuntimeError('bird failed to start:\n{0}'.format('\n'.join(errors)))
+        times = measure(poll, expected_routes(model), t0, timeout, hold, interval)
+        rows.append(dict(summarize(times), protocol=protocol, preset=preset, event='start'))
+        for action, a, b in events:
+            if action == 'down':
+                down.add((a, b))
+            else:
+                down.discard((a, b))
+                down.discard((b, a))
+            t0 = time()
+            net.configLinkStatus(a, b, action)
+            times = measure(poll, expected_routes(model, down), t0, timeout, hold, interval)
+            rows.append(dict(summarize(times), protocol=protocol, preset=preset,
+                             event='{0} {1}-{2}'.format(action, a, b)))
+    finally:
+        if sockets is not None:
+            sockets.close()
+        net.stop()
+        stop_bird(nodes)
+    return rows
+
+
+def print_results(rows, filename=None):
+    print('{0:<6} {1:<8} {2:<14} {3:>9} {4:>10} {5:>9} {6:>8}'
+          .format('proto', 'preset', 'event', 'converged', 'network s', 'median s', 'slowest'))
+    for row in rows:
+        print('{protocol:<6} {preset:<8} {event:<14} {converged:>4}/{routers:<4} {network_s:>10.2f} '
+              '{median_s:>9.2f} {max_router:>8}'.format(**row))
+    if filename:
+        with open(filename, 'w') as f:
+            w = csv.DictWriter(f, fieldnames=result_columns)
+            w.writeheader()
+            for row in rows:
+                w.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Routing convergence of the BIRD topologies (root + Mininet).')
+    parser.add_argument('-s', '--spec', default='diamond.json',
+                        help='Topology spec (file name or name in topologies/).')
+    parser.add_argument('-g', '--generate', nargs='+', metavar=('KIND', 'ARG'),
+                        help='Generated topology instead of a spec: line N, ring N, grid ROWS COLS, fat_tree K '
+                             'or random N.')
+    parser.add_argument('-p', '--protocols', nargs='+', default=['rip', 'ospf'], choices=protocols)
+    parser.add_argument('--presets', nargs='+', default=['default', 'fast'], choices=sorted(presets))
+    parser.add_argument('-e', '--events', nargs='*', default=['down r1 r2', 'up r1 r2'],
+                        help='Link events run in order after start-up convergence, e.g. "down r1 r2".')
+    parser.add_argument('--source', choices=['bird', 'netlink'], default='bird',
+                        help='Read routes from the BIRD control sockets or from the kernel (ip route).')
+    parser.add_argument('--timeout', type=float, default=300, help='Give up on a measurement after this long (s).')
+    parser.add_argument('--hold', type=float, default=3, help='Tables must stay converged this long (s).')
+    parser.add_argument('--interval', type=float, default=0.1, help='Polling interval (s).')
+    parser.add_argument('--csv', help='Also write the results to this CSV file.')
+    parser.add_argument('-l', '--log-level', default='warning', help='Mininet log level.')
+    args = parser.parse_args()
+
+    from mininet.log import setLogLevel
+    setLogLevel(args.log_level)
+    if args.generate:
+        spec = generators[args.generate[0]](*[int(a) for a in args.generate[1:]])
+    else:
+        spec = load_spec(args.spec)
+    model = compile_spec(spec)
+    events = [parse_event(e) for e in args.events]
+    rows = []
+    for protocol in args.protocols:
+        for preset in args.presets:
+            print('*** {0} with {1} timers on {2} routers'.format(protocol, preset, len(model['routers'])))
+            rows.extend(run_benchmark(model, protocol, preset, events, args.source, args.timeout, args.hold,
+                                      args.interval))
+    print_results(rows, args.csv)
@@ -0,0 +1,585 @@
+import os
+import re
+import shutil
+import tempfile
+from time import sleep, time
+import subprocess
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.node import OVSBridge
+from mininet.link import TCLink
+from mininet.util import dumpNodeConnections, quietRun
+from analysis import AnalysisPipeline, process_cell
+from iperfstream import JsonStream, StreamReader
+from live import LiveMonitor
+from metrics import bdp_packets
+from qdiscstats import default_interval as default_queue_interval, start_sampler, stop_sampler
+from sockstats import default_interval, start_samplers, stop_samplers
+from traces import iperf3_filename, qdisc_filename, sockstats_filename
+
+# Where the per-flow cwnd/RTT traces come from: the socket-stats sampler, or tcp_probe on kernels
+# that still have it.
+collectors = ('sockstats', 'tcpprobe')
+# The iperf client: iperf2 with 1 s -y C reports, or iperf3 --json-stream reports every
+# report_interval seconds, parsed into bounded per-flow ring buffers while the flow runs.
+clients = ('iperf', 'iperf3')
+default_report_interval = 0.1
+
+
+def cell_prefix(cell):
+    return '' if cell is None else 'c{0}'.format(cell)
+
+
+def cell_ip_base(cell):
+    # Concurrent cells get disjoint subnets so their flows can be told apart in the shared tcpprobe trace.
+    return '10.0.0.0/8' if cell is None else '10.{0}.0.0/16'.format(cell)
+
+
+def buffer_limit(params, rtt_ms, buffer_bdp):
+    # netem limit giving a link a buffer of buffer_bdp times its BDP at rtt_ms. netem also holds the
+    # packets of its own delay line (rate * one-way delay), so those come on top.
+    return max(1, int(round(bdp_packets(params['bw'], float(params['delay'][:-2])) +
+                            buffer_bdp * bdp_packets(params['bw'], rtt_ms))))
+
+
+def link_params(delay, buffer_bdp=None):
+    # TCLink parameters of the bottleneck (s1-s2), access (s1-s3, s2-s4) and host links for a delay.
+    # By default the queues are fixed multiples of the delay: 82*delay is just the s1-s2 delay line,
+    # 21*delay*20/100 is 0.1x the access links' BDP. With buffer_bdp the narrowest of the two links,
+    # where the flows actually queue up (the 252 Mbit access links), gets that fraction of its BDP at
+    # the base RTT (2 * delay) instead.
+    br_params = dict(bw=984, delay='{0}ms'.format(delay), max_queue_size=82*delay,
+                     use_htb=True)
+    ar_params = dict(bw=252, delay='0ms', max_queue_size=(21*delay*20)/100,
+                     use_htb=True)
+    hi_params = dict(bw=960, delay='0ms', max_queue_size=80*delay, use_htb=True)
+    if buffer_bdp is not None:
+        narrowest = min((br_params, ar_params), key=lambda params: params['bw'])
+        narrowest['max_queue_size'] = buffer_limit(narrowest, 2 * delay, buffer_bdp)
+    return br_params, ar_params, hi_params
+
+
+class DumbbellTopo(Topo):
+    def build(self, delay=2, cell=None, buffer_bdp=None):
+        # A `cell` number prefixes every switch, host and interface name so that several cells can run at once.
+        prefix = cell_prefix(cell)
+        # Mininet would otherwise take every dpid from the cell number at the front of the name.
+        dpid_base = (cell or 0) << 8
+        br_params, ar_params, hi_params = link_params(delay, buffer_bdp)
+        s1 = self.addSwitch(prefix + 's1', dpid='{0:x}'.format(dpid_base + 1))
+        s2 = self.addSwitch(prefix + 's2', dpid='{0:x}'.format(dpid_base + 2))
+        s3 = self.addSwitch(prefix + 's3', dpid='{0:x}'.format(dpid_base + 3))
+        s4 = self.addSwitch(prefix + 's4', dpid='{0:x}'.format(dpid_base + 4))
+        self.addLink(s1, s2, cls=TCLink, **br_params)
+        self.addLink(s1, s3, cls=TCLink, **ar_params)
+        self.addLink(s2, s4, cls=TCLink, **ar_params)
+        h1 = self.addHost(prefix + 'h1')
+        h2 = self.addHost(prefix + 'h2')
+        h3 = self.addHost(prefix + 'h3')
+        h4 = self.addHost(prefix + 'h4')
+        self.addLink(s3, h1, cls=TCLink, **hi_params)
+        self.addLink(s3, h3, cls=TCLink, **hi_params)
+        self.addLink(s4, h2, cls=TCLink, **hi_params)
+        self.addLink(s4, h4, cls=TCLink, **hi_params)
+
+
+class ManyDumbbellTopo(Topo):
+    # DumbbellTopo with `pairs` sender/receiver pairs: senders h1, h3, ... behind s3, receivers
+    # h2, h4, ... behind s4. pair_delays adds a per-pair one-way delay (ms, cycled) on the sender's
+    # host link for heterogeneous RTTs. Links are plain veths; the qdiscs a TCLink would install are
+    # collected in self.shaping as (node, intf, params) and installed in bulk by apply_shaping().
+    # bulk=False uses TCLinks instead, for comparison.
+    def build(self, pairs=2, delay=2, pair_delays=None, cell=None, bulk=True, buffer_bdp=None):
+        prefix = cell_prefix(cell)
+        dpid_base = (cell or 0) << 8
+        br_params, ar_params, hi_params = link_params(delay, buffer_bdp)
+        self.shaping = []
+        ports = dict()
+
+        def link(node1, node2, params):
+            names = []
+            for node in (node1, node2):
+                # Mininet numbers switch ports from 1 and host interfaces from 0.
+                port = ports.get(node, 1 if self.isSwitch(node) else 0)
+                ports[node] = port + 1
+                names.append('{0}-eth{1}'.format(node, port))
+            if not bulk:
+                self.addLink(node1, node2, intfName1=names[0], intfName2=names[1], cls=TCLink, **params)
+                return
+            self.shaping.extend([(node1, names[0], params), (node2, names[1], params)])
+            self.addLink(node1, node2, intfName1=names[0], intfName2=names[1])
+
+        s1, s2, s3, s4 = [self.addSwitch(prefix + 's{0}'.format(i), dpid='{0:x}'.format(dpid_base + i))
+                          for i in range(1, 5)]
+        link(s1, s2, br_params)
+        link(s1, s3, ar_params)
+        link(s2, s4, ar_params)
+        for i in range(pairs):
+            sender = self.addHost(prefix + 'h{0}'.format(2 * i + 1))
+            receiver = self.addHost(prefix + 'h{0}'.format(2 * i + 2))
+            extra = pair_delays[i % len(pair_delays)] if pair_delays else 0
+            link(s3, sender, dict(hi_params, delay='{0}ms'.format(extra)))
+            link(s4, receiver, hi_params)
+
+
+def tc_batch_lines(intf, params):
+    # The htb + netem tree TCLink(use_htb=True) builds, with the same handles, as tc -batch lines.
+    return ['qdisc add dev {0} root handle 5:0 htb default 1'.format(intf),
+            'class add dev {0} parent 5:0 classid 5:1 htb rate {1}Mbit burst 15k'.format(intf, params['bw']),
+            'qdisc add dev {0} parent 5:1 handle 10: netem delay {1} limit {2}'
+            .format(intf, params['delay'], int(params['max_queue_size']))]
+
+
+def apply_shaping(net, shaping):
+    # One tc -batch for every interface in the root namespace (all switch ports) and one per host
+    # namespace, all running at once, instead of several node.cmd round trips per interface.
+    batches = dict()
+    for node_name, intf, params in shaping:
+        node = net[node_name]
+        batches.setdefault(node if node.inNamespace else None, []).extend(tc_batch_lines(intf, params))
+    directory = tempfile.mkdtemp(prefix='tc_batch_')
+    procs = []
+    try:
+        for i, (node, lines) in enumerate(batches.items()):
+            filename = os.path.join(directory, '{0}.tc'.format(i))
+            with open(filename, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            cmd = ['tc', '-force', '-batch', filename]
+            if node is not None:
+                cmd = ['mnexec', '-a', str(node.pid)] + cmd
+            procs.append((node, subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                 universal_newlines=True)))
+        errors = []
+        for node, proc in procs:
+            output = proc.communicate()[0]
+            if proc.returncode != 0:
+                errors.append('{0}: {1}'.format(node or 'root namespace', output.strip()))
+    finally:
+        shutil.rmtree(directory)
+    return errors
+
+
+def clean_tcpprobe_procs():
+    print('Killing any running tcpprobe processes...')
+    procs = quietRun('pgrep -f /proc/net/tcpprobe').split()
+    for proc in procs:
+        output = quietRun('sudo kill -KILL {0}'.format(proc.rstrip()))
+        if output!='':
+            print(output)
+
+
+def dumbbell_test():
+    topo = DumbbellTopo(delay=21)
+    net = Mininet(topo)
+    net.start()
+    print("Dumping host connections...")
+    dumpNodeConnections(net.hosts)
+    print("Testing network connectivity...")
+    h1, h2 = net.get('h1', 'h2')
+    h3, h4 = net.get('h3', 'h4')
+    for i in range(1, 10):
+        net.pingFull(hosts=(h1, h2))
+    for i in range(1, 10):
+        net.pingFull(hosts=(h2, h1))
+    for i in range(1, 10):
+        net.pingFull(hosts=(h4, h3))
+    for i in range(1, 10):
+        net.pingFull(hosts=(h3, h4))
+    print("Testing bandwidth between h1 and h2...")
+    net.iperf(hosts=(h1, h2), fmt='m', seconds=10, port=5001)
+    print("Testing bandwidth between h3 and h4...")
+    net.iperf(hosts=(h3, h4), fmt='m', seconds=10, port=5001)
+    print("Stopping test...")
+    net.stop()
+def start_tcpprobe(filename):
+    print('Unloading tcp_probe module...')
+    clean_tcpprobe_procs()
+    output = quietRun('sudo rmmod tcp_probe')
+    if output != '':
+        print(output.rstrip())
+    print('Loading tcp_probe module...')
+    output = quietRun('sudo modprobe tcp_probe full=1')
+    if output != '':
+        print(output.rstrip())
+    print('Saving tcpprobe output to: {0}'.format(filename))
+    return subprocess.Popen('sudo cat /proc/net/tcpprobe > {0}'.format(filename), shell=True)
+def start_net(delay, cell=None, buffer_bdp=None):
+    print('*** Creating topology for delay={0}ms...'.format(delay))
+    topo = DumbbellTopo(delay=delay, cell=cell, buffer_bdp=buffer_bdp)
+    if cell is not None:
+        # Concurrent cells cannot share the default controller's port, so use standalone bridges.
+        net = Mininet(topo, switch=OVSBridge, controller=None, ipBase=cell_ip_base(cell))
+    else:
+        net = Mininet(topo)
+    net.start()
+    return net
+
+
+def start_many_net(pairs, delay, pair_delays=None, cell=None, bulk=True, buffer_bdp=None):
+    # ManyDumbbellTopo on standalone bridges (a reactive controller would have to learn every one
+    # of the hosts), with the shaping applied in bulk. Prints the time of each setup phase.
+    print('*** Creating topology with {0} pairs for delay={1}ms...'.format(pairs, delay))
+    start = time()
+    topo = ManyDumbbellTopo(pairs=pairs, delay=delay, pair_delays=pair_delays, cell=cell, bulk=bulk,
+                            buffer_bdp=buffer_bdp)
+    net = Mininet(topo, switch=OVSBridge, controller=None, ipBase=cell_ip_base(cell))
+    built = time()
+    errors = apply_shaping(net, topo.shaping)
+    shaped = time()
+    net.start()
+    print('*** Setup: build {0:.2f}s, shaping {1:.2f}s, start {2:.2f}s'
+          .format(built - start, shaped - built, time() - shaped))
+    if errors:
+        net.stop()
+        raise RuntimeError('tc -batch failed:\n{0}'.format('\n'.join(errors)))
+    return net
+
+
+def start_server(host, client='iperf'):
+    if client == 'iperf3':
+        return host.popen(['iperf3', '-s', '-p', '5001'])
+    return host.popen(['iperf', '-s', '-p', '5001', '-w', '16m'])
+
+
+def start_client(sender, receiver, alg, delay, iperf_runtime, cell=None, client='iperf',
+                 report_interval=default_report_interval):
+    # One sender -> receiver flow logging to iperf_<alg>_<client>-<server>_<delay>ms.txt (iperf2) or
+    # iperf3_<alg>_<client>-<server>_<delay>ms.json. Returns something to wait() on; for iperf3 that is
+    # the StreamReader, whose .stream holds the flow's intervals so far. iperf3's control connection
+    # also goes to port 5001 and stays open, so the socket-stats logs hold it next to the data
+    # connection; their readers keep the latter (sockstats.data_socket).
+    prefix = cell_prefix(cell)
+    flow, server = sender.name[len(prefix):], receiver.name[len(prefix):]
+    if client == 'iperf3':
+        proc = sender.popen(['iperf3', '-c', receiver.IP(), '-p', '5001', '-i', str(report_interval), '--json-stream',
+                             '--forceflush', '-w', '16m', '-M', '1460', '-N', '-C', alg, '-t', str(iperf_runtime)])
+        reader = StreamReader(proc, JsonStream(flow), iperf3_filename(alg, flow, server, delay))
+        reader.start()
+        return reader
+    # exec, so that terminating the process stops iperf itself and not just the shell.
+    return sender.popen('exec iperf -c {0} -p 5001 -i 1 -w 16m -M 1460 -N -Z {1} -t {2} -y C > '
+                        'iperf_{1}_{3}-{4}_{5}ms.txt'
+                        .format(receiver.IP(), alg, iperf_runtime, flow, server, delay), shell=True)
+
+
+def report_streams(clients):
+    # One line per iperf3 flow from its ring buffer: intervals, mean throughput, retransmits and RTT.
+    for reader in clients:
+        if not isinstance(reader, StreamReader):
+            continue
+        stream = reader.stream
+        rows = stream.ring.view()
+        if stream.error or not len(rows):
+            print('*** {0}: no intervals ({1})'.format(stream.flow, stream.error or 'empty stream'))
+            continue
+        print('*** {0}: {1} intervals, {2:.1f} Mbps, {3} retransmits, RTT {4:.2f}ms'
+              .format(stream.flow, stream.ring.count, rows['Mbps'].mean(), int(rows['retransmits'].sum()),
+                      rows['rtt'].mean() / 1000.0))
+
+
+def pause(seconds, monitor=None):
+    # Wait between the clients' starts; a live monitor cuts the wait short when it aborts the cell.
+    # Returns True if the cell was aborted, in which case no further client should be started.
+    if monitor is None:
+        sleep(seconds)
+        return False
+    return monitor.sleep(seconds)
+
+
+def start_monitor(net, alg, delay, live, pairs=2, cell=None):
+    # Follow the cell's output files live (see live.py); `live` holds the LiveMonitor options.
+    prefix = cell_prefix(cell)
+    senders = ['h{0}'.format(2 * i + 1) for i in range(pairs)]
+    monitor = LiveMonitor(alg, delay, dict((name, net[prefix + name].IP()) for name in senders), since=time() - 1,
+                          **live)
+    monitor.start()
+    return monitor
+
+
+def stop_monitor(monitor):
+    # Stop following; True if the monitor aborted the cell.
+    if monitor is None:
+        return False
+    monitor.stop()
+    if monitor.aborted:
+        print('*** Cell {0}/{1}ms was aborted: {2}'.format(monitor.alg, monitor.delay, monitor.aborted))
+    return bool(monitor.aborted)
+
+
+def run_many_flows(net, alg, delay, pairs, iperf_runtime, iperf_delayed_start, cell=None, client='iperf',
+                   report_interval=default_report_interval, monitor=None):
+    # Like run_flows for `pairs` pairs: the first pair starts at once, every other pair after
+    # iperf_delayed_start, each writing its own iperf_<alg>_<client>-<server>_<delay>ms.txt (.json for iperf3).
+    prefix = cell_prefix(cell)
+    hosts = [(net[prefix + 'h{0}'.format(2 * i + 1)], net[prefix + 'h{0}'.format(2 * i + 2)]) for i in range(pairs)]
+    host_addrs = dict()
+    for sender, receiver in hosts:
+        host_addrs[sender.name[len(prefix):]] = sender.IP()
+        host_addrs[receiver.name[len(prefix):]] = receiver.IP()
+    print("*** Starting {0} iperf servers...".format(pairs))
+    servers = [start_server(receiver, client) for _, receiver in hosts]
+    clients = []
+    for i, (sender, receiver) in enumerate(hosts):
+        if i == 1:
+            print("*** Waiting for {0}sec...".format(iperf_delayed_start))
+            if pause(iperf_delayed_start, monitor):
+                print("*** Cell aborted, not starting the other {0} iperf clients".format(pairs - 1))
+                break
+            print("*** Starting the other {0} iperf clients...".format(pairs - 1))
+        clients.append(start_client(sender, receiver, alg, delay, iperf_runtime, cell, client, report_interval))
+        if monitor is not None:
+            monitor.watch(clients[-1])
+    print("*** Waiting {0}sec for iperf clients to finish...".format(iperf_runtime))
+    for proc in clients:
+        proc.wait()
+    report_streams(clients)
+    print('*** Terminate the iperf servers...')
+    for proc in servers:
+        proc.terminate()
+    for proc in servers:
+        proc.wait()
+    return host_addrs
+
+
+def dumbbell_links(net, cell=None):
+    # (link, TCLink params role) for every shaped link: 0 bottleneck, 1 access, 2 host.
+    p = cell_prefix(cell)
+    pairs = [('s1', 's2', 0), ('s1', 's3', 1), ('s2', 's4', 1),
+             ('s3', 'h1', 2), ('s3', 'h3', 2), ('s4', 'h2', 2), ('s4', 'h4', 2)]
+    return [(link, role) for a, b, role in pairs for link in net.linksBetween(net[p + a], net[p + b])]
+
+
+def queue_devs(net, delay, cell=None, buffer_bdp=None):
+    # The qdisc sampler's view of the bottleneck and access links: both ends of each, the end the
+    # data (sender -> receiver) leaves through labelled with the link's role, the other with role-ack.
+    p = cell_prefix(cell)
+    order = [p + 's3', p + 's1', p + 's2', p + 's4']
+    br_params, ar_params, _ = link_params(delay, buffer_bdp)
+    devs = []
+    for link, role in dumbbell_links(net, cell):
+        if role == 2:
+            continue
+        params, name = (br_params, 'bottleneck') if role == 0 else (ar_params, 'access')
+        for intf, other in ((link.intf1, link.intf2), (link.intf2, link.intf1)):
+            data = order.index(intf.node.name) < order.index(other.node.name)
+            devs.append(dict(intf=intf.name, role=name if data else name + '-ack',
+                             limit=int(params['max_queue_size']), mbps=params['bw'],
+                             delay_ms=float(params['delay'][:-2])))
+    return devs
+
+
+def reconfigure_net(net, delay, cell=None, buffer_bdp=None):
+    # Move a running dumbbell to another delay by changing the netem qdisc TCLink put under the
+    # htb class 5:1 of every shaped interface, instead of rebuilding the whole network.
+    params = link_params(delay, buffer_bdp)
+    for link, role in dumbbell_links(net, cell):
+        for intf in (link.intf1, link.intf2):
+            output = intf.cmd('tc qdisc change dev {0} parent 5:1 handle 10: netem delay {1} limit {2}'
+                              .format(intf.name, params[role]['delay'], int(params[role]['max_queue_size'])))
+            if output.strip():
+                print(output.rstrip())
+
+
+def verify_net(net, delay, cell=None, buffer_bdp=None):
+    # Read the netem parameters back and compare them with what link_params() asks for at this delay.
+    params = link_params(delay, buffer_bdp)
+    errors = []
+    for link, role in dumbbell_links(net, cell):
+        for intf in (link.intf1, link.intf2):
+            m = re.search(r'netem 10: .*limit (\d+) delay ([\d.]+)(us|ms|s)',
+                          intf.cmd('tc qdisc show dev {0}'.format(intf.name)))
+            want_delay = float(params[role]['delay'][:-2])
+            want_limit = int(params[role]['max_queue_size'])
+            if not m:
+                errors.append('{0}: no netem qdisc'.format(intf.name))
+                continue
+            got_delay = float(m.group(2)) * dict(us=0.001, ms=1, s=1000)[m.group(3)]
+            if int(m.group(1)) != want_limit or abs(got_delay - want_delay) > 0.001:
+                errors.append('{0}: limit {1} delay {2}ms, expected limit {3} delay {4}ms'
+                              .format(intf.name, m.group(1), got_delay, want_limit, want_delay))
+    return errors
+
+
+def set_congestion_control(net, alg, cell=None):
+    # iperf -Z already picks the algorithm per socket; setting the namespace default too lets
+    # verify catch an algorithm whose module is not available.
+    p = cell_prefix(cell)
+    errors = []
+    for name in ('h1', 'h3'):
+        host = net[p + name]
+        host.cmd('sysctl -w net.ipv4.tcp_congestion_control={0}'.format(alg))
+        current = host.cmd('sysctl -n net.ipv4.tcp_congestion_control').strip()
+        if current != alg:
+            errors.append('{0}: tcp_congestion_control is {1}, expected {2}'.format(name, current, alg))
+    return errors
+
+
+def run_flows(net, alg, delay, iperf_runtime, iperf_delayed_start, cell=None, client='iperf',
+              report_interval=default_report_interval, monitor=None):
+    prefix = cell_prefix(cell)
+    h1, h2, h3, h4 = net.get(prefix + 'h1', prefix + 'h2', prefix + 'h3', prefix + 'h4')
+    host_addrs = dict({'h1': h1.IP(), 'h2': h2.IP(), 'h3': h3.IP(), 'h4': h4.IP()})
+    print('Host addrs: {0}'.format(host_addrs))
+    popens = dict()
+    print("*** Starting iperf servers h2 and h4...")
+    popens[h2] = start_server(h2, client)
+    popens[h4] = start_server(h4, client)
+    print("*** Starting iperf client h1...")
+    popens[h1] = start_client(h1, h2, alg, delay, iperf_runtime, cell, client, report_interval)
+    print("*** Waiting for {0}sec...".format(iperf_delayed_start))
+    if monitor is not None:
+        monitor.watch(popens[h1])
+    clients = [popens[h1]]
+    if pause(iperf_delayed_start, monitor):
+        # A client started now would only leave a truncated log behind.
+        print("*** Cell aborted, not starting iperf client h3")
+    else:
+        print("*** Starting iperf client h3...")
+        popens[h3] = start_client(h3, h4, alg, delay, iperf_runtime, cell, client, report_interval)
+        clients.append(popens[h3])
+        if monitor is not None:
+            monitor.watch(popens[h3])
+    print("*** Waiting {0}sec for iperf clients to finish...".format(iperf_runtime))
+    for proc in clients:
+        proc.wait()
+    report_streams(clients)
+    print('*** Terminate the iperf servers...')
+    popens[h2].terminate()
+    popens[h4].terminate()
+    popens[h2].wait()
+    popens[h4].wait()
+    return host_addrs
+
+
+def stop_tcpprobe(tcpprobe_proc):
+    tcpprobe_proc.terminate()
+    tcpprobe_proc.wait()
+    clean_tcpprobe_procs()
+
+
+def start_recording(net, alg, delay, collector='sockstats', pairs=2, cell=None, interval=default_interval,
+                    queue_interval=default_queue_interval, buffer_bdp=None):
+    # Record the senders' TCP state for one cell: one socket-stats recorder in every sender's namespace
+    # (sockstats_<alg>_<sender>_<delay>ms.bin, iperf port only), or the tcpprobe trace. Unless
+    # queue_interval is 0 the bottleneck and access queues are sampled too (qdisc_<alg>_<delay>ms.bin).
+    # Returns (collector processes, qdisc recorder or None) for stop_recording().
+    queue_proc = None
+    if queue_interval:
+        print('*** Starting qdisc recording every {0:g}ms...'.format(queue_interval * 1000))
+        queue_proc = start_sampler(queue_devs(net, delay, cell, buffer_bdp), qdisc_filename(alg, delay),
+                                   queue_interval)
+    if collector == 'tcpprobe':
+        print('*** Starting tcpprobe recording...')
+        return [start_tcpprobe('tcpprobe_{0}_{1}ms.txt'.format(alg, delay))], queue_proc
+    prefix = cell_prefix(cell)
+    senders = [net[prefix + 'h{0}'.format(2 * i + 1)] for i in range(pairs)]
+    print('*** Starting socket-stats recording every {0:g}ms...'.format(interval * 1000))
+    return start_samplers(senders, dict((host, sockstats_filename(alg, host.name[len(prefix):], delay))
+                                        for host in senders), interval=interval), queue_proc
+
+
+def stop_recording(recorders, collector='sockstats'):
+    procs, queue_proc = recorders
+    if collector == 'tcpprobe':
+        stop_tcpprobe(procs[0])
+    else:
+        stop_samplers(procs)
+    if queue_proc is not None:
+        stop_sampler(queue_proc)
+
+
+def run_cell(alg, delay, iperf_runtime, iperf_delayed_start, cell=None, probe=True, process=True, use_cache=True,
+             pipeline=None, pairs=None, pair_delays=None, collector='sockstats', stats_interval=default_interval,
+             client='iperf', report_interval=default_report_interval, live=None,
+             queue_interval=default_queue_interval, buffer_bdp=None):
+    # One (algorithm, delay) cell. The scheduler runs several at once under distinct cell numbers,
+    # records a shared tcpprobe trace itself (probe=False) and processes the data afterwards. With a
+    # pipeline the processing is queued so that it overlaps with the next cell. With `live` (LiveMonitor
+    # options) the cell is followed as it runs, and a cell its abort rules stop is not processed.
+    if pairs is None:
+        net = start_net(delay, cell, buffer_bdp)
+    else:
+        net = start_many_net(pairs, delay, pair_delays, cell, buffer_bdp=buffer_bdp)
+    if probe:
+        recorders = start_recording(net, alg, delay, collector, pairs or 2, cell, stats_interval, queue_interval,
+                                    buffer_bdp)
+    monitor = start_monitor(net, alg, delay, live, pairs or 2, cell) if live is not None else None
+    if pairs is None:
+        host_addrs = run_flows(net, alg, delay, iperf_runtime, iperf_delayed_start, cell, client, report_interval,
+                               monitor)
+    else:
+        host_addrs = run_many_flows(net, alg, delay, pairs, iperf_runtime, iperf_delayed_start, cell, client,
+                                    report_interval, monitor)
+    if probe:
+        stop_recording(recorders, collector)
+    aborted = stop_monitor(monitor)
+    print("*** Stopping test...")
+    net.stop()
+    if process and not aborted and pipeline is not None:
+        print('*** Queueing data processing...')
+        pipeline.submit(alg, delay, host_addrs)
+    elif process and not aborted:
+        print('*** Processing data...')
+        process_cell(alg, delay, host_addrs, use_cache)
+    return host_addrs
+
+
+def tcp_tests_reuse(algs, delays, iperf_runtime, iperf_delayed_start, pipeline, collector='sockstats',
+                    stats_interval=default_interval, client='iperf', report_interval=default_report_interval,
+                    live=None, queue_interval=default_queue_interval, buffer_bdp=None):
+    # Same matrix as tcp_tests, but the dumbbell is built once and every further cell only
+    # changes the netem delay/limit in place and the congestion control default.
+    net = None
+    try:
+        for alg in algs:
+            print('*** Starting test for algorithm={0}...'.format(alg))
+            for delay in delays:
+                print('*** Starting test for delay={0}ms...'.format(delay))
+                start = time()
+                if net is None:
+                    net = start_net(delay, buffer_bdp=buffer_bdp)
+                else:
+                    reconfigure_net(net, delay, buffer_bdp=buffer_bdp)
+                errors = verify_net(net, delay, buffer_bdp=buffer_bdp) + set_congestion_control(net, alg)
+                print('*** Cell setup took {0:.2f}s'.format(time() - start))
+                if errors:
+                    raise RuntimeError('Cell {0}/{1}ms is misconfigured:\n{2}'.format(alg, delay, '\n'.join(errors)))
+                recorders = start_recording(net, alg, delay, collector, interval=stats_interval,
+                                            queue_interval=queue_interval, buffer_bdp=buffer_bdp)
+                monitor = start_monitor(net, alg, delay, live) if live is not None else None
+                host_addrs = run_flows(net, alg, delay, iperf_runtime, iperf_delayed_start, client=client,
+                                       report_interval=report_interval, monitor=monitor)
+                stop_recording(recorders, collector)
+                if stop_monitor(monitor):
+                    continue
+                print('*** Queueing data processing...')
+                pipeline.submit(alg, delay, host_addrs)
+    finally:
+        if net is not None:
+            print("*** Stopping test...")
+            net.stop()
+
+
+def tcp_tests(algs, delays, iperf_runtime, iperf_delayed_start, use_cache=True, reuse=False, analysis_workers=1,
+              pairs=None, pair_delays=None, collector='sockstats', stats_interval=default_interval, client='iperf',
+              report_interval=default_report_interval, live=None, queue_interval=default_queue_interval,
+              buffer_bdp=None):
+    print("*** Tests settings:\n - Algorithms: {0}\n - delays: {1}\n - Iperf runtime: {2}\n - Iperf delayed start: {3}"
+          .format(algs, delays, iperf_runtime, iperf_delayed_start))
+    pipeline = AnalysisPipeline(analysis_workers, use_cache=use_cache)
+    try:
+        if reuse:
+            tcp_tests_reuse(algs, delays, iperf_runtime, iperf_delayed_start, pipeline, collector, stats_interval,
+                            client, report_interval, live, queue_interval, buffer_bdp)
+            return
+        for alg in algs:
+            print('*** Starting test for algorithm={0}...'.format(alg))
+            for delay in delays:
+                print('*** Starting test for delay={0}ms...'.format(delay))
+                run_cell(alg, delay, iperf_runtime, iperf_delayed_start, pipeline=pipeline, pairs=pairs,
+                         pair_delays=pair_delays, collector=collector, stats_interval=stats_interval, client=client,
+                         report_interval=report_interval, live=live, queue_interval=queue_interval,
+                         buffer_bdp=buffer_bdp)
+    finally:
+        print('*** Waiting for data processing to finish...')
+        pipeline.close()
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+import argparse
+import csv
+import threading
+from time import sleep, time
+
+from shaping import parse_rate, resolve
+from topogen import line
+
+result_columns = ['hops', 'test', 'offered_mbps', 'mbps', 'kpps', 'loss_pct', 'softirq_pct', 'softirq_max_pct',
+                  'router_kpps_min', 'router_drops', 'shaped_pct']
+
+# h1 -> h2 load patterns: iperf2 client arguments. UDP at a rate no LinuxRouter chain reaches, so the
+# forwarding path (or the sender) is what limits it.
+tests = dict(
+    udp_small=['-u', '-b', '10G', '-l', '64'],
+    udp_large=['-u', '-b', '10G', '-l', '1470'],
+    tcp=['-P', '4', '-w', '16m', '-M', '1460'],
+)
+
+
+def read_cpu_stat():
+    # /proc/stat -> {cpu: (softirq jiffies, total jiffies)} for every cpuN line. softirq time is not
+    # accounted per network namespace, and pinning a router does not help: a veth hands the packet to
+    # the receiving side on the sending CPU, so the whole chain is forwarded in the softirqs of the
+    # CPU the iperf client sends from. This is the forwarding work of all routers together.
+    cpus = dict()
+    with open('/proc/stat') as f:
+        for line in f:
+            if line.startswith('cpu') and line[3].isdigit():
+                fields = line.split()
+                values = [int(v) for v in fields[1:9]]
+                cpus[fields[0]] = (values[5], sum(values))
+    return cpus
+
+
+def read_net_dev(pid):
+    # /proc/<pid>/net/dev shows the network namespace of that process, so a node's counters can be
+    # read without running anything inside it: {intf: (rx_bytes, rx_packets, rx_drop, tx_bytes, tx_packets,
+    # tx_drop)}.
+    counters = dict()
+    with open('/proc/{0}/net/dev'.format(pid)) as f:
+        for line in f:
+            if ':' not in line:
+                continue
+            intf, data = line.split(':', 1)
+            v = [int(x) for x in data.split()]
+            counters[intf.strip()] = (v[0], v[1], v[3], v[8], v[9], v[11])
+    return counters
+
+
+class ForwardingSampler(threading.Thread):
+    # (time, cpu softirq counters, {node: interface counters}) every `interval` seconds.
+    def __init__(self, pids, interval=0.5):
+        super(ForwardingSampler, self).__init__()
+        self.daemon = True
+        self.pids = pids
+        self.interval = interval
+        self.samples = []
+        self.done = threading.Event()
+
+    def run(self):
+        next_at = time()
+        while not self.done.is_set():
+            self.samples.append((time(), read_cpu_stat(), dict((node, read_net_dev(pid))
+                                                               for node, pid in self.pids.items())))
+            next_at += self.interval
+            self.done.wait(max(0, next_at - time()))
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+
+def softirq_pct(before, after):
+    # (mean softirq % over all cpus, highest single-cpu softirq %) between two read_cpu_stat() snapshots.
+    per_cpu = []
+    soft_sum = total_sum = 0
+    for cpu, (soft, total) in after.items():
+        d_soft, d_total = soft - before[cpu][0], total - before[cpu][1]
+        soft_sum += d_soft
+        total_sum += d_total
+        if d_total > 0:
+            per_cpu.append(100.0 * d_soft / d_total)
+    return (100.0 * soft_sum / total_sum if total_sum else float('nan')), max(per_cpu or [float('nan')])
+
+
+def summarize_run(samples, model, warmup=1.0, cooldown=0.5):
+    # Rates over the steady part of one run: the samples from `warmup` after the first to `cooldown`
+    # before the last.
+    t_first, t_last = samples[0][0], samples[-1][0]
+    window = [s for s in samples if t_first + warmup <= s[0] <= t_last - cooldown] or [samples[0], samples[-1]]
+    (t0, cpu0, dev0), (t1, cpu1, dev1) = window[0], window[-1]
+    dt = t1 - t0 or float('nan')
+
+    def delta(node, intf, i):
+        return dev1[node][intf][i] - dev0[node][intf][i]
+    h1_intf = [intf for link in model['links'] for n, intf in zip(link['nodes'], link['intfs']) if n == 'h1'][0]
+    h2_intf = [intf for link in model['links'] for n, intf in zip(link['nodes'], link['intfs']) if n == 'h2'][0]
+    sent_pkts = delta('h1', h1_intf, 4)
+    got_pkts = delta('h2', h2_intf, 1)
+    router_kpps = []
+    drops = 0
+    for router in model['routers']:
+        router_kpps.append(sum(delta(router, intf, 4) for intf in dev1[router] if intf != 'lo') / dt / 1000.0)
+        drops += sum(delta(router, intf, 2) + delta(router, intf, 5) for intf in dev1[router])
+    peak = max(softirq_pct(a[1], b[1])[1] for a, b in zip(window, window[1:])) if len(window) > 1 else float('nan')
+    return dict(offered_mbps=delta('h1', h1_intf, 3) * 8 / dt / 1e6, mbps=delta('h2', h2_intf, 0) * 8 / dt / 1e6,
+                kpps=got_pkts / dt / 1000.0,
+                loss_pct=100.0 * max(0, sent_pkts - got_pkts) / sent_pkts if sent_pkts else float('nan'),
+                softirq_pct=softirq_pct(cpu0, cpu1)[0], softirq_max_pct=peak,
+                router_kpps_min=min(router_kpps or [float('nan')]), router_drops=drops)
+
+
+def run_hops(hops, test_names, seconds=10, profile=None, interval=0.5):
+    # One line topology of `hops` routers with static routes (and `profile` on every router
+    # interface), every test in turn from h1 to h2. Returns one row per test.
+    from routers import bring_up, load_topo, tear_down
+    topo = load_topo(line(hops))
+    model = topo.model
+    net, _ = bring_up(topo, routes=True, profile=profile)
+    rows = []
+    try:
+        h1, h2 = net['h1'], net['h2']
+        servers = [h2.popen(['iperf', '-s', '-w', '16m']), h2.popen(['iperf', '-s', '-u'])]
+        sleep(0.5)
+        pids = dict((name, net[name].pid) for name in list(model['routers']) + ['h1', 'h2'])
+        try:
+            for name in test_names:
+                sampler = ForwardingSampler(pids, interval)
+                sampler.start()
+                client = h1.popen(['iperf', '-c', h2.IP(), '-t', str(seconds)] + tests[name])
+                client.communicate()
+                sampler.stop()
+                row = dict(summarize_run(sampler.samples, model), hops=hops, test=name)
+                if profile:
+                    rate = resolve(profile)['rate']
+                    row['shaped_pct'] = 100.0 * row['mbps'] * 1e6 / parse_rate(rate) if rate else float('nan')
+                else:
+                    row['shaped_pct'] = float('nan')
+                rows.append(row)
+                print('*** {0} hops, {1}: {2:.1f} Mbps, {3:.1f} kpps, {4:.2f}% loss, host softirq {5:.1f}% '
+                      '(busiest cpu {6:.1f}%)'.format(hops, name, row['mbps'], row['kpps'], row['loss_pct'],
+                                                  row['softirq_pct'], row['softirq_max_pct']))
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+    finally:
+        tear_down(net)
+    return rows
+
+
+def ceilings(rows):
+    # {hops: (best Mbps, test), (best kpps, test)} over all tests.
+    best = dict()
+    for hops in sorted(set(row['hops'] for row in rows)):
+        runs = [row for row in rows if row['hops'] == hops]
+        mbps = max(runs, key=lambda row: row['mbps'])
+        kpps = max(runs, key=lambda row: row['kpps'])
+        best[hops] = ((mbps['mbps'], mbps['test']), (kpps['kpps'], kpps['test']))
+    return best
+
+
+def print_results(rows, profile=None, filename=None, threshold=90.0):
+    # softirq is host-wide (see read_cpu_stat); only the router kpps and drops columns are per router.
+    print('{0:>4} {1:<10} {2:>9} {3:>9} {4:>8} {5:>7} {6:>9} {7:>9} {8:>12} {9:>9} {10:>8}'
+          .format('hops', 'test', 'offered', 'Mbps', 'kpps', 'loss %', 'host sirq', 'busy cpu', 'min rtr kpps',
+                  'rtr drops', 'shaped %'))
+    for row in rows:
+        print('{hops:>4} {test:<10} {offered_mbps:>9.1f} {mbps:>9.1f} {kpps:>8.1f} {loss_pct:>7.2f} '
+              '{softirq_pct:>8.1f}% {softirq_max_pct:>8.1f}% {router_kpps_min:>12.1f} {router_drops:>9} '
+              '{shaped_pct:>8.1f}'.format(**row))
+    for hops, ((mbps, mbps_test), (kpps, kpps_test)) in ceilings(rows).items():
+        print('*** {0} hops: ceiling {1:.1f} Mbps ({2}), {3:.1f} kpps ({4})'.format(hops, mbps, mbps_test, kpps,
+                                                                                    kpps_test))
+    if profile:
+        # With the shaping in place, bulk TCP should sit just under the shaped rate; if it does not,
+        # something other than the shaped link (usually the emulation itself) is the bottleneck.
+        for row in rows:
+            if row['test'] == 'tcp':
+                verdict = 'the shaped link is the bottleneck' if row['shaped_pct'] >= threshold else \
+                    'something else limits the path'
+                print('*** {0} hops: TCP reaches {1:.1f}% of the {2} shaping: {3}'
+                      .format(row['hops'], row['shaped_pct'], resolve(profile)['rate'], verdict))
+    if filename:
+        with open(filename, 'w') as f:
+            w = csv.DictWriter(f, fieldnames=result_columns)
+            w.writeheader()
+            for row in rows:
+                w.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Forwarding ceiling of LinuxRouter chains (root + Mininet).')
+    parser.add_argument('-n', '--hops', nargs='+', type=int, default=[1, 2, 4, 8],
+                        help='Router counts of the h1 - r1 - ... - rN - h2 lines to test.')
+    parser.add_argument('-t', '--tests', nargs='+', default=sorted(tests), choices=sorted(tests))
+    parser.add_argument('-d', '--duration', type=int, default=10, help='Seconds per test.')
+    parser.add_argument('-p', '--profile',
+                        help='Shaping profile on every router interface, e.g. wan100 to check that its '
+                             'tbf is the bottleneck.')
+    parser.add_argument('--interval', type=float, default=0.5, help='Counter sampling interval (s).')
+    parser.add_argument('--csv', help='Also write the results to this CSV file.')
+    parser.add_argument('-l', '--log-level', default='warning', help='Mininet log level.')
+    args = parser.parse_args()
+
+    from mininet.log import setLogLevel
+    setLogLevel(args.log_level)
+    rows = []
+    for hops in args.hops:
+        rows.extend(run_hops(hops, args.tests, args.duration, args.profile, args.interval))
+    print_results(rows, args.profile, args.csv)
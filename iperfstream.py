@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# iperf3 --json-stream prints one JSON object per line as the test runs: a 'start' event, one
+# 'interval' event per reporting interval (down to -i 0.1) and an 'end' event. JsonStream parses
+# that incrementally into a fixed-size ring buffer per flow, so memory stays bounded however long
+# the run is; the raw lines can be teed to a file for the full record.
+interval_dtype = np.dtype([('time', '<f8'), ('seconds', '<f4'), ('bytes', '<u8'), ('Mbps', '<f8'),
+                           ('retransmits', '<u4'), ('cwnd', '<u4'), ('rtt', '<u4'), ('rttvar', '<u4')])
+# 100 ms intervals for a bit over an hour.
+default_capacity = 1 << 16
+
+
+class FlowRing(object):
+    # The last `capacity` interval rows of one flow.
+    def __init__(self, capacity=default_capacity):
+        self.data = np.zeros(capacity, dtype=interval_dtype)
+        self.count = 0
+
+    def append(self, row):
+        self.data[self.count % len(self.data)] = row
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, len(self.data))
+
+    def dropped(self):
+        return max(0, self.count - len(self.data))
+
+    def view(self, last=None):
+        # The rows held (or the `last` ones) in time order, as a copy.
+        n = len(self) if last is None else min(last, len(self))
+        end = self.count % len(self.data)
+        if self.count <= len(self.data):
+            return self.data[self.count - n:self.count].copy()
+        return self.data[np.arange(end - n, end) % len(self.data)]
+
+
+class JsonStream(object):
+    # Incremental parser for one iperf3 --json-stream client. feed() takes output as it arrives, in
+    # any chunking. Interval times are the flow's epoch start (iperf3 reports it in whole seconds,
+    # like the iperf2 -y C stamps) plus the interval's end; with -P the streams are summed, their
+    # cwnd added and their RTT averaged.
+    def __init__(self, flow, capacity=default_capacity):
+        self.flow = flow
+        self.ring = FlowRing(capacity)
+        self.base = None
+        self.summary = None
+        self.error = None
+        self.partial = b''
+
+    def feed(self, data):
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def close(self):
+        self._line(self.partial)
+        self.partial = b''
+
+    def _line(self, line):
+        if not line.strip():
+            return
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            return  # a warning iperf3 printed outside the JSON stream
+        self.handle(obj)
+
+    def handle(self, obj):
+        event, data = obj.get('event'), obj.get('data') or dict()
+        if event == 'start':
+            self.base = float(data.get('timestamp', dict()).get('timesecs', 0))
+        elif event == 'interval':
+            total, streams = data['sum'], data.get('streams') or []
+            rtts = [s['rtt'] for s in streams if 'rtt' in s]
+            rttvars = [s['rttvar'] for s in streams if 'rttvar' in s]
+            self.ring.append(((self.base or 0.0) + total['end'], total['seconds'], total['bytes'],
+                              total['bits_per_second'] / 1e6, total.get('retransmits', 0),
+                              sum(s.get('snd_cwnd', 0) for s in streams),
+                              sum(rtts) // len(rtts) if rtts else 0, sum(rttvars) // len(rttvars) if rttvars else 0))
+        elif event == 'end':
+            self.summary = dict((key, data[key]) for key in ('sum_sent', 'sum_received') if key in data)
+        elif event == 'error':
+            self.error = data
+
+
+class StreamReader(threading.Thread):
+    # Reads a running iperf3 client's stdout into a JsonStream, teeing the raw lines to `filename`.
+    def __init__(self, proc, stream, filename=None):
+        super(StreamReader, self).__init__()
+        self.daemon = True
+        self.proc = proc
+        self.stream = stream
+        self.filename = filename
+
+    def run(self):
+        fd = self.proc.stdout.fileno()
+        out = open(self.filename, 'wb') if self.filename else None
+        try:
+            while True:
+                data = os.read(fd, 1 << 16)
+                if not data:
+                    break
+                if out is not None:
+                    out.write(data)
+                    out.flush()
+                self.stream.feed(data)
+            self.stream.close()
+        finally:
+            if out is not None:
+                out.close()
+
+    def wait(self):
+        self.join()
+        return self.proc.wait()
+
+    def terminate(self):
+        self.proc.terminate()
+
+
+def read_json_stream(filename, flow=None, capacity=None):
+    # A finished --json-stream file -> JsonStream, sized to hold every interval unless `capacity` is given.
+    if capacity is None:
+        with open(filename, 'rb') as f:
+            capacity = max(1, sum(1 for _ in f))
+    stream = JsonStream(flow, capacity)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            stream.feed(block)
+    stream.close()
+    return stream
@@ -0,0 +1,420 @@
+#!/usr/bin/python
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+
+import numpy as np
+
+from iperfstream import JsonStream
+from metrics import jain_index
+from traces import (iperf3_files, iperf_csv_header, iperf_files, iperf_stamp_to_epoch, sockstats_files,
+                    tcpprobe_csv_header)
+
+# Live view of a running cell. The monitor tail-follows the files the cell is writing (iperf2 CSV or
+# iperf3 JSON streams, socket-stats logs or the tcpprobe trace), parsing only what was appended since
+# the last poll, and keeps rolling per-flow aggregates: current and windowed Mbps, Jain's index over
+# the running flows, cwnd and RTT. Snapshots go to a terminal dashboard and/or a local HTTP/JSON
+# endpoint, and abort rules can stop the cell's flows early.
+default_window = 5.0
+default_poll = 0.5
+default_port = 8321
+
+
+class Tail(object):
+    # The bytes appended to a file since the last read(); starts over if the file shrinks.
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0
+
+    def read(self, limit=1 << 22):
+        try:
+            f = open(self.filename, 'rb')
+        except IOError:
+            return b''
+        with f:
+            if os.fstat(f.fileno()).st_size < self.offset:
+                self.offset = 0
+            f.seek(self.offset)
+            data = f.read(limit)
+        self.offset += len(data)
+        return data
+
+
+class LineTail(Tail):
+    # Complete lines only; a line still being written is kept for the next call.
+    def __init__(self, filename):
+        super(LineTail, self).__init__(filename)
+        self.partial = b''
+
+    def lines(self):
+        lines = (self.partial + self.read()).split(b'\n')
+        self.partial = lines.pop()
+        return lines
+
+
+# Followers turn one file's new bytes into samples: poll() -> [(flow, dict(time=..., ...))], plus
+# `finished` once the flow's client has printed its end-of-run summary.
+class IperfFollower(object):
+    # iperf2 -y C lines. A -P run is followed through its SUM rows once they show up.
+    def __init__(self, flow, filename):
+        self.flow = flow
+        self.tail = LineTail(filename)
+        self.seen = set()
+        self.sum = False
+        self.finished = False
+
+    def poll(self):
+        samples = []
+        for line in self.tail.lines():
+            row = line.decode('ascii', 'replace').rstrip().split(',')
+            if len(row) < len(iperf_csv_header):
+                continue
+            try:
+                start, stamp, bps = float(row[6].partition('-')[0]), iperf_stamp_to_epoch(row[0]), float(row[8])
+            except ValueError:
+                continue
+            if start == 0.0 and row[5] in self.seen:
+                self.finished = True  # the whole-run summary printed when the client exits
+                continue
+            self.seen.add(row[5])
+            self.sum = self.sum or row[5] == '-1'
+            if self.sum and row[5] != '-1':
+                continue
+            samples.append((self.flow, dict(time=stamp, Mbps=bps / 1e6)))
+        return samples
+
+
+class Iperf3Follower(object):
+    # iperf3 --json-stream lines, through the same parser the client-side reader uses. cwnd and RTT
+    # come from the cell's collector, as for iperf2.
+    def __init__(self, flow, filename):
+        self.flow = flow
+        self.tail = Tail(filename)
+        self.stream = JsonStream(flow, capacity=1024)
+        self.count = 0
+
+    @property
+    def finished(self):
+        return self.stream.summary is not None or self.stream.error is not None
+
+    def poll(self):
+        self.stream.feed(self.tail.read())
+        rows = self.stream.ring.view(last=self.stream.ring.count - self.count)
+        self.count = self.stream.ring.count
+        return [(self.flow, dict(time=float(r['time']), Mbps=float(r['Mbps']))) for r in rows]
+
+
+class SockstatsFollower(object):
+    # Complete records of a socket-stats log; only the newest one per poll of the data connection (the
+    # socket with the most bytes acked so far, as sockstats.data_socket picks) matters for the view.
+    finished = False
+
+    def __init__(self, flow, filename):
+        from sockstats import log_magic, record_dtype
+        self.flow = flow
+        self.tail = Tail(filename)
+        self.skip = len(log_magic)
+        self.dtype = record_dtype
+        self.partial = b''
+        self.acked = dict()
+
+    def poll(self):
+        data = self.partial + self.tail.read()
+        if self.skip:
+            cut = min(self.skip, len(data))
+            data, self.skip = data[cut:], self.skip - cut
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self.partial = data[usable:]
+        records = np.frombuffer(data[:usable], dtype=self.dtype)
+        if not len(records):
+            return []
+        latest = dict()
+        for r in records:
+            key = (int(r['sport']), int(r['dport']))
+            self.acked[key] = max(self.acked.get(key, 0), int(r['bytes_acked']))
+            latest[key] = r
+        data = max(self.acked, key=self.acked.get)
+        if data not in latest:
+            return []
+        r = latest[data]
+        return [(self.flow, dict(time=float(r['time']), cwnd=int(r['cwnd']), srtt=int(r['srtt']),
+                                 retrans=int(r['retrans'])))]
+
+
+class TcpprobeFollower(object):
+    # The shared tcpprobe trace, split by source address ({flow: 'ip'}).
+    finished = False
+
+    def __init__(self, filename, host_addrs):
+        self.tail = LineTail(filename)
+        self.flows = dict((addr, flow) for flow, addr in host_addrs.items())
+
+    def poll(self):
+        latest = dict()
+        for line in self.tail.lines():
+            fields = line.split()
+            if len(fields) != len(tcpprobe_csv_header):
+                continue
+            flow = self.flows.get(fields[1].rpartition(b':')[0].decode('ascii', 'replace'))
+            if flow is not None:
+                latest[flow] = dict(cwnd=int(fields[6]), srtt=int(fields[9]))
+        return list(latest.items())
+
+
+class FlowState(object):
+    # Rolling state of one flow: the throughput samples of the last `window` seconds and the latest
+    # TCP state. Once its client is running (`started`), `active` is the last wall-clock time the
+    # flow moved data, or when the client's output first appeared.
+    def __init__(self, window):
+        self.window = window
+        self.samples = deque()
+        self.intervals = 0
+        self.Mbps = float('nan')
+        self.cwnd = self.srtt = self.retransmits = None
+        self.started = False
+        self.active = None
+        self.finished = False
+
+    def start(self, now):
+        if not self.started:
+            self.started, self.active = True, now
+
+    def update(self, sample, now):
+        if 'Mbps' in sample:
+            self.intervals += 1
+            self.Mbps = sample['Mbps']
+            self.samples.append((sample['time'], sample['Mbps']))
+            while self.samples[0][0] <= sample['time'] - self.window:
+                self.samples.popleft()
+            if sample['Mbps'] > 0:
+                self.active = now
+        if 'cwnd' in sample:
+            self.cwnd, self.srtt = sample['cwnd'], sample['srtt']
+        if 'retrans' in sample:
+            self.retransmits = sample['retrans']
+
+    def mean(self):
+        return sum(m for _, m in self.samples) / len(self.samples) if self.samples else float('nan')
+
+
+def zero_throughput(seconds):
+    # Abort rule: a running flow has moved no data for `seconds` (reading 0 Mbps or not reporting at all).
+    def rule(flows, now):
+        for flow, state in sorted(flows.items()):
+            if state.started and not state.finished and now - state.active >= seconds:
+                return '{0} has had zero throughput for {1:.1f}s'.format(flow, now - state.active)
+    return rule
+
+
+class LiveMonitor(threading.Thread):
+    # Follows cell (alg, delay) in `directory` until stop(). Only files written since `since` are
+    # picked up, so traces left by an earlier run of the same cell are ignored. The first rule that
+    # fires terminates the processes handed to watch() and sets `aborted` to its reason.
+    def __init__(self, alg, delay, host_addrs=None, window=default_window, poll=default_poll, rules=(),
+                 dashboard=True, port=None, directory='.', since=None):
+        super(LiveMonitor, self).__init__()
+        self.daemon = True
+        self.alg = alg
+        self.delay = delay
+        self.host_addrs = host_addrs or dict()
+        self.window = window
+        self.poll = poll
+        self.rules = list(rules)
+        self.dashboard = dashboard
+        self.directory = directory
+        self.since = since
+        self.started = time()
+        self.followers = dict()
+        self.flows = dict()
+        self.procs = []
+        self.aborted = None
+        self.halted = threading.Event()
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.server = serve_snapshots(self, port) if port else None
+
+    def watch(self, proc):
+        with self.lock:
+            self.procs.append(proc)
+            if self.aborted:
+                proc.terminate()
+
+    def sleep(self, seconds):
+        # sleep() that returns early, True, once the cell is aborted.
+        return self.halted.wait(seconds)
+
+    def discover(self):
+        found = []
+        for kind, files in (('iperf', iperf_files), ('iperf3', iperf3_files), ('sockstats', sockstats_files)):
+            found.extend((kind, flow, filename)
+                         for flow, filename in files(self.alg, self.delay, self.directory).items())
+        tcpprobe = os.path.join(self.directory, 'tcpprobe_{0}_{1}ms.txt'.format(self.alg, self.delay))
+        if self.host_addrs and os.path.exists(tcpprobe):
+            found.append(('tcpprobe', None, tcpprobe))
+        for kind, flow, filename in found:
+            if filename in self.followers:
+                continue
+            try:
+                if self.since is not None and os.path.getmtime(filename) < self.since:
+                    continue
+            except OSError:
+                continue
+            if kind == 'iperf':
+                self.followers[filename] = IperfFollower(flow, filename)
+            elif kind == 'iperf3':
+                self.followers[filename] = Iperf3Follower(flow, filename)
+            elif kind == 'sockstats':
+                self.followers[filename] = SockstatsFollower(flow, filename)
+            else:
+                self.followers[filename] = TcpprobeFollower(filename, self.host_addrs)
+            if kind in ('iperf', 'iperf3'):
+                self.flows.setdefault(flow, FlowState(self.window)).start(time())
+
+    def update(self):
+        self.discover()
+        now = time()
+        with self.lock:
+            for follower in self.followers.values():
+                for flow, sample in follower.poll():
+                    self.flows.setdefault(flow, FlowState(self.window)).update(sample, now)
+                if getattr(follower, 'flow', None) in self.flows and follower.finished:
+                    self.flows[follower.flow].finished = True
+            if self.aborted is None:
+                for rule in self.rules:
+                    reason = rule(self.flows, now)
+                    if reason:
+                        self.abort(reason)
+                        break
+
+    def abort(self, reason):
+        # Called with the lock held.
+        self.aborted = reason
+        self.halted.set()
+        print('*** Live monitor: aborting the cell: {0}'.format(reason))
+        for proc in self.procs:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+
+    def snapshot(self):
+        with self.lock:
+            flows = dict()
+            running = []
+            for flow, state in sorted(self.flows.items()):
+                mean = state.mean()
+                flows[flow] = dict(Mbps=state.Mbps, mean_Mbps=mean, intervals=state.intervals, cwnd=state.cwnd,
+                                   srtt_ms=state.srtt / 1000.0 if state.srtt is not None else None,
+                                   retransmits=state.retransmits, finished=state.finished)
+                if not state.finished and state.samples:
+                    running.append(mean)
+            jain = float(jain_index(np.array(running).reshape(-1, 1))[0]) if running else float('nan')
+            return dict(alg=self.alg, delay=self.delay, elapsed=time() - self.started, window=self.window, flows=flows,
+                        total_Mbps=sum(running), jain=jain, aborted=self.aborted)
+
+    def run(self):
+        next_at = time()
+        while not self.done.is_set():
+            self.update()
+            if self.dashboard:
+                draw_dashboard(self.snapshot())
+            next_at += self.poll
+            self.done.wait(max(0, next_at - time()))
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        self.update()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def render(snapshot):
+    # A snapshot -> the dashboard's lines.
+    lines = ['{alg} {delay}ms  t={elapsed:.0f}s  total {total_Mbps:.1f} Mbps  Jain({window:g}s) {jain:.3f}'
+             .format(**snapshot)]
+    lines.append('{0:<6} {1:>9} {2:>9} {3:>9} {4:>8} {5:>9} {6:>8}'
+                 .format('flow', 'Mbps', 'mean', 'intervals', 'cwnd', 'srtt ms', 'retrans'))
+    for flow, f in sorted(snapshot['flows'].items()):
+        lines.append('{0:<6} {1:>9.1f} {2:>9.1f} {3:>9} {4:>8} {5:>9} {6:>8}{7}'
+                     .format(flow, f['Mbps'], f['mean_Mbps'], f['intervals'],
+                             '-' if f['cwnd'] is None else f['cwnd'],
+                             '-' if f['srtt_ms'] is None else '{0:.2f}'.format(f['srtt_ms']),
+                             '-' if f['retransmits'] is None else f['retransmits'],
+                             '  done' if f['finished'] else ''))
+    if snapshot['aborted']:
+        lines.append('ABORTED: {0}'.format(snapshot['aborted']))
+    return lines
+
+
+def draw_dashboard(snapshot, out=sys.stdout):
+    # Redraw in place on a terminal; elsewhere (a log file) just append the lines.
+    text = '\n'.join(render(snapshot))
+    if out.isatty():
+        text = '\x1b[H\x1b[2J' + text
+    out.write(text + '\n')
+    out.flush()
+
+
+def snapshot_json(snapshot):
+    # NaN is not JSON: report it as null.
+    def clean(value):
+        if isinstance(value, dict):
+            return dict((k, clean(v)) for k, v in value.items())
+        if isinstance(value, float) and value != value:
+            return None
+        return value
+    return json.dumps(clean(snapshot)).encode()
+
+
+
+def serve_snapshots(monitor, port, host='127.0.0.1'):
+    # GET on http://host:port/ returns the monitor's current snapshot as JSON.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = snapshot_json(monitor.snapshot())
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    print('*** Live monitor at http://{0}:{1}/'.format(host, port))
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Follow a running dumbbell cell from its output files.')
+    parser.add_argument('algorithm')
+    parser.add_argument('delay', type=int)
+    parser.add_argument('-C', '--directory', default='.', help='Where the cell writes its files.')
+    parser.add_argument('-w', '--window', type=float, default=default_window,
+                        help='Rolling window of the mean throughput and Jain index (s).')
+    parser.add_argument('-p', '--port', type=int, help='Also serve the snapshots as JSON on this local port.')
+    parser.add_argument('--no-dashboard', action='store_true', help='Only serve JSON, do not draw the dashboard.')
+    parser.add_argument('--hosts', type=int, default=4, help='Hosts of the cell, for splitting a tcpprobe trace.')
+    args = parser.parse_args()
+
+    from analysis import default_host_addrs, sender_addrs
+    monitor = LiveMonitor(args.algorithm, args.delay, sender_addrs(default_host_addrs(args.hosts)), args.window,
+                          dashboard=not args.no_dashboard, port=args.port, directory=args.directory)
+    monitor.start()
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        monitor.stop()
@@ -0,0 +1,149 @@
+import csv
+
+import numpy as np
+
+bottleneck_mbps = 984
+summary_columns = ['alg', 'delay', 'flows', 'mean_jain', 'min_jain', 'utilization', 'convergence_s',
+                   'cwnd_cov', 'cwnd_decreases_per_s']
+
+
+def bdp_packets(mbps, rtt_ms, packet_bytes=1500):
+    return mbps * 1e6 * rtt_ms / 1000.0 / (8 * packet_bytes)
+
+
+def throughput_matrix(data, step=None):
+    # Put {flow: {'time', 'Mbps'}} on one grid: returns (flows, grid, flows x grid array),
+    # NaN wherever a flow has not started yet or has already finished.
+    flows = [flow for flow in sorted(data) if len(data[flow]['time'])]
+    if not flows:
+        return flows, np.empty(0), np.empty((0, 0))
+    if step is None:
+        diffs = np.concatenate([np.diff(data[flow]['time']) for flow in flows])
+        step = float(np.median(diffs)) if len(diffs) else 1.0
+    t0 = min(data[flow]['time'][0] for flow in flows)
+    t1 = max(data[flow]['time'][-1] for flow in flows)
+    grid = t0 + np.arange(int(round((t1 - t0) / step)) + 1) * step
+    m = np.full((len(flows), len(grid)), np.nan)
+    for i, flow in enumerate(flows):
+        m[i, np.rint((data[flow]['time'] - t0) / step).astype(np.int64)] = data[flow]['Mbps']
+    return flows, grid, m
+
+
+def rolling_mean(m, window):
+    # Trailing mean over `window` samples along the time axis, ignoring NaN; NaN where m is NaN.
+    valid = ~np.isnan(m)
+    zeros = np.zeros((m.shape[0], 1))
+    sums = np.hstack([zeros, np.cumsum(np.where(valid, m, 0.0), axis=1)])
+    counts = np.hstack([zeros, np.cumsum(valid, axis=1)])
+    idx = np.arange(m.shape[1])
+    lo = np.maximum(idx - window + 1, 0)
+    n = counts[:, idx + 1] - counts[:, lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (sums[:, idx + 1] - sums[:, lo]) / n
+    mean[~valid] = np.nan
+    return mean
+
+
+def jain_index(m):
+    # Jain's fairness index of every column of a flows x time array over its non-NaN flows.
+    n = np.sum(~np.isnan(m), axis=0)
+    total = np.nansum(m, axis=0)
+    squares = np.nansum(m * m, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jain = total * total / (n * squares)
+    jain[(n == 0) | (squares == 0)] = np.nan
+    return jain
+
+
+def convergence_time(grid, jain, t_start, threshold=0.95, hold=5):
+    # Seconds from t_start until the windowed Jain index reaches `threshold` and stays there for
+    # `hold` consecutive samples; NaN if that never happens.
+    ok = np.nan_to_num(jain, nan=0.0) >= threshold
+    runs = np.convolve(ok.astype(np.int64), np.ones(hold, dtype=np.int64), 'valid')
+    hits = np.flatnonzero((runs == hold) & (grid[:len(runs)] >= t_start))
+    return grid[hits[0]] - t_start if len(hits) else np.nan
+
+
+def cwnd_stats(cwnd_data, drop=0.8):
+    # Oscillation statistics per flow: mean, standard deviation, coefficient of variation and the
+    # rate of multiplicative decreases (a sample at or below `drop` times the previous one).
+    stats = dict()
+    for flow in sorted(cwnd_data):
+        t, cwnd = cwnd_data[flow]['time'], np.asarray(cwnd_data[flow]['cwnd'], dtype=np.float64)
+        if len(cwnd) < 2:
+            continue
+        decreases = np.count_nonzero(cwnd[1:] <= drop * cwnd[:-1])
+        duration = t[-1] - t[0]
+        mean = cwnd.mean()
+        stats[flow] = dict(mean=mean, std=cwnd.std(), cov=cwnd.std() / mean if mean else np.nan,
+                           decreases=decreases, decreases_per_s=decreases / duration if duration > 0 else np.nan)
+    return stats
+
+
+def queue_stats(queues, roles=('bottleneck', 'access')):
+    # Per interface of parse_qdiscstats output with one of `roles`: mean, 99th percentile and max queue
+    # length (packets), mean occupancy of the queue limit, drops and drop rate (% of the packets offered
+    # to the queue), overlimits, and the mean queueing delay the backlog adds at the shaped rate (ms).
+    # The backlog includes the packets in netem's delay line, so the queueing delay is what it takes
+    # beyond the link's own delay.
+    stats = dict()
+    for intf, q in sorted(queues.items()):
+        if q['role'] not in roles or not len(q['time']):
+            continue
+        qlen = q['qlen'].astype(np.float64)
+        drops = int(q['drops'][-1]) - int(q['drops'][0])
+        sent = int(q['packets'][-1]) - int(q['packets'][0])
+        if q['mbps']:
+            delay = np.maximum(q['backlog'] * 8.0 / (q['mbps'] * 1e6) * 1000.0 - q.get('delay_ms', 0.0), 0.0)
+        else:
+            delay = np.full(len(qlen), np.nan)
+        stats[intf] = dict(role=q['role'], limit=q['limit'], mean_qlen=qlen.mean(), p99_qlen=np.percentile(qlen, 99),
+                           max_qlen=int(qlen.max()), occupancy=qlen.mean() / q['limit'] if q['limit'] else np.nan,
+                           drops=drops, drop_pct=100.0 * drops / (sent + drops) if sent + drops else np.nan,
+                           overlimits=int(q['overlimits'][-1]) - int(q['overlimits'][0]),
+                           delay_ms=float(np.mean(delay)))
+    return stats
+
+
+def cell_metrics(data_fairness, data_cwnd, window=10, threshold=0.95, capacity=bottleneck_mbps):
+    flows, grid, m = throughput_matrix(data_fairness)
+    metrics = dict((col, np.nan) for col in summary_columns)
+    metrics['flows'] = len(flows)
+    if flows:
+        jain = jain_index(rolling_mean(m, window))
+        # Fairness only means something once every flow is running.
+        t_start = max(data_fairness[flow]['time'][0] for flow in flows)
+        t_end = min(data_fairness[flow]['time'][-1] for flow in flows)
+        shared = (grid >= t_start) & (grid <= t_end)
+        if shared.any():
+            metrics['mean_jain'] = np.nanmean(jain[shared])
+            metrics['min_jain'] = np.nanmin(jain[shared])
+            if len(flows) > 1:
+                metrics['convergence_s'] = convergence_time(grid[shared], jain[shared], t_start, threshold)
+        metrics['utilization'] = np.nanmean(np.nansum(m, axis=0)[np.any(~np.isnan(m), axis=0)]) / capacity
+    stats = cwnd_stats(data_cwnd)
+    if stats:
+        metrics['cwnd_cov'] = np.mean([s['cov'] for s in stats.values()])
+        metrics['cwnd_decreases_per_s'] = np.mean([s['decreases_per_s'] for s in stats.values()])
+    return metrics
+
+
+def sweep_summary(cells, window=10, threshold=0.95, capacity=bottleneck_mbps, filename=None):
+    # One row per (alg, delay) cell of {cell: (data_cwnd, data_fairness)}; printed and optionally saved as CSV.
+    rows = []
+    for (alg, delay), (data_cwnd, data_fairness) in sorted(cells.items()):
+        row = cell_metrics(data_fairness, data_cwnd, window, threshold, capacity)
+        row['alg'], row['delay'] = alg, delay
+        rows.append(row)
+    print('{0:<8} {1:>6} {2:>5} {3:>9} {4:>8} {5:>6} {6:>11} {7:>8} {8:>10}'
+          .format('alg', 'delay', 'flows', 'mean jain', 'min jain', 'util', 'converge s', 'cwnd cov', 'cwnd dec/s'))
+    for row in rows:
+        print('{alg:<8} {delay:>6} {flows:>5} {mean_jain:>9.3f} {min_jain:>8.3f} {utilization:>6.1%} '
+              '{convergence_s:>11.1f} {cwnd_cov:>8.3f} {cwnd_decreases_per_s:>10.3f}'.format(**row))
+    if filename:
+        with open(filename, 'w') as f:
+            w = csv.DictWriter(f, fieldnames=summary_columns)
+            w.writeheader()
+            for row in rows:
+                w.writerow(row)
+    return rows
@@ -0,0 +1,134 @@
+import numpy as np
+
+
+def _pyplot():
+    # matplotlib takes most of a second to import, so only pay for it when something is drawn.
+    import matplotlib
+    matplotlib.use('Agg')   # Force matplotlib to not use any Xwindows backend.
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def decimate_minmax(t, y, buckets):
+    # Keep the first and last sample plus the min and max of every one of `buckets` equal time
+    # slices, in time order. Drawn `buckets` pixels wide this is indistinguishable from the full
+    # trace, so cwnd peaks and loss events stay visible while at most 2*buckets+2 points are plotted.
+    t, y = np.asarray(t), np.asarray(y)
+    if len(t) <= 2 * buckets + 2:
+        return t, y
+    span = t[-1] - t[0]
+    bucket = ((t - t[0]) * (buckets / span)).astype(np.int64) if span > 0 else np.zeros(len(t), np.int64)
+    np.clip(bucket, 0, buckets - 1, out=bucket)
+    # t is sorted, so each bucket is one contiguous run starting at `starts`.
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    keep = np.zeros(len(t), dtype=bool)
+    keep[[0, -1]] = True
+    for reduce in (np.minimum, np.maximum):
+        extreme = np.repeat(reduce.reduceat(y, starts), np.diff(np.r_[starts, len(y)]))
+        hits = np.flatnonzero(y == extreme)
+        # first hit per bucket
+        keep[hits[np.r_[True, bucket[hits][1:] != bucket[hits][:-1]]]] = True
+    return t[keep], y[keep]
+
+
+def _plot_buckets(plt):
+    fig = plt.gcf()
+    return int(fig.get_figwidth() * fig.dpi)
+
+
+def _flow_key(flow):
+    # h1, h3, ..., h10 rather than h1, h10, h3.
+    digits = flow.lstrip('abcdefghijklmnopqrstuvwxyz')
+    return (flow[:len(flow) - len(digits)], int(digits)) if digits.isdigit() else (flow, 0)
+
+
+def _plot_flows(plt, series, buckets, max_legend=10):
+    # One line per flow of {flow: (time, values)}; the legend is left out when there are too many.
+    flows = sorted(series, key=_flow_key)
+    for i, flow in enumerate(flows, 1):
+        plt.plot(*decimate_minmax(series[flow][0], series[flow][1], buckets),
+                 label='Source Host {0} ({1})'.format(i, flow))
+    if 0 < len(flows) <= max_legend:
+        plt.legend()
+
+
+def draw_cwnd_plot(series, alg, delay, fmt='png'):
+    # series: {flow: (time, cwnd)}.
+    print('*** Drawing the cwnd vs time plot...')
+    plt = _pyplot()
+    _plot_flows(plt, series, _plot_buckets(plt))
+
+    plt.xlabel('Time (sec)')
+    plt.ylabel('Cwnd (MSS)')
+
+    plt.title("Cwnd vs. Time Graph\n{0} TCP Congestion Control Algorithm Delay={1}ms"
+              .format(alg.capitalize(), delay))
+
+    plt.savefig('cwnd_vs_time_{0}_{1}ms.{2}'.format(alg, delay, fmt))
+    plt.close()
+
+
+def draw_fairness_plot(series, alg, delay, fmt='png'):
+    # series: {flow: (time, Mbps)}.
+    print('*** Drawing the fairness plot...')
+    plt = _pyplot()
+    _plot_flows(plt, series, _plot_buckets(plt))
+    plt.xlabel('Time (sec)')
+    plt.ylabel('Bandwidth (Mbps)')
+
+    plt.title("TCP Fairness Graph\n{0} TCP Congestion Control Algorithm Delay={1}ms"
+              .format(alg.capitalize(), delay))
+
+    plt.savefig('fairness_graph_{0}_{1}ms.{2}'.format(alg, delay, fmt))
+    plt.close()
+
+
+def draw_queue_plot(data_fairness, data_cwnd, queues, alg, delay, fmt='png'):
+    # Throughput, cwnd and the occupancy of the data-direction queues on one time axis, with a mark at
+    # every sample where a queue dropped packets.
+    print('*** Drawing the queue vs time plot...')
+    plt = _pyplot()
+    fig, axes = plt.subplots(3, 1, sharex=True, figsize=(6.4, 9))
+    buckets = int(fig.get_figwidth() * fig.dpi)
+    for flow in sorted(data_fairness):
+        axes[0].plot(*decimate_minmax(data_fairness[flow]['time'], data_fairness[flow]['Mbps'], buckets), label=flow)
+    for flow in sorted(data_cwnd):
+        axes[1].plot(*decimate_minmax(data_cwnd[flow]['time'], data_cwnd[flow]['cwnd'], buckets), label=flow)
+    for intf, q in sorted(queues.items()):
+        if q['role'] not in ('bottleneck', 'access') or not len(q['time']):
+            continue
+        lines = axes[2].plot(*decimate_minmax(q['time'], q['qlen'], buckets), label='{0} ({1})'.format(intf, q['role']))
+        dropped = np.flatnonzero(np.diff(q['drops'].astype(np.int64)) > 0) + 1
+        axes[2].plot(q['time'][dropped], q['qlen'][dropped], 'x', color=lines[0].get_color(), markersize=3)
+    axes[0].set_ylabel('Bandwidth (Mbps)')
+    axes[1].set_ylabel('Cwnd (MSS)')
+    axes[2].set_ylabel('Queue (packets)')
+    axes[2].set_xlabel('Time (sec)')
+    for ax in axes:
+        ax.legend(fontsize='small')
+    axes[0].set_title("Throughput, Cwnd and Queue vs. Time\n{0} TCP Congestion Control Algorithm Delay={1}ms"
+                      .format(alg.capitalize(), delay))
+    fig.tight_layout()
+    fig.savefig('queue_vs_time_{0}_{1}ms.{2}'.format(alg, delay, fmt))
+    plt.close(fig)
+
+
+def draw_scale_plot(rows, protocol, fmt='png'):
+    # Memory, CPU and convergence time of one routing protocol against the number of routers, one line per preset.
+    print('*** Drawing the scale plot for {0}...'.format(protocol))
+    plt = _pyplot()
+    fig, axes = plt.subplots(3, 1, sharex=True, figsize=(6.4, 9))
+    panels = [('rss_total_mb', 'Total bird RSS (MB)'), ('cpu_s', 'CPU until converged (s)'),
+              ('network_s', 'Convergence time (s)')]
+    for preset in sorted(set(row['preset'] for row in rows)):
+        ordered = sorted((row for row in rows if row['preset'] == preset), key=lambda row: row['routers'])
+        for ax, (key, label) in zip(axes, panels):
+            ax.plot([row['routers'] for row in ordered], [row[key] for row in ordered], marker='o',
+                    label='{0} timers'.format(preset))
+            ax.set_ylabel(label)
+    axes[-1].set_xlabel('Routers')
+    axes[0].set_title('{0} Cost vs. Network Size'.format(protocol.upper()))
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig('scale_{0}.{1}'.format(protocol, fmt))
+    plt.close(fig)
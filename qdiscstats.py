@@ -0,0 +1,173 @@
+#!/usr/bin/python
+import argparse
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+from time import sleep, time
+
+import numpy as np
+
+# Queue occupancy of the dumbbell's shaped links: what `tc -s qdisc show` prints, read with one
+# RTM_GETQDISC netlink dump per sample instead of a tc process, so sampling every 10-50 ms stays
+# cheap. Only the root qdisc of each interface is kept; with TCLink's htb root its counters cover
+# the netem queue below it. The switch interfaces live in the root namespace, so one recorder there
+# covers the bottleneck and access links of every cell.
+RTM_GETQDISC = 38
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+TC_H_ROOT = 0xffffffff
+
+_nlmsghdr = struct.Struct('=IHHII')
+# struct tcmsg: family, pad, ifindex, handle, parent, info.
+_tcmsg = struct.Struct('=Bxxxiiii')
+_rtattr = struct.Struct('=HH')
+_stats_basic = struct.Struct('=QI')
+_stats_queue = struct.Struct('=5I')
+
+log_magic = b'FCNQD\x00\x01\x00'
+_header_len = struct.Struct('<I')
+record_dtype = np.dtype([('time', '<f8'), ('dev', '<u2'), ('qlen', '<u4'), ('backlog', '<u4'), ('drops', '<u4'),
+                         ('requeues', '<u4'), ('overlimits', '<u4'), ('packets', '<u4'), ('bytes', '<u8')])
+default_interval = 0.02
+
+
+def route_socket():
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, socket.NETLINK_ROUTE)
+    sock.bind((0, 0))
+    return sock
+
+
+def _request(seq):
+    body = _tcmsg.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+    return _nlmsghdr.pack(_nlmsghdr.size + len(body), RTM_GETQDISC, NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body
+
+
+def _stats(data, start, end):
+    # TCA_STATS2 nest -> (qlen, backlog, drops, requeues, overlimits, packets, bytes).
+    queue, basic = (0, 0, 0, 0, 0), (0, 0)
+    while start + _rtattr.size <= end:
+        attr_len, attr_type = _rtattr.unpack_from(data, start)
+        if attr_len < _rtattr.size:
+            break
+        if attr_type == TCA_STATS_QUEUE:
+            queue = _stats_queue.unpack_from(data, start + _rtattr.size)
+        elif attr_type == TCA_STATS_BASIC:
+            basic = _stats_basic.unpack_from(data, start + _rtattr.size)
+        start += (attr_len + 3) & ~3
+    return queue + (basic[1], basic[0])
+
+
+def dump(sock, ifindexes=None, seq=1):
+    # One dump of the root qdiscs of the namespace -> {ifindex: (qlen, backlog bytes, drops, requeues,
+    # overlimits, packets, bytes)}, keeping only the interfaces in `ifindexes` if given.
+    sock.send(_request(seq))
+    stats = dict()
+    while True:
+        data = sock.recv(1 << 16)
+        offset = 0
+        while offset + _nlmsghdr.size <= len(data):
+            length, kind, _, _, _ = _nlmsghdr.unpack_from(data, offset)
+            if kind == NLMSG_DONE:
+                return stats
+            if kind == NLMSG_ERROR:
+                errno = -struct.unpack_from('=i', data, offset + _nlmsghdr.size)[0]
+                raise OSError(errno, 'qdisc dump failed: {0}'.format(os.strerror(errno)))
+            msg = offset + _nlmsghdr.size
+            _, ifindex, _, parent, _ = _tcmsg.unpack_from(data, msg)
+            if parent & 0xffffffff == TC_H_ROOT and (ifindexes is None or ifindex in ifindexes):
+                attr = msg + _tcmsg.size
+                while attr + _rtattr.size <= offset + length:
+                    attr_len, attr_type = _rtattr.unpack_from(data, attr)
+                    if attr_len < _rtattr.size:
+                        break
+                    if attr_type == TCA_STATS2:
+                        stats[ifindex] = _stats(data, attr + _rtattr.size, attr + attr_len)
+                        break
+                    attr += (attr_len + 3) & ~3
+            offset += (length + 3) & ~3
+
+
+def record(filename, devs, interval=default_interval, flush_rows=4096):
+    # Sample until SIGTERM/SIGINT on a fixed schedule, like sockstats.record. `devs` is a list of
+    # {'intf', 'role', 'limit' (packets), 'mbps' (shaped rate), 'delay_ms' (netem delay)}; records refer
+    # to them by position.
+    # The log is log_magic, the JSON-encoded devs behind their length, then record_dtype records.
+    stop = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.append(True))
+    positions = dict((socket.if_nametoindex(dev['intf']), i) for i, dev in enumerate(devs))
+    sock = route_socket()
+    rows = []
+    seq = 0
+    header = json.dumps(devs).encode()
+    with open(filename, 'wb') as f:
+        f.write(log_magic + _header_len.pack(len(header)) + header)
+        next_at = time()
+        while not stop:
+            now = time()
+            seq += 1
+            rows.extend((now, positions[ifindex]) + row for ifindex, row in dump(sock, positions, seq).items())
+            if len(rows) >= flush_rows:
+                np.array(rows, dtype=record_dtype).tofile(f)
+                rows = []
+            next_at = max(next_at + interval, time())
+            delay = next_at - time()
+            if delay > 0:
+                sleep(delay)
+        if rows:
+            np.array(rows, dtype=record_dtype).tofile(f)
+    sock.close()
+
+
+def load_log(filename):
+    # -> (devs, records).
+    with open(filename, 'rb') as f:
+        if f.read(len(log_magic)) != log_magic:
+            raise ValueError('{0} is not a qdisc-stats log'.format(filename))
+        size, = _header_len.unpack(f.read(_header_len.size))
+        devs = json.loads(f.read(size).decode())
+        return devs, np.fromfile(f, dtype=record_dtype)
+
+
+def parse_dev(text):
+    # 'INTF[:ROLE[:LIMIT[:MBPS[:DELAY_MS]]]]' -> {'intf', 'role', 'limit', 'mbps', 'delay_ms'}.
+    intf, role, limit, mbps, delay = (text.split(':') + [None] * 4)[:5]
+    return dict(intf=intf, role=role or None, limit=int(limit) if limit else None, mbps=float(mbps) if mbps else None,
+                delay_ms=float(delay) if delay else None)
+
+
+def start_sampler(devs, filename, interval=default_interval):
+    # One recorder in the root namespace for the given devs; returns the process.
+    script = os.path.abspath(__file__)
+    specs = [':'.join([dev['intf']] + [str(dev.get(key) or '') for key in ('role', 'limit', 'mbps', 'delay_ms')])
+             for dev in devs]
+    return subprocess.Popen([sys.executable, script, os.path.abspath(filename), '-i', str(interval * 1000.0),
+                             '-d'] + specs)
+
+
+def stop_sampler(proc):
+    proc.send_signal(signal.SIGTERM)
+    proc.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record the root qdisc stats of interfaces of this namespace.')
+    parser.add_argument('output', help='Binary log to write.')
+    parser.add_argument('-i', '--interval', type=float, default=default_interval * 1000.0,
+                        help='Sampling interval (ms, 1-100).')
+    parser.add_argument('-d', '--devs', nargs='+', required=True, type=parse_dev,
+                        help='Interfaces as INTF[:ROLE[:LIMIT[:MBPS[:DELAY_MS]]]], e.g. '
+                             's1-eth1:bottleneck:1722:984:21.')
+    args = parser.parse_args()
+    if not 1 <= args.interval <= 100:
+        parser.error('the interval must be between 1 and 100 ms')
+    record(args.output, args.devs, args.interval / 1000.0)
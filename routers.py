@@ -0,0 +1,271 @@
+#!/usr/bin/python
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+from time import time
+
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.node import Node
+from mininet.log import setLogLevel, info
+from mininet.cli import CLI
+
+from birdconf import bird_command, bird_configs, node_dir, write_configs
+from shaping import check_qdiscs, parse_qdiscs, tc_lines, topology_plan
+from topogen import compile_spec, generators, load_spec, route_batch_lines, static_routes
+
+
+class LinuxRouter(Node):
+    def config(self, **params):
+        super(LinuxRouter, self).config(**params)
+        self.cmd('sysctl net.ipv4.ip_forward=1')
+
+    def terminate(self):
+        self.cmd('sysctl net.ipv4.ip_forward=0')
+        super(LinuxRouter, self).terminate()
+
+
+class SpecTopo(Topo):
+    # Builds the model topogen.compile_spec() produces: one addHost per node, one addLink per link.
+    def build(self, model=None, **_opts):
+        self.model = model
+        for router, opts in model['routers'].items():
+            self.addHost(router, cls=LinuxRouter, ip=opts['ip'])
+        for host, opts in model['hosts'].items():
+            self.addHost(name=host, ip=opts['ip'], defaultRoute='via {0}'.format(opts['gateway']))
+        for link in model['links']:
+            self.addLink(link['nodes'][0],
+                         link['nodes'][1],
+                         intfName1=link['intfs'][0],
+                         intfName2=link['intfs'][1],
+                         params1={'ip': link['ips'][0]},
+                         params2={'ip': link['ips'][1]})
+
+
+def load_topo(spec):
+    # SpecTopo for a spec file (looked up in topologies/ too) or an already loaded spec dict.
+    return SpecTopo(model=compile_spec(load_spec(spec) if isinstance(spec, str) else spec))
+
+
+# Seconds a single node gets for one bring-up command before it is killed and reported.
+node_timeout = 30.0
+
+
+def run_in_nodes(commands, max_procs=64, timeout=None):
+    # Run one command per node ({node: argv}) inside the node's namespace, at most max_procs at a
+    # time, instead of serial node.cmd round trips. A command still running `timeout` seconds after
+    # it started is killed. Returns {node: (returncode, output)}, returncode None for a timeout.
+    timeout = node_timeout if timeout is None else timeout
+    pending = list(commands.items())
+    running = []
+    results = dict()
+    try:
+        while pending or running:
+            while pending and len(running) < max_procs:
+                node, argv = pending.pop(0)
+                running.append((node, time(), subprocess.Popen(['mnexec', '-a', str(node.pid)] + argv,
+                                                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                               universal_newlines=True)))
+            node, started, proc = running.pop(0)
+            try:
+                output = proc.communicate(timeout=max(0, started + timeout - time()))[0]
+                results[node] = (proc.returncode, output)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                output = proc.communicate()[0]
+                results[node] = (None, '{0}[timed out after {1:.0f}s]'.format(output, timeout))
+    finally:
+        for _, _, proc in running:
+            proc.kill()
+            proc.wait()
+    return results
+
+
+def failures(results):
+    # The run_in_nodes() results that failed, as 'node: output' lines.
+    return ['{0}: {1}'.format(node, output.strip()) for node, (code, output) in results.items() if code != 0]
+
+
+def run_batches(batches, command, max_procs=64, timeout=None):
+    # Feed every node its own batch file (`command` + filename, e.g. ['ip', '-force', '-batch']).
+    # Returns the error output of the batches that failed.
+    directory = tempfile.mkdtemp(prefix='batch_')
+    try:
+        commands = dict()
+        for node, lines in batches.items():
+            filename = os.path.join(directory, node.name)
+            with open(filename, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            commands[node] = command + [filename]
+        results = run_in_nodes(commands, max_procs, timeout)
+    finally:
+        shutil.rmtree(directory)
+    return failures(results)
+
+
+def set_multipath_hash(net, nodes, timeout=None):
+    # Hash multipath routes on L4 ports (fib_multipath_hash_policy=1) so parallel flows spread over the paths.
+    return failures(run_in_nodes(dict((net[node], ['sysctl', '-w', 'net.ipv4.fib_multipath_hash_policy=1'])
+                                      for node in nodes), timeout=timeout))
+
+
+def install_static_routes(net, model=None, multipath=False, timeout=None):
+    # Shortest-path static routes for the whole topology, one ip -batch per router, all routers at once.
+    # multipath installs every equal-cost next hop and hashes flows over them on L4 ports.
+    routes = static_routes(model or net.topo.model, multipath)
+    errors = set_multipath_hash(net, routes, timeout) if multipath else []
+    return errors + run_batches(dict((net[router], route_batch_lines(lines)) for router, lines in routes.items()
+                                     if lines), ['ip', '-force', '-batch'], timeout=timeout)
+
+
+def apply_shaping(net, plan, timeout=None):
+    # Install a shaping.shaping_plan() with one tc -batch per node, all nodes at once.
+    batches = dict()
+    for node, intf, profile in plan:
+        batches.setdefault(net[node], []).extend(tc_lines(intf, profile))
+    return run_batches(batches, ['tc', '-force', '-batch'], timeout=timeout)
+
+
+def read_qdiscs(net, nodes, timeout=None):
+    # `tc -s qdisc show` of every given node, concurrently: {node name: {dev: [qdisc stats]}}.
+    results = run_in_nodes(dict((net[node], ['tc', '-s', 'qdisc', 'show']) for node in nodes), timeout=timeout)
+    return dict((node.name, parse_qdiscs(output)) for node, (_, output) in results.items())
+
+
+def verify_shaping(net, plan, timeout=None):
+    # Read the qdiscs back with tc -s and compare them with the plan; returns the mismatches.
+    qdiscs = read_qdiscs(net, set(node for node, _, _ in plan), timeout)
+    errors = []
+    for node, intf, profile in plan:
+        errors.extend(check_qdiscs(intf, profile, qdiscs[node].get(intf, [])))
+    return errors
+
+
+def shape_net(net, plan):
+    # apply_shaping() + verify_shaping() on a started net, raising on any failure.
+    if not plan:
+        return
+    start = time()
+    errors = apply_shaping(net, plan)
+    applied = time()
+    errors = errors or verify_shaping(net, plan)
+    if errors:
+        raise RuntimeError('Shaping failed:\n{0}'.format('\n'.join(errors)))
+    info('*** Shaped {0} interfaces in {1:.2f}s, verified in {2:.2f}s\n'
+         .format(len(plan), applied - start, time() - applied))
+
+
+def start_bird(net, configs, base=None, bird='bird', timeout=None):
+    # Write every node's bird.conf into its own run directory and start all the daemons at once.
+    dirs = write_configs(configs, base)
+    for directory in dirs.values():
+        for name in ('bird.ctl', 'bird.pid'):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+    return failures(run_in_nodes(dict((net[node], bird_command(directory, bird)) for node, directory in dirs.items()),
+                                 timeout=timeout))
+
+
+def stop_bird(nodes, base=None):
+    # BIRD daemonizes out of the node shells, so net.stop() does not take it down; use the pid files.
+    for node in nodes:
+        pidfile = os.path.join(node_dir(node, base), 'bird.pid')
+        try:
+            with open(pidfile) as f:
+                os.kill(int(f.read().strip()), signal.SIGTERM)
+        except (OSError, ValueError):
+            pass
+
+
+def print_routes(net, nodes, timeout=None):
+    # Every node's routing table, read concurrently and printed in node order.
+    results = run_in_nodes(dict((net[node], ['route', '-n']) for node in nodes), timeout=timeout)
+    for node in sorted(results, key=lambda n: n.name):
+        info('*** {0}\n{1}'.format(node.name, results[node][1]))
+
+
+def bring_up(topo, routes=False, multipath=False, protocol=None, preset='default', profile=None, timeout=None):
+    # Build the net and configure it phase by phase, each phase fanned out over all nodes at once
+    # with a per-node timeout. Raises with every failing node's output; reports the time per phase.
+    # Returns (net, [(phase, seconds)]).
+    model = topo.model
+    timings = []
+
+    def phase(name, action):
+        start = time()
+        errors = action()
+        timings.append((name, time() - start))
+        if errors:
+            raise RuntimeError('{0} failed:\n{1}'.format(name, '\n'.join(errors)))
+
+    start = time()
+    net = Mininet(topo=topo, controller=None)
+    timings.append(('build', time() - start))
+    try:
+        if routes:
+            phase('routes', lambda: install_static_routes(net, model, multipath, timeout))
+        if protocol:
+            phase('bird', lambda: start_bird(net, bird_configs(model, protocol, preset, multipath), timeout=timeout) +
+                  (set_multipath_hash(net, model['routers'], timeout) if multipath else []))
+        phase('start', lambda: net.start())
+        plan = topology_plan(model, profile)
+        if plan:
+            phase('shaping', lambda: apply_shaping(net, plan, timeout))
+            phase('verify', lambda: verify_shaping(net, plan, timeout))
+    except Exception:
+        net.stop()
+        if protocol:
+            stop_bird(list(model['routers']) + list(model['hosts']))
+        raise
+    info('*** Bring-up of {0} nodes: {1}, total {2:.2f}s\n'.format(
+        len(model['routers']) + len(model['hosts']), ', '.join('{0} {1:.2f}s'.format(n, t) for n, t in timings),
+        sum(t for _, t in timings)))
+    return net, timings
+
+
+def tear_down(net, protocol=None):
+    net.stop()
+    if protocol:
+        stop_bird(list(net.topo.model['routers']) + list(net.topo.model['hosts']))
+
+
+def run(topo, routes=False, profile=None, multipath=False, protocol=None, preset='default'):
+    net, _ = bring_up(topo, routes, multipath, protocol, preset, profile)
+    try:
+        CLI(net)
+    finally:
+        tear_down(net, protocol)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a router topology from a spec file or a generator.')
+    parser.add_argument('-s', '--spec', help='JSON/YAML topology spec (file name or name in topologies/).')
+    parser.add_argument('-g', '--generate', nargs='+', metavar=('KIND', 'ARG'),
+                        help='Generated topology: line N, ring N, grid ROWS COLS, fat_tree K or random N [DEGREE].')
+    parser.add_argument('-r', '--static-routes', action='store_true',
+                        help='Install shortest-path static routes on every router.')
+    parser.add_argument('--ecmp', action='store_true',
+                        help='Install all equal-cost next hops (L4-hashed multipath) with --static-routes, '
+                             'merge paths with --bird.')
+    parser.add_argument('-b', '--bird', choices=['rip', 'ospf', 'bgp'],
+                        help='Run BIRD with a generated config of this protocol on every node.')
+    parser.add_argument('--preset', default='default', choices=['default', 'fast', 'fastest'],
+                        help='BIRD timer preset.')
+    parser.add_argument('-p', '--profile',
+                        help='Shaping profile for every router interface whose link does not set its own in the spec.')
+    parser.add_argument('-l', '--log-level', default='info', help='Verbosity level of the logger.')
+    args = parser.parse_args()
+    setLogLevel(args.log_level)
+
+    if args.generate:
+        spec = generators[args.generate[0]](*[int(a) for a in args.generate[1:]])
+    else:
+        spec = load_spec(args.spec or 'diamond.json')
+    start = time()
+    topo = load_topo(spec)
+    info('*** Compiled {0} routers and {1} links in {2:.3f}s\n'
+         .format(len(topo.model['routers']), len(topo.model['links']), time() - start))
+    run(topo, args.static_routes, args.profile, args.ecmp, args.bird, args.preset)
@@ -0,0 +1,273 @@
+#!/usr/bin/python
+import argparse
+import csv
+import math
+import os
+import re
+import threading
+from time import sleep, time
+
+from birdconf import bird_configs, node_dir, presets, protocols
+from convergence import BirdSockets, expected_routes, measure, summarize
+from topogen import compile_spec, generators, grid, random_graph
+
+result_columns = ['protocol', 'preset', 'kind', 'routers', 'links', 'converged', 'network_s', 'rss_total_mb',
+                  'rss_max_kb', 'cpu_s', 'cpu_steady_pct', 'pkts_converge', 'pps_intf_mean', 'pps_intf_max']
+intf_columns = ['protocol', 'preset', 'routers', 'node', 'intf', 'tx_converge', 'rx_converge', 'tx_steady',
+                'rx_steady']
+
+# iptables matches for each protocol's packets. Every rule only counts (-j RETURN), in chains of its
+# own hooked into INPUT and OUTPUT, so the counters can be read back with one iptables-save per router.
+protocol_matches = dict(
+    rip=['-p udp --dport 520'],
+    ospf=['-p 89'],
+    bgp=['-p tcp --dport 179', '-p tcp --sport 179'],
+)
+_counter_re = re.compile(r'^\[(\d+):(\d+)\] -A fcn_proto_(in|out) -[io] (\S+) ')
+_clk_tck = os.sysconf('SC_CLK_TCK')
+
+
+def sized_spec(kind, n, degree=3):
+    # A generated topology of about n routers.
+    if kind == 'grid':
+        rows = max(1, int(round(math.sqrt(n))))
+        return grid(rows, int(math.ceil(n / float(rows))))
+    if kind == 'random':
+        return random_graph(n, degree)
+    if kind not in ('line', 'ring'):
+        raise ValueError('Cannot size a {0!r} topology by router count, use line, ring, grid or random'.format(kind))
+    return generators[kind](n)
+
+
+def counter_lines(model, protocol, nodes):
+    # iptables-restore input per node: {node: lines} counting `protocol` packets in and out of every interface.
+    lines = dict()
+    for link in model['links']:
+        for node, intf in zip(link['nodes'], link['intfs']):
+            if node not in nodes:
+                continue
+            rules = lines.setdefault(node, ['*filter', ':fcn_proto_in - [0:0]', ':fcn_proto_out - [0:0]',
+                                            '-A INPUT -j fcn_proto_in', '-A OUTPUT -j fcn_proto_out'])
+            for match in protocol_matches[protocol]:
+                rules.append('-A fcn_proto_in -i {0} {1} -j RETURN'.format(intf, match))
+                rules.append('-A fcn_proto_out -o {0} {1} -j RETURN'.format(intf, match))
+    for rules in lines.values():
+        rules.append('COMMIT')
+    return lines
+
+
+def parse_counters(output):
+    # `iptables-save -c -t filter` -> {intf: {'rx': packets, 'tx': packets}} from the fcn_proto chains.
+    counters = dict()
+    for line in output.splitlines():
+        m = _counter_re.match(line)
+        if m:
+            counts = counters.setdefault(m.group(4), dict(rx=0, tx=0))
+            counts['rx' if m.group(3) == 'in' else 'tx'] += int(m.group(1))
+    return counters
+
+
+def install_counters(net, model, protocol, nodes, timeout=None):
+    from routers import run_batches
+    return run_batches(dict((net[node], lines) for node, lines in counter_lines(model, protocol, nodes).items()),
+                       ['iptables-restore'], timeout=timeout)
+
+
+def read_counters(net, nodes, timeout=None):
+    # {(node, intf): {'rx', 'tx'}} for every given node, read concurrently.
+    from routers import run_in_nodes
+    results = run_in_nodes(dict((net[node], ['iptables-save', '-c', '-t', 'filter']) for node in nodes),
+                           timeout=timeout)
+    return dict(((node.name, intf), counts) for node, (_, output) in results.items()
+                for intf, counts in parse_counters(output).items())
+
+
+def read_proc(pid):
+    # (VmRSS in kB, utime + stime in seconds) of one process, or None once it is gone.
+    try:
+        with open('/proc/{0}/status'.format(pid)) as f:
+            rss = next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), 0)
+        with open('/proc/{0}/stat'.format(pid)) as f:
+            # The command name may hold spaces, so count the fields from the closing parenthesis.
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError, ValueError):
+        return None
+    return rss, (int(fields[11]) + int(fields[12])) / float(_clk_tck)
+
+
+class ProcSampler(threading.Thread):
+    # Samples the RSS and CPU time of every node's bird from /proc at a fixed rate, picking the
+    # daemons up by their pid files as they appear. A pid is only taken once /proc/<pid>/comm names
+    # `comm`, so a stale pid file (or a recycled pid) is not followed. Keeps the per-daemon peak RSS
+    # and latest CPU time, and (time, total RSS kB, total CPU s) for every sample.
+    def __init__(self, nodes, interval=0.1, base=None, comm='bird'):
+        super(ProcSampler, self).__init__()
+        self.daemon = True
+        self.pidfiles = dict((node, os.path.join(node_dir(node, base), 'bird.pid')) for node in nodes)
+        self.comm = comm[:15]  # the kernel truncates it to TASK_COMM_LEN - 1
+        self.interval = interval
+        self.pids = dict()
+        self.peak_rss = dict()
+        self.cpu = dict()
+        self.samples = []
+        self.done = threading.Event()
+
+    def _find_pids(self):
+        for node, pidfile in self.pidfiles.items():
+            if node in self.pids:
+                continue
+            try:
+                with open(pidfile) as f:
+                    pid = int(f.read().strip())
+                with open('/proc/{0}/comm'.format(pid)) as f:
+                    if f.read().strip() == self.comm:
+                        self.pids[node] = pid
+            except (OSError, ValueError):
+                pass
+
+    def sample(self):
+        if len(self.pids) < len(self.pidfiles):
+            self._find_pids()
+        now = time()
+        rss_total = 0
+        for node, pid in self.pids.items():
+            usage = read_proc(pid)
+            if usage is None:
+                continue
+            rss, cpu = usage
+            rss_total += rss
+            self.peak_rss[node] = max(rss, self.peak_rss.get(node, 0))
+            self.cpu[node] = cpu
+        self.samples.append((now, rss_total, sum(self.cpu.values())))
+
+    def run(self):
+        next_at = time()
+        while not self.done.is_set():
+            self.sample()
+            next_at += self.interval
+            self.done.wait(max(0, next_at - time()))
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def cpu_total(self):
+        return sum(self.cpu.values())
+
+
+def run_size(model, protocol, preset='fast', kind='', timeout=300, hold=3, interval=0.1, sample_interval=0.1,
+             steady=10, bird='bird'):
+    # Start BIRD on every node of one topology, time the convergence while sampling the daemons,
+    # then keep sampling for `steady` seconds of converged operation. Returns (row, per-interface rows).
+    from mininet.net import Mininet
+    from routers import SpecTopo, start_bird, stop_bird
+    net = Mininet(topo=SpecTopo(model=model), controller=None)
+    routers = list(model['routers'])
+    nodes = routers + list(model['hosts'])
+    sockets = None
+    sampler = None
+    try:
+        net.start()
+        errors = install_counters(net, model, protocol, routers)
+        if errors:
+            raise RuntimeError('iptables-restore failed:\n{0}'.format('\n'.join(errors)))
+        sockets = BirdSockets(routers)
+        t0 = time()
+        errors = start_bird(net, bird_configs(model, protocol, preset), bird=bird)
+        # BIRD runs on the hosts too, so every node's daemon counts. The sampler starts once start_bird
+        # has removed the previous size's pid files; CPU time is cumulative, so none of it is missed.
+        sampler = ProcSampler(nodes, sample_interval, comm=os.path.basename(bird))
+        sampler.start()
+        if errors:
+            raise RuntimeError('bird failed to start:\n{0}'.format('\n'.join(errors)))
+        times = measure(sockets.poll, expected_routes(model), t0, timeout, hold, interval)
+        cpu_converge = sampler.cpu_total()
+        converge_counts = read_counters(net, routers)
+        steady_start = time()
+        sleep(steady)
+        steady_counts = read_counters(net, routers)
+        steady_s = time() - steady_start
+        cpu_steady = sampler.cpu_total() - cpu_converge
+        sampler.stop()
+    finally:
+        if sampler is not None and sampler.is_alive():
+            sampler.stop()
+        if sockets is not None:
+            sockets.close()
+        net.stop()
+        stop_bird(nodes)
+
+    intf_rows = []
+    for (node, intf), counts in sorted(converge_counts.items()):
+        after = steady_counts.get((node, intf), counts)
+        intf_rows.append(dict(protocol=protocol, preset=preset, routers=len(routers), node=node, intf=intf,
+                              tx_converge=counts['tx'], rx_converge=counts['rx'],
+                              tx_steady=after['tx'] - counts['tx'], rx_steady=after['rx'] - counts['rx']))
+    pps = [r['tx_steady'] / steady_s for r in intf_rows] if steady_s > 0 else []
+    row = dict(summarize(times), protocol=protocol, preset=preset, kind=kind, links=len(model['links']),
+               rss_total_mb=max([rss for _, rss, _ in sampler.samples] or [0]) / 1024.0,
+               rss_max_kb=max(sampler.peak_rss.values() or [0]),
+               cpu_s=cpu_converge, cpu_steady_pct=100.0 * cpu_steady / steady_s if steady_s > 0 else float('nan'),
+               pkts_converge=sum(r['tx_converge'] for r in intf_rows),
+               pps_intf_mean=sum(pps) / len(pps) if pps else float('nan'), pps_intf_max=max(pps or [float('nan')]))
+    return row, intf_rows
+
+
+def print_results(rows, filename=None, intf_rows=None, intf_filename=None):
+    print('{0:<6} {1:<8} {2:>7} {3:>9} {4:>10} {5:>9} {6:>9} {7:>8} {8:>8} {9:>10} {10:>8} {11:>8}'
+          .format('proto', 'preset', 'routers', 'converged', 'network s', 'RSS MB', 'max kB', 'CPU s', 'steady %',
+                  'pkts', 'pps mean', 'pps max'))
+    for row in rows:
+        print('{protocol:<6} {preset:<8} {routers:>7} {converged:>4}/{routers:<4} {network_s:>10.2f} '
+              '{rss_total_mb:>9.1f} {rss_max_kb:>9} {cpu_s:>8.2f} {cpu_steady_pct:>8.2f} {pkts_converge:>10} '
+              '{pps_intf_mean:>8.2f} {pps_intf_max:>8.2f}'.format(**row))
+    for name, columns, data in ((filename, result_columns, rows), (intf_filename, intf_columns, intf_rows)):
+        if name:
+            with open(name, 'w') as f:
+                w = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+                w.writeheader()
+                for row in data:
+                    w.writerow(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost of BIRD routing protocols against topology size '
+                                                 '(root + Mininet).')
+    parser.add_argument('-n', '--sizes', nargs='+', type=int, default=[10, 25, 50, 100, 200, 500],
+                        help='Router counts to sweep.')
+    parser.add_argument('-k', '--kind', default='random', choices=['line', 'ring', 'grid', 'random'],
+                        help='Generated topology family.')
+    parser.add_argument('--degree', type=int, default=3, help='Average degree of the random topologies.')
+    parser.add_argument('-p', '--protocols', nargs='+', default=['rip', 'ospf'], choices=protocols)
+    parser.add_argument('--presets', nargs='+', default=['fast'], choices=sorted(presets))
+    parser.add_argument('--timeout', type=float, default=600, help='Give up on a convergence after this long (s).')
+    parser.add_argument('--hold', type=float, default=3, help='Tables must stay converged this long (s).')
+    parser.add_argument('--interval', type=float, default=0.1, help='Route polling interval (s).')
+    parser.add_argument('--sample-interval', type=float, default=0.1, help='/proc sampling interval (s).')
+    parser.add_argument('--steady', type=float, default=10,
+                        help='Seconds of converged operation to measure steady-state CPU and packet rates.')
+    parser.add_argument('--csv', help='Also write the results to this CSV file.')
+    parser.add_argument('--intf-csv', help='Write the per-interface packet counts to this CSV file.')
+    parser.add_argument('--no-plot', action='store_true', help='Do not draw the per-protocol plots.')
+    parser.add_argument('-l', '--log-level', default='warning', help='Mininet log level.')
+    args = parser.parse_args()
+
+    from mininet.log import setLogLevel
+    setLogLevel(args.log_level)
+    rows = []
+    intf_rows = []
+    for protocol in args.protocols:
+        for preset in args.presets:
+            for n in sorted(args.sizes):
+                model = compile_spec(sized_spec(args.kind, n, args.degree))
+                print('*** {0} with {1} timers on {2} {3} routers'.format(protocol, preset, len(model['routers']),
+                                                                           args.kind))
+                row, intfs = run_size(model, protocol, preset, args.kind, args.timeout, args.hold, args.interval,
+                                      args.sample_interval, args.steady)
+                rows.append(row)
+                intf_rows.extend(intfs)
+    print_results(rows, args.csv, intf_rows, args.intf_csv)
+    if not args.no_plot:
+        from plots import draw_scale_plot
+        for protocol in args.protocols:
+            draw_scale_plot([row for row in rows if row['protocol'] == protocol], protocol)
@@ -0,0 +1,123 @@
+import math
+import multiprocessing
+import os
+from multiprocessing.connection import wait
+from time import time
+
+from analysis import AnalysisPipeline
+from dumbbell import clean_tcpprobe_procs, default_queue_interval, default_report_interval, run_cell, start_tcpprobe
+from metrics import bottleneck_mbps
+from sockstats import default_interval
+
+
+def cores_per_cell(bw=bottleneck_mbps, mbps_per_core=1000):
+    # Both directions of the shaped path (sender side and receiver side softirq + iperf) have to be
+    # carried at line rate, so a cell needs at least two cores to stay faithful to the emulated bandwidth.
+    return max(2, int(math.ceil(2 * bw / float(mbps_per_core))))
+
+
+def core_slots(cores, per_cell, reserve=1, max_parallel=None):
+    # Split the usable cores into disjoint per-cell sets, keeping `reserve` cores for OVS and the scheduler.
+    usable = cores[reserve:]
+    slots = [usable[i:i + per_cell] for i in range(0, len(usable) - per_cell + 1, per_cell)]
+    if max_parallel is not None:
+        slots = slots[:max_parallel]
+    return slots or [cores]
+
+
+def _cell_worker(alg, delay, iperf_runtime, iperf_delayed_start, cell, cores, collector, stats_interval, client,
+                 report_interval, queue_interval, buffer_bdp):
+    os.sched_setaffinity(0, cores)  # inherited by every node shell and iperf the cell spawns
+    # Socket stats are read per namespace, so each cell records its own; tcpprobe is one shared trace.
+    run_cell(alg, delay, iperf_runtime, iperf_delayed_start, cell=cell, probe=collector != 'tcpprobe',
+             process=False, collector=collector, stats_interval=stats_interval, client=client,
+             report_interval=report_interval, queue_interval=queue_interval, buffer_bdp=buffer_bdp)
+
+
+def cell_host_addrs(cell, hosts=4):
+    return dict(('h{0}'.format(i), '10.{0}.0.{1}'.format(cell, i)) for i in range(1, hosts + 1))
+
+
+def split_tcpprobe(filename, cells):
+    # Distribute a tcpprobe trace shared by concurrent cells into the per-cell tcpprobe_<alg>_<delay>ms.txt
+    # files, using the cell number each cell's subnet carries in its second octet.
+    outputs = dict((cell, open('tcpprobe_{0}_{1}ms.txt'.format(alg, delay), 'w'))
+                   for cell, (alg, delay) in cells.items())
+    try:
+        with open(filename, 'r') as f:
+            for line in f:
+                fields = line.split(' ', 2)
+                if len(fields) < 3:
+                    continue
+                octets = fields[1].split('.', 2)
+                if len(octets) == 3 and octets[1].isdigit() and int(octets[1]) in outputs:
+                    outputs[int(octets[1])].write(line)
+    finally:
+        for output in outputs.values():
+            output.close()
+
+
+def run_matrix(algs, delays, iperf_runtime, iperf_delayed_start, mbps_per_core=1000, max_parallel=None,
+               use_cache=True, analysis_workers=1, collector='sockstats', stats_interval=default_interval,
+               client='iperf', report_interval=default_report_interval, queue_interval=default_queue_interval,
+               buffer_bdp=None):
+    cells = dict(enumerate([(alg, delay) for alg in algs for delay in delays], 1))
+    if len(cells) > 255:
+        raise ValueError('At most 255 cells fit in the 10.<cell>.0.0/16 address plan, got {0}'.format(len(cells)))
+    slots = core_slots(sorted(os.sched_getaffinity(0)), cores_per_cell(mbps_per_core=mbps_per_core),
+                       max_parallel=max_parallel)
+    print('*** Scheduling {0} cells on {1} slots: {2}'.format(len(cells), len(slots), slots))
+
+    shared_probe = collector == 'tcpprobe'
+    if shared_probe:
+        print('*** Starting tcpprobe recording...')
+        probe_file = 'tcpprobe_parallel.txt'
+        tcpprobe_proc = start_tcpprobe(probe_file)
+    pending = sorted(cells)
+    running = dict()
+    durations = dict()
+    failures = []
+    start = time()
+    while pending or running:
+        while pending and slots:
+            cell, cores = pending.pop(0), slots.pop(0)
+            alg, delay = cells[cell]
+            print('*** Starting cell {0}: algorithm={1}, delay={2}ms on cores {3}'.format(cell, alg, delay, cores))
+            proc = multiprocessing.Process(target=_cell_worker,
+                                           args=(alg, delay, iperf_runtime, iperf_delayed_start, cell, cores,
+                                                 collector, stats_interval, client, report_interval, queue_interval,
+                                                 buffer_bdp))
+            proc.start()
+            running[proc.sentinel] = (proc, cell, cores, time())
+        for sentinel in wait(list(running)):
+            proc, cell, cores, started = running.pop(sentinel)
+            proc.join()
+            durations[cell] = time() - started
+            slots.append(cores)
+            if proc.exitcode != 0:
+                failures.append((cell, proc.exitcode))
+            print('*** Cell {0} finished in {1:.0f}s (exit code {2})'.format(cell, durations[cell], proc.exitcode))
+    wall = time() - start
+    if shared_probe:
+        tcpprobe_proc.terminate()
+        tcpprobe_proc.wait()
+        clean_tcpprobe_procs()
+        print('*** Splitting the shared tcpprobe trace...')
+        split_tcpprobe(probe_file, cells)
+        os.remove(probe_file)
+    print('*** Processing data...')
+    failed = set(cell for cell, _ in failures)
+    pipeline = AnalysisPipeline(analysis_workers, max_pending=len(cells), use_cache=use_cache)
+    for cell, (alg, delay) in sorted(cells.items()):
+        if cell not in failed:
+            pipeline.submit(alg, delay, cell_host_addrs(cell))
+    pipeline.close()
+
+    parallel = len(slots)
+    expected = len(cells) / float(int(math.ceil(len(cells) / float(parallel))))
+    print('*** {0} cells, {1} at a time: serial {2:.0f}s, wall-clock {3:.0f}s'
+          .format(len(cells), parallel, sum(durations.values()), wall))
+    print('*** Speedup: expected {0:.2f}x, achieved {1:.2f}x'.format(expected, sum(durations.values()) / wall))
+    for cell, exitcode in failures:
+        print('*** Cell {0} ({1}, {2}ms) failed with exit code {3}'.format(cell, cells[cell][0], cells[cell][1], exitcode))
+    return failures
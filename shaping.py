@@ -0,0 +1,184 @@
+import re
+
+# A shaping profile is a dict of
+#   rate ('100mbit', tbf root), burst (bytes) and limit (bytes, or latency if no limit),
+#   delay / jitter ('30ms'), loss (%) and netem_limit (packets) for a netem stage,
+#   aqm ('fq_codel', 'cake' or 'pie') and aqm_params (extra tc arguments) for the leaf queue.
+# Every stage is optional; an interface gets tbf 1: -> netem 10: -> aqm 20:, skipping the stages the
+# profile leaves out. A profile may name another one in 'profile' and override some of its keys.
+profile_keys = ['rate', 'burst', 'limit', 'latency', 'delay', 'jitter', 'loss', 'netem_limit', 'aqm', 'aqm_params']
+aqms = ('fq_codel', 'cake', 'pie')
+
+profiles = dict(
+    # The tbf 100mbit + netem 30ms every router interface of MyIperf.py used to get by hand.
+    wan100=dict(rate='100mbit', burst=5000000, limit=5000000, delay='30ms'),
+    wan100_fq_codel=dict(profile='wan100', aqm='fq_codel', limit=None),
+    wan100_cake=dict(profile='wan100', aqm='cake', limit=None),
+    wan100_pie=dict(profile='wan100', aqm='pie', limit=None),
+    lan1g=dict(rate='1gbit', burst=125000, latency='5ms'),
+)
+
+_rate_units = dict(bit=1, kbit=1e3, mbit=1e6, gbit=1e9, bps=8, kbps=8e3, mbps=8e6, gbps=8e9)
+_time_units = dict(us=1e-3, ms=1.0, s=1e3)
+_size_units = dict(b=1, k=1024, m=1024 * 1024, g=1024 * 1024 * 1024)
+
+
+def parse_rate(rate):
+    # '100mbit' / '100Mbit' -> bits per second.
+    m = re.match(r'([\d.]+)\s*([a-z]*)$', str(rate).lower())
+    return float(m.group(1)) * _rate_units[m.group(2) or 'bit']
+
+
+def parse_time(value):
+    # '30ms' / '1.5s' / '250us' -> milliseconds.
+    m = re.match(r'([\d.]+)\s*([a-z]*)$', str(value).lower())
+    return float(m.group(1)) * _time_units[m.group(2) or 'us']
+
+
+def parse_size(value):
+    # tc sizes: '1514b', '15Kb', '2Mb' or a plain byte count -> bytes.
+    m = re.match(r'([\d.]+)([kmg]?)b?$', str(value).lower())
+    return int(float(m.group(1)) * _size_units[m.group(2) or 'b'])
+
+
+def resolve(profile, catalogue=None):
+    # A profile name or dict -> a complete dict over profile_keys, following 'profile' references.
+    catalogue = dict(profiles, **(catalogue or {}))
+    chain = []
+    while profile is not None:
+        if not isinstance(profile, dict):
+            if profile not in catalogue:
+                raise KeyError('Unknown shaping profile {0!r}'.format(profile))
+            profile = catalogue[profile]
+        chain.append(profile)
+        profile = profile.get('profile')
+        if len(chain) > len(catalogue) + 1:
+            raise ValueError('Shaping profiles refer to each other in a loop')
+    resolved = dict((key, None) for key in profile_keys)
+    for layer in reversed(chain):
+        resolved.update((key, value) for key, value in layer.items() if key != 'profile')
+    unknown = set(resolved) - set(profile_keys)
+    if unknown:
+        raise ValueError('Unknown shaping profile keys: {0}'.format(', '.join(sorted(unknown))))
+    if resolved['aqm'] not in (None,) + aqms:
+        raise ValueError('Unsupported AQM {0!r}, use one of {1}'.format(resolved['aqm'], ', '.join(aqms)))
+    return resolved
+
+
+def stages(profile):
+    # [(kind, handle, parent)] from the root down for a resolved profile.
+    has_netem = any(profile[key] for key in ('delay', 'jitter', 'loss'))
+    chain = [('tbf', '1:', 'root')] if profile['rate'] else []
+    if has_netem:
+        chain.append(('netem', '10:', '1:1' if chain else 'root'))
+    if profile['aqm']:
+        chain.append((profile['aqm'], '20:', chain[-1][1] + '1' if chain else 'root'))
+    return chain
+
+
+def tc_lines(intf, profile):
+    # `tc -batch` lines that (re)build the profile's qdisc tree on one interface. replace makes them
+    # idempotent, so applying a changed profile to a running net needs no teardown.
+    lines = []
+    for kind, handle, parent in stages(profile):
+        where = 'root' if parent == 'root' else 'parent ' + parent
+        if kind == 'tbf':
+            rate = profile['rate']
+            burst = profile['burst'] or max(1600, int(parse_rate(rate) / 8 / 1000))  # 1 ms at line rate
+            queue = 'limit {0}'.format(profile['limit']) if profile['limit'] else \
+                'latency {0}'.format(profile['latency'] or '50ms')
+            args = 'rate {0} burst {1} {2}'.format(rate, burst, queue)
+        elif kind == 'netem':
+            args = 'delay {0}'.format(profile['delay'] or '0ms')
+            if profile['jitter']:
+                args += ' {0}'.format(profile['jitter'])
+            if profile['loss']:
+                args += ' loss {0}%'.format(profile['loss'])
+            if profile['netem_limit']:
+                args += ' limit {0}'.format(profile['netem_limit'])
+        else:
+            args = profile['aqm_params'] or ''
+        lines.append('qdisc replace dev {0} {1} handle {2} {3} {4}'.format(intf, where, handle, kind, args).rstrip())
+    if not lines:
+        lines.append('qdisc del dev {0} root'.format(intf))
+    return lines
+
+
+def router_intfs(model):
+    # Every interface of every router in a topogen model.
+    return [intf for link in model['links'] for node, intf in zip(link['nodes'], link['intfs'])
+            if node in model['routers']]
+
+
+def shaping_plan(model, default=None, intfs=None):
+    # [(node, intf, resolved profile)] for a topogen model: a link's own 'profile' (or `default`)
+    # shapes both of its ends, and `intfs` ({intf: profile}) sets or overrides single interfaces.
+    catalogue = model.get('profiles')
+    chosen = dict()
+    for link in model['links']:
+        profile = link.get('profile', default)
+        if profile is not None:
+            for node, intf in zip(link['nodes'], link['intfs']):
+                chosen[intf] = (node, profile)
+    owners = dict((intf, node) for link in model['links'] for node, intf in zip(link['nodes'], link['intfs']))
+    for intf, profile in (intfs or {}).items():
+        if intf not in owners:
+            raise KeyError('No interface {0} in the topology'.format(intf))
+        chosen[intf] = (owners[intf], profile)
+    return [(node, intf, resolve(profile, catalogue)) for intf, (node, profile) in sorted(chosen.items())]
+
+
+def topology_plan(model, profile=None):
+    # The shaping a topology is brought up with: every link's own profile, and `profile` on the router
+    # interfaces of the links that have none.
+    own = set(intf for link in model['links'] if link.get('profile') is not None for intf in link['intfs'])
+    intfs = dict((intf, profile) for intf in router_intfs(model) if intf not in own) if profile else None
+    return shaping_plan(model, intfs=intfs)
+
+
+_qdisc_re = re.compile(r'^qdisc (\S+) (\S+) (?:dev (\S+) )?(root|parent (\S+))(.*)$')
+_sent_re = re.compile(r'Sent (\d+) bytes (\d+) pkt \(dropped (\d+), overlimits (\d+) requeues (\d+)\)')
+_backlog_re = re.compile(r'backlog (\S+) (\d+)p')
+
+
+def parse_qdiscs(output, dev=None):
+    # `tc -s qdisc show [dev X]` -> {dev: [{'kind', 'handle', 'parent', 'args', 'bytes', 'packets',
+    # 'drops', 'overlimits', 'requeues', 'backlog', 'qlen'}]} in the order tc prints them.
+    qdiscs = dict()
+    current = None
+    for line in output.splitlines():
+        m = _qdisc_re.match(line)
+        if m:
+            current = dict(kind=m.group(1), handle=m.group(2), parent=m.group(5) or 'root', args=m.group(6).strip())
+            qdiscs.setdefault(m.group(3) or dev, []).append(current)
+            continue
+        if current is None:
+            continue
+        m = _sent_re.search(line)
+        if m:
+            current.update(zip(('bytes', 'packets', 'drops', 'overlimits', 'requeues'), map(int, m.groups())))
+        m = _backlog_re.search(line)
+        if m:
+            current['backlog'], current['qlen'] = parse_size(m.group(1)), int(m.group(2))
+    return qdiscs
+
+
+def check_qdiscs(intf, profile, qdiscs):
+    # Compare what tc reports for one interface with its profile; returns a list of mismatches.
+    want = stages(profile)
+    got = dict((q['handle'], q) for q in qdiscs)
+    errors = []
+    for kind, handle, parent in want:
+        q = got.get(handle)
+        if q is None or q['kind'] != kind:
+            errors.append('{0}: expected {1} {2}, found {3}'.format(intf, kind, handle, q['kind'] if q else 'nothing'))
+            continue
+        if kind == 'tbf':
+            m = re.search(r'rate (\S+)', q['args'])
+            if not m or abs(parse_rate(m.group(1)) - parse_rate(profile['rate'])) > 0.01 * parse_rate(profile['rate']):
+                errors.append('{0}: tbf {1}, expected rate {2}'.format(intf, q['args'], profile['rate']))
+        elif kind == 'netem' and profile['delay']:
+            m = re.search(r'delay (\S+)', q['args'])
+            if not m or abs(parse_time(m.group(1)) - parse_time(profile['delay'])) > 0.001:
+                errors.append('{0}: netem {1}, expected delay {2}'.format(intf, q['args'], profile['delay']))
+    return errors
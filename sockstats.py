@@ -0,0 +1,168 @@
+#!/usr/bin/python
+import argparse
+import os
+import signal
+import socket
+import struct
+import sys
+from time import sleep, time
+
+import numpy as np
+
+# tcp_probe is gone from modern kernels, so per-flow TCP state is read from the kernel's socket
+# diagnostics instead: one NETLINK_SOCK_DIAG dump (what `ss -tin` does) per sample, inside the
+# sender's network namespace, filtered to the flows of interest in-process and appended to a binary
+# log. No process is spawned per sample, so sampling every few ms stays cheap.
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2
+TCP_LISTEN = 10
+
+_nlmsghdr = struct.Struct('=IHHII')
+# inet_diag_req_v2 with an all-zero socket id: family, protocol, extensions, pad, states.
+_diag_req = struct.Struct('=BBBBI48x')
+_rtattr = struct.Struct('=HH')
+_ports = struct.Struct('>HH')
+_diag_msg_len = 72
+# struct tcp_info up to tcpi_delivery_rate (Linux 4.9); shorter replies from older kernels are zero-padded.
+_tcp_info = struct.Struct('=8B24I4Q6IQ')
+
+log_magic = b'FCNSS\x00\x01\x00'
+record_dtype = np.dtype([('time', '<f8'), ('sport', '<u2'), ('dport', '<u2'), ('cwnd', '<u4'), ('ssthresh', '<u4'),
+                         ('srtt', '<u4'), ('rttvar', '<u4'), ('unacked', '<u4'), ('retrans', '<u4'),
+                         ('pacing_rate', '<u8'), ('delivery_rate', '<u8'), ('bytes_acked', '<u8')])
+default_ports = (5001,)
+default_interval = 0.01
+
+
+def diag_socket():
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+    sock.bind((0, 0))
+    return sock
+
+
+def _request(seq, family=socket.AF_INET):
+    states = 0xfff & ~(1 << TCP_LISTEN)
+    body = _diag_req.pack(family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), 0, states)
+    return _nlmsghdr.pack(_nlmsghdr.size + len(body), SOCK_DIAG_BY_FAMILY, NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body
+
+
+def dump(sock, ports=None, seq=1):
+    # One dump of every non-listening IPv4 TCP socket of the namespace -> [(sport, dport, cwnd,
+    # ssthresh, srtt us, rttvar us, unacked, total retransmits, pacing rate B/s, delivery rate B/s,
+    # bytes acked)], keeping only sockets with either port in `ports` if given.
+    sock.send(_request(seq))
+    rows = []
+    while True:
+        data = sock.recv(1 << 16)
+        offset = 0
+        while offset + _nlmsghdr.size <= len(data):
+            length, kind, _, _, _ = _nlmsghdr.unpack_from(data, offset)
+            if kind == NLMSG_DONE:
+                return rows
+            if kind == NLMSG_ERROR:
+                errno = -struct.unpack_from('=i', data, offset + _nlmsghdr.size)[0]
+                raise OSError(errno, 'sock_diag dump failed: {0}'.format(os.strerror(errno)))
+            msg = offset + _nlmsghdr.size
+            sport, dport = _ports.unpack_from(data, msg + 4)
+            if ports is None or sport in ports or dport in ports:
+                attr = msg + _diag_msg_len
+                while attr + _rtattr.size <= offset + length:
+                    attr_len, attr_type = _rtattr.unpack_from(data, attr)
+                    if attr_len < _rtattr.size:
+                        break
+                    if attr_type == INET_DIAG_INFO:
+                        info = data[attr + _rtattr.size:attr + attr_len]
+                        if len(info) < _tcp_info.size:
+                            info += b'\0' * (_tcp_info.size - len(info))
+                        v = _tcp_info.unpack_from(info)
+                        rows.append((sport, dport, v[26], v[25], v[23], v[24], v[12], v[31], v[32], v[42], v[34]))
+                        break
+                    attr += (attr_len + 3) & ~3
+            offset += (length + 3) & ~3
+
+
+def record(filename, ports=default_ports, interval=default_interval, flush_rows=4096):
+    # Sample until SIGTERM/SIGINT on a fixed schedule (a late sample does not cause a burst of catch-up
+    # samples), writing log_magic + record_dtype records to `filename`.
+    stop = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.append(True))
+    ports = frozenset(ports)
+    sock = diag_socket()
+    rows = []
+    seq = 0
+    with open(filename, 'wb') as f:
+        f.write(log_magic)
+        next_at = time()
+        while not stop:
+            now = time()
+            seq += 1
+            rows.extend((now,) + row for row in dump(sock, ports, seq))
+            if len(rows) >= flush_rows:
+                np.array(rows, dtype=record_dtype).tofile(f)
+                rows = []
+            next_at = max(next_at + interval, time())
+            delay = next_at - time()
+            if delay > 0:
+                sleep(delay)
+        if rows:
+            np.array(rows, dtype=record_dtype).tofile(f)
+    sock.close()
+
+
+def load_log(filename):
+    with open(filename, 'rb') as f:
+        if f.read(len(log_magic)) != log_magic:
+            raise ValueError('{0} is not a socket-stats log'.format(filename))
+        return np.fromfile(f, dtype=record_dtype)
+
+
+def data_socket(records):
+    # (sport, dport) of the connection that moved the most data. Other sockets on the sampled port
+    # (iperf3's control connection, a leftover from an earlier client) are in the log as well.
+    keys = (records['sport'].astype(np.uint32) << 16) | records['dport']
+    sockets, inverse = np.unique(keys, return_inverse=True)
+    acked = np.zeros(len(sockets), dtype=np.uint64)
+    np.maximum.at(acked, inverse, records['bytes_acked'])
+    key = int(sockets[np.argmax(acked)])
+    return key >> 16, key & 0xffff
+
+
+def data_records(records):
+    # The records of data_socket(records) only.
+    if not len(records):
+        return records
+    sport, dport = data_socket(records)
+    return records[(records['sport'] == sport) & (records['dport'] == dport)]
+
+
+def start_samplers(hosts, filenames, ports=default_ports, interval=default_interval):
+    # One recorder inside every host's namespace ({host: filename}); returns the processes.
+    script = os.path.abspath(__file__)
+    return [host.popen([sys.executable, script, os.path.abspath(filenames[host]), '-i', str(interval * 1000.0),
+                        '-p'] + [str(p) for p in ports]) for host in hosts]
+
+
+def stop_samplers(procs):
+    for proc in procs:
+        proc.send_signal(signal.SIGTERM)
+    for proc in procs:
+        proc.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record TCP socket stats of this network namespace.')
+    parser.add_argument('output', help='Binary log to write.')
+    parser.add_argument('-i', '--interval', type=float, default=default_interval * 1000.0,
+                        help='Sampling interval (ms, 1-100).')
+    parser.add_argument('-p', '--ports', nargs='+', type=int, default=list(default_ports),
+                        help='Keep the sockets with one of these local or remote ports.')
+    args = parser.parse_args()
+    if not 1 <= args.interval <= 100:
+        parser.error('the interval must be between 1 and 100 ms')
+    record(args.output, args.ports, args.interval / 1000.0)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from churn import event_impact, parse_events
+from udpprobe import record_dtype
+
+
+def probe_records(count, rate, start, lost=(), delay=0.01):
+    seqs = np.array([s for s in range(count) if s not in set(lost)])
+    records = np.zeros(len(seqs), dtype=record_dtype)
+    records['seq'] = seqs
+    records['sent'] = start + seqs / float(rate)
+    records['recv'] = records['sent'] + delay
+    return records
+
+
+def test_event_impact_outage_and_reordering():
+    start, rate, count = 1000.0, 100, 300
+    records = probe_records(count, rate, start, lost=range(120, 150))
+    # 251 overtakes 250.
+    i250, i251 = np.flatnonzero(records['seq'] == 250)[0], np.flatnonzero(records['seq'] == 251)[0]
+    records['recv'][i251] = records['recv'][i250] - 0.001
+    rows = event_impact(records, start, rate, count, [(1001.0, 'down r1-r2'), (1002.0, 'up r1-r2')],
+                        start + count / float(rate))
+    baseline, down, up = rows
+    assert baseline['event'] == 'baseline'
+    assert (baseline['sent'], baseline['lost'], baseline['outage_ms']) == (100, 0, 0.0)
+    assert (down['sent'], down['lost']) == (100, 30)
+    assert down['loss_pct'] == pytest.approx(30.0)
+    assert down['outage_ms'] == pytest.approx(300.0)
+    assert down['outage_start_ms'] == pytest.approx(200.0)
+    assert down['reordered'] == 0
+    assert up['reordered'] == 1
+    assert up['delay_ms'] == pytest.approx(10.0)
+
+
+def test_event_impact_outage_open_before_the_event():
+    # The gap starts before the event, so it is measured whole from the last packet received.
+    start, rate, count = 1000.0, 100, 200
+    records = probe_records(count, rate, start, lost=range(90, 110))
+    rows = event_impact(records, start, rate, count, [(1001.0, 'down r1-r2')], start + count / float(rate))
+    assert rows[1]['lost'] == 10
+    assert rows[1]['outage_ms'] == pytest.approx(200.0)
+    assert rows[1]['outage_start_ms'] == pytest.approx(-100.0)
+
+
+def test_parse_events_expands_flaps():
+    events = parse_events(['10 flap r1 r2 2 1 3', '# comment', '1 down r2 r3'])
+    assert [(t, action) for t, action, _, _, _ in events] == [(1, 'down'), (10, 'down'), (11, 'up'), (14, 'down'),
+                                                             (15, 'up')]
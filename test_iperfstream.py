@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+
+from iperfstream import FlowRing, JsonStream, interval_dtype, read_json_stream
+
+
+def interval_row(t):
+    row = np.zeros(1, dtype=interval_dtype)[0]
+    row['time'] = t
+    return row
+
+
+def test_flow_ring_wraps_around():
+    ring = FlowRing(4)
+    for t in range(6):
+        ring.append(interval_row(t))
+    assert len(ring) == 4
+    assert ring.dropped() == 2
+    assert list(ring.view()['time']) == [2, 3, 4, 5]
+    assert list(ring.view(last=2)['time']) == [4, 5]
+
+
+def test_flow_ring_before_wrapping():
+    ring = FlowRing(4)
+    for t in range(3):
+        ring.append(interval_row(t))
+    assert ring.dropped() == 0
+    assert list(ring.view()['time']) == [0, 1, 2]
+    assert list(ring.view(last=1)['time']) == [2]
+
+
+def json_stream_lines(intervals=5):
+    # What iperf3 -P 2 --json-stream prints: start, one interval per second, end; plus a stray warning.
+    events = [dict(event='start', data=dict(timestamp=dict(timesecs=1000)))]
+    for i in range(intervals):
+        streams = [dict(snd_cwnd=100, rtt=40000, rttvar=1000), dict(snd_cwnd=50, rtt=42000, rttvar=3000)]
+        events.append(dict(event='interval', data=dict(
+            streams=streams, sum=dict(end=i + 1.0, seconds=1.0, bytes=1000 * (i + 1), bits_per_second=8e6 * (i + 1),
+                                      retransmits=i))))
+    events.append(dict(event='end', data=dict(sum_sent=dict(bytes=15000), sum_received=dict(bytes=14000))))
+    lines = [json.dumps(e).encode() for e in events]
+    return b'\n'.join(lines[:2] + [b'iperf3: warning - something'] + lines[2:]) + b'\n'
+
+
+def test_json_stream_in_any_chunking():
+    data = json_stream_lines()
+    whole = JsonStream('h1')
+    whole.feed(data)
+    whole.close()
+    chunked = JsonStream('h1')
+    for i in range(0, len(data), 7):
+        chunked.feed(data[i:i + 7])
+    chunked.close()
+    rows = whole.ring.view()
+    assert np.array_equal(rows, chunked.ring.view())
+    assert list(rows['time']) == [1001, 1002, 1003, 1004, 1005]
+    assert list(rows['Mbps']) == [8, 16, 24, 32, 40]
+    assert list(rows['cwnd']) == [150] * 5
+    assert list(rows['rtt']) == [41000] * 5
+    assert chunked.summary == dict(sum_sent=dict(bytes=15000), sum_received=dict(bytes=14000))
+    assert chunked.error is None
+
+
+def test_json_stream_keeps_the_last_intervals():
+    stream = JsonStream('h1', capacity=2)
+    stream.feed(json_stream_lines())
+    stream.close()
+    assert stream.ring.count == 5
+    assert list(stream.ring.view()['time']) == [1004, 1005]
+
+
+def test_read_json_stream_without_trailing_newline(tmp_path):
+    path = tmp_path / 'iperf3.json'
+    path.write_bytes(json_stream_lines().rstrip(b'\n'))
+    stream = read_json_stream(str(path), 'h1')
+    assert stream.ring.count == 5
+    assert stream.summary is not None
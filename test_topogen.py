@@ -0,0 +1,30 @@
+import ipaddress
+
+from topogen import compile_spec, ring, static_routes
+
+
+def subnet_of(model, host):
+    return str(ipaddress.ip_interface(model['hosts'][host]['ip']).network)
+
+
+def test_static_routes_reach_every_subnet():
+    model = compile_spec(ring(4))
+    subnets = dict((str(ipaddress.ip_interface(link['ips'][0]).network), link['nodes']) for link in model['links'])
+    for router, table in static_routes(model).items():
+        # One route, with a single next hop, for every subnet the router is not attached to.
+        assert set(subnet for subnet, _ in table) == set(s for s, nodes in subnets.items() if router not in nodes)
+        assert all(len(nexthops) == 1 for _, nexthops in table)
+
+
+def test_static_routes_ecmp_uses_both_ways_round_the_ring():
+    model = compile_spec(ring(4))
+    h2 = subnet_of(model, 'h2')
+    single = dict(static_routes(model)['r1'])[h2]
+    ecmp = dict(static_routes(model, multipath=True)['r1'])[h2]
+    assert len(single) == 1
+    assert len(ecmp) == 2
+    assert single[0] == ecmp[0]
+    assert set(intf for _, intf in ecmp) == {'r1-eth2', 'r1-eth3'}
+    # One hop away there is only one shortest path, with or without ECMP.
+    h1 = subnet_of(model, 'h1')
+    assert len(dict(static_routes(model, multipath=True)['r2'])[h1]) == 1
@@ -0,0 +1,107 @@
+import numpy as np
+
+import sockstats
+from analysis import default_host_addrs, parse_tcpprobe_data
+from live import SockstatsFollower
+from traces import parse_iperf, parse_sockstats, parse_tcpprobe, sockstats_origin
+
+
+def write_log(path, records):
+    with open(path, 'wb') as f:
+        f.write(sockstats.log_magic)
+        records.tofile(f)
+
+
+def two_socket_log(path):
+    # An iperf3 sender's log: the idle control connection and the bulk flow, both to port 5001,
+    # sampled together; the control connection shows up first.
+    records = np.zeros(7, dtype=sockstats.record_dtype)
+    records['time'] = [9.5, 10, 10, 11, 11, 12, 12]
+    records['sport'] = [40000, 40000, 40002, 40000, 40002, 40000, 40002]
+    records['dport'] = 5001
+    records['cwnd'] = [10, 10, 100, 10, 120, 10, 90]
+    records['retrans'] = [0, 0, 1, 0, 3, 0, 4]
+    records['bytes_acked'] = [50, 100, 10 ** 6, 150, 2 * 10 ** 6, 200, 3 * 10 ** 6]
+    write_log(str(path), records)
+    return str(path)
+
+
+def test_parse_sockstats_keeps_data_connection(tmp_path):
+    files = dict(h1=two_socket_log(tmp_path / 'sockstats_cubic_h1_21ms.bin'))
+    data = parse_sockstats(files)
+    assert list(data['h1']['cwnd']) == [100, 120, 90]
+    assert list(data['h1']['retrans']) == [1, 3, 4]
+    assert set(data['h1']['sport']) == {40002}
+    assert list(data['h1']['time']) == [0.0, 1.0, 2.0]
+    assert sockstats_origin(files) == 10.0
+
+
+def test_sockstats_follower_reports_data_connection(tmp_path):
+    follower = SockstatsFollower('h1', two_socket_log(tmp_path / 'sockstats_cubic_h1_21ms.bin'))
+    assert follower.poll() == [('h1', dict(time=12.0, cwnd=90, srtt=0, retrans=4))]
+
+
+def write_tcpprobe(path):
+    # Both senders, the receivers' ack-direction sockets and a host whose address starts like h1's.
+    rows = [(1000.0, '10.0.0.1', 10), (1000.1, '10.0.0.2', 7), (1000.2, '10.0.0.3', 20), (1000.3, '10.0.0.10', 99),
+            (1000.4, '10.0.0.1', 11), (1000.5, '10.0.0.4', 8), (1000.6, '10.0.0.3', 21)]
+    with open(str(path), 'w') as f:
+        for t, addr, cwnd in rows:
+            f.write('{0:.9f} {1}:5001 10.0.0.254:40000 1448 0x0 0x0 {2} 2147483647 29312 42000 29312\n'
+                    .format(t, addr, cwnd))
+        f.write('1000.7 10.0.0.1:5001 truncated\n')
+    return str(path)
+
+
+def test_parse_tcpprobe_filters_by_flow(tmp_path):
+    data = parse_tcpprobe(write_tcpprobe(tmp_path / 'tcpprobe.txt'), dict(h1='10.0.0.1', h3='10.0.0.3'))
+    assert sorted(data) == ['h1', 'h3']
+    assert list(data['h1']['cwnd']) == [10, 11]
+    assert list(data['h3']['cwnd']) == [20, 21]
+    assert np.allclose(data['h1']['time'], [0.0, 0.4])
+    assert np.allclose(data['h3']['time'], [0.2, 0.6])
+    assert list(data['h1']['srtt']) == [42000, 42000]
+
+
+def test_parse_tcpprobe_data_leaves_out_receivers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_tcpprobe(tmp_path / 'tcpprobe_cubic_21ms.txt')
+    data = parse_tcpprobe_data('cubic', 21, default_host_addrs(), use_cache=False)
+    assert sorted(data) == ['h1', 'h3']
+
+
+def write_iperf(path, rows):
+    with open(str(path), 'w') as f:
+        for stamp, transfer, interval, nbytes, bps in rows:
+            f.write('{0},10.0.0.1,40000,10.0.0.2,5001,{1},{2},{3},{4}\n'.format(stamp, transfer, interval, nbytes, bps))
+    return str(path)
+
+
+def test_parse_iperf_prefers_sum_rows(tmp_path):
+    # A -P 2 run: two transfers, their SUM (-1) rows and the whole-run summaries.
+    rows = []
+    for i in range(2):
+        stamp = 20211201035745 + i
+        interval = '{0:.1f}-{1:.1f}'.format(i, i + 1)
+        rows += [(stamp, 3, interval, 1000, 8000), (stamp, 4, interval, 3000, 24000),
+                 (stamp, -1, interval, 4000, 32000)]
+    rows += [(20211201035747, 3, '0.0-2.0', 2000, 8000), (20211201035747, -1, '0.0-2.0', 8000, 32000)]
+    data = parse_iperf(dict(h1=write_iperf(tmp_path / 'iperf.txt', rows)))
+    assert list(data['h1']['time']) == [0.0, 1.0]
+    assert list(data['h1']['bytes']) == [4000, 4000]
+    assert np.allclose(data['h1']['Mbps'], [0.032, 0.032])
+
+
+def test_parse_iperf_sums_transfers_without_sum_rows(tmp_path):
+    # Two flows on one time base; h3 starts a second later and runs two transfers but no SUM rows.
+    h1 = write_iperf(tmp_path / 'h1.txt', [(20211201035745, 5, '0.0-1.0', 1000, 8000),
+                                           (20211201035746, 5, '1.0-2.0', 2000, 16000),
+                                           (20211201035746, 5, '0.0-2.0', 3000, 12000)])
+    h3 = write_iperf(tmp_path / 'h3.txt', [(20211201035746, 6, '0.0-1.0', 1000, 8000),
+                                           (20211201035746, 7, '0.0-1.0', 500, 4000)])
+    data = parse_iperf(dict(h1=h1, h3=h3))
+    assert list(data['h1']['time']) == [0.0, 1.0]
+    assert list(data['h1']['bytes']) == [1000, 2000]
+    assert list(data['h3']['time']) == [1.0]
+    assert list(data['h3']['bytes']) == [1500]
+    assert np.allclose(data['h3']['Mbps'], [0.012])
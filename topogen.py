@@ -0,0 +1,253 @@
+from collections import deque
+import ipaddress
+import json
+import os
+import random
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+topologies_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topologies')
+
+# A spec lists routers, the routers hosts hang off, and router-router links:
+#   {"routers": ["r1", "r2"], "hosts": {"h1": "r1"}, "links": [["r1", "r2"]]}
+# Routers may be a {name: {"ip": ...}} dict, hosts may be {name: {"router", "ip", "router_ip",
+# "intf", "router_intf"}} and links {"nodes", "intfs", "ips"} to pin names and addresses;
+# everything not given is allocated: /24 LANs from lan_pool, /30 (p2p_prefixlen) links from p2p_pool.
+# Hosts and links may also name a shaping "profile" (see shaping.py); a top-level "profiles" dict
+# defines extra ones. Routers may set an OSPF "area" and a BGP "asn", links an OSPF "area" and "cost"
+# (see birdconf.py).
+default_lan_pool = '10.0.0.0/9'
+default_p2p_pool = '10.128.0.0/9'
+
+
+def load_spec(path):
+    if not os.path.exists(path) and os.path.exists(os.path.join(topologies_dir, path)):
+        path = os.path.join(topologies_dir, path)
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError('PyYAML is needed to read {0}; use a .json spec instead'.format(path))
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def line(n):
+    routers = ['r{0}'.format(i) for i in range(1, n + 1)]
+    return dict(routers=routers, links=list(zip(routers, routers[1:])), hosts={'h1': routers[0], 'h2': routers[-1]})
+
+
+def ring(n):
+    spec = line(n)
+    if n > 2:
+        spec['links'].append((spec['routers'][-1], spec['routers'][0]))
+    spec['hosts'] = {'h1': 'r1', 'h2': 'r{0}'.format(n // 2 + 1)}
+    return spec
+
+
+def grid(rows, cols):
+    name = lambda i, j: 'r{0}'.format(i * cols + j + 1)
+    links = []
+    for i in range(rows):
+        for j in range(cols):
+            if j + 1 < cols:
+                links.append((name(i, j), name(i, j + 1)))
+            if i + 1 < rows:
+                links.append((name(i, j), name(i + 1, j)))
+    return dict(routers=[name(i, j) for i in range(rows) for j in range(cols)], links=links,
+                hosts={'h1': name(0, 0), 'h2': name(rows - 1, cols - 1)})
+
+
+def fat_tree(k):
+    # k-ary fat tree of routers: (k/2)^2 core, k pods of k/2 aggregation and k/2 edge routers.
+    half = k // 2
+    core = ['c{0}'.format(i + 1) for i in range(half * half)]
+    links = []
+    edges = []
+    for pod in range(k):
+        aggs = ['a{0}_{1}'.format(pod + 1, i + 1) for i in range(half)]
+        pod_edges = ['e{0}_{1}'.format(pod + 1, i + 1) for i in range(half)]
+        for i, agg in enumerate(aggs):
+            links.extend((agg, core[i * half + j]) for j in range(half))
+            links.extend((agg, edge) for edge in pod_edges)
+        core.extend(aggs)
+        edges.extend(pod_edges)
+    return dict(routers=core + edges, links=links, hosts={'h1': edges[0], 'h2': edges[-1]})
+
+
+def random_graph(n, degree=3, seed=1):
+    # Connected random graph: a random spanning tree plus random extra links up to `degree` on average.
+    rnd = random.Random(seed)
+    routers = ['r{0}'.format(i) for i in range(1, n + 1)]
+    edges = set()
+    for i in range(1, n):
+        edges.add((rnd.randrange(i), i))
+    target = min(n * degree // 2, n * (n - 1) // 2)
+    while len(edges) < target:
+        a, b = rnd.randrange(n), rnd.randrange(n)
+        if a != b:
+            edges.add((min(a, b), max(a, b)))
+    return dict(routers=routers, links=[(routers[a], routers[b]) for a, b in sorted(edges)],
+                hosts={'h1': routers[0], 'h2': routers[-1]})
+
+
+generators = dict(line=line, ring=ring, grid=grid, fat_tree=fat_tree, random=random_graph)
+
+
+def _subnets(pool, prefixlen, used):
+    for subnet in ipaddress.ip_network(pool).subnets(new_prefix=prefixlen):
+        if not any(subnet.overlaps(u) for u in used):
+            yield subnet
+
+
+def compile_spec(spec):
+    # Turn a spec into the model SpecTopo builds, in O(V+E):
+    #   {'routers': {name: {'ip'}}, 'hosts': {name: {'ip', 'router', 'gateway'}},
+    #    'links': [{'nodes': (a, b), 'intfs': (a-ethX, b-ethY), 'ips': (ip/len, ip/len)}]}
+    routers = spec['routers']
+    routers = dict((r, dict(routers[r] or {})) for r in routers) if isinstance(routers, dict) \
+        else dict((r, dict()) for r in routers)
+    hosts = dict((h, opts if isinstance(opts, dict) else dict(router=opts)) for h, opts in spec.get('hosts', {}).items())
+    links = [link if isinstance(link, dict) else dict(nodes=list(link)) for link in spec.get('links', [])]
+
+    # Explicit addresses reserve their subnets so the pools never hand them out again.
+    used = set()
+    for opts in hosts.values():
+        if opts.get('ip'):
+            used.add(ipaddress.ip_interface(opts['ip']).network)
+    for link in links:
+        for ip in link.get('ips') or []:
+            used.add(ipaddress.ip_interface(ip).network)
+    lans = _subnets(spec.get('lan_pool', default_lan_pool), 24, used)
+    p2ps = _subnets(spec.get('p2p_pool', default_p2p_pool), spec.get('p2p_prefixlen', 30), used)
+
+    intf_names = dict()
+    ports = dict()
+
+    def intf_name(node, name=None):
+        taken = intf_names.setdefault(node, set())
+        if name is None:
+            # Routers number their interfaces from eth1, hosts from eth0, as the hand-written scripts do.
+            port = ports.get(node, 0 if node in hosts else 1)
+            while '{0}-eth{1}'.format(node, port) in taken:
+                port += 1
+            ports[node] = port + 1
+            name = '{0}-eth{1}'.format(node, port)
+        taken.add(name)
+        return name
+
+    model = dict(routers=dict(), hosts=dict(), links=[])
+    for host, opts in sorted(hosts.items()):
+        router = opts['router']
+        if opts.get('ip'):
+            host_ip = ipaddress.ip_interface(opts['ip'])
+            router_ip = ipaddress.ip_interface(opts.get('router_ip') or
+                                               '{0}/{1}'.format(next(host_ip.network.hosts()), host_ip.network.prefixlen))
+        else:
+            lan = next(lans)
+            addrs = lan.hosts()
+            router_ip = ipaddress.ip_interface('{0}/{1}'.format(next(addrs), lan.prefixlen))
+            host_ip = ipaddress.ip_interface('{0}/{1}'.format(next(addrs), lan.prefixlen))
+        model['hosts'][host] = dict(ip=str(host_ip), router=router, gateway=str(router_ip.ip))
+        model['links'].append(dict(nodes=(host, router),
+                                   intfs=(intf_name(host, opts.get('intf')), intf_name(router, opts.get('router_intf'))),
+                                   ips=(str(host_ip), str(router_ip))))
+        if opts.get('profile'):
+            model['links'][-1]['profile'] = opts['profile']
+    for link in links:
+        a, b = link['nodes']
+        ips = link.get('ips')
+        if not ips:
+            p2p = next(p2ps)
+            addrs = p2p.hosts()
+            ips = ['{0}/{1}'.format(next(addrs), p2p.prefixlen), '{0}/{1}'.format(next(addrs), p2p.prefixlen)]
+        intfs = link.get('intfs') or (None, None)
+        model['links'].append(dict(nodes=(a, b), intfs=(intf_name(a, intfs[0]), intf_name(b, intfs[1])),
+                                   ips=tuple(ips)))
+        for key in ('profile', 'area', 'cost'):
+            if link.get(key) is not None:
+                model['links'][-1][key] = link[key]
+    for link in model['links']:
+        for node, ip in zip(link['nodes'], link['ips']):
+            # Mininet puts a node's `ip` on its first interface, so it has to be that interface's address.
+            if node in routers and 'ip' not in model['routers'].setdefault(node, dict()):
+                model['routers'][node]['ip'] = routers[node].get('ip') or ip
+    for router in routers:
+        model['routers'].setdefault(router, dict(ip=routers[router].get('ip')))
+        # Anything else a router sets (OSPF 'area', BGP 'asn', ...) is passed through for the config generators.
+        model['routers'][router].update((k, v) for k, v in routers[router].items() if k != 'ip')
+    if spec.get('profiles'):
+        model['profiles'] = spec['profiles']
+    return model
+
+
+def router_graph(model):
+    # {router: [(neighbour, local intf, neighbour's address on the link)]} in link order; hosts do not forward.
+    graph = dict((router, []) for router in model['routers'])
+    for link in model['links']:
+        (a, b), (intf_a, intf_b), (ip_a, ip_b) = link['nodes'], link['intfs'], link['ips']
+        if a in graph and b in graph:
+            graph[a].append((b, intf_a, str(ipaddress.ip_interface(ip_b).ip)))
+            graph[b].append((a, intf_b, str(ipaddress.ip_interface(ip_a).ip)))
+    return graph
+
+
+def hop_counts(graph):
+    # All-pairs shortest paths in hops: one BFS per router, O(V * (V + E)).
+    dist = dict()
+    for source in graph:
+        seen = {source: 0}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for neighbour, _, _ in graph[node]:
+                if neighbour not in seen:
+                    seen[neighbour] = seen[node] + 1
+                    queue.append(neighbour)
+        dist[source] = seen
+    return dist
+
+
+def static_routes(model, multipath=False):
+    # Shortest-path static routes for every router: {router: [(subnet, [(gateway, intf)])]} for each
+    # subnet it is not attached to. The next hops are the neighbours one hop closer to the nearest
+    # router attached to the subnet: the first of them in link order, or all of them with multipath (ECMP).
+    graph = router_graph(model)
+    dist = hop_counts(graph)
+    subnets = []
+    for link in model['links']:
+        attached = [node for node in link['nodes'] if node in graph]
+        subnets.append((str(ipaddress.ip_interface(link['ips'][0]).network), attached))
+    routes = dict((router, []) for router in graph)
+    for subnet, attached in subnets:
+        # Distance of every router to the subnet; dist is symmetric, so the attached routers' BFS suffice.
+        to_subnet = dict()
+        for a in attached:
+            for node, hops in dist[a].items():
+                if hops < to_subnet.get(node, hops + 1):
+                    to_subnet[node] = hops
+        for router, hops in to_subnet.items():
+            if hops == 0:
+                continue
+            nexthops = []
+            for neighbour, intf, gateway in graph[router]:
+                if to_subnet.get(neighbour) == hops - 1 and (gateway, intf) not in nexthops:
+                    nexthops.append((gateway, intf))
+                    if not multipath:
+                        break
+            routes[router].append((subnet, nexthops))
+    return routes
+
+
+def route_batch_lines(routes):
+    # `ip -batch` input installing one router's routes; replace keeps it idempotent on a reused net.
+    lines = []
+    for subnet, nexthops in routes:
+        if len(nexthops) == 1:
+            lines.append('route replace {0} via {1} dev {2}'.format(subnet, *nexthops[0]))
+        else:
+            lines.append('route replace {0} {1}'.format(subnet, ' '.join(
+                'nexthop via {0} dev {1} weight 1'.format(gateway, intf) for gateway, intf in nexthops)))
+    return lines
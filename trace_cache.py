@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import traces
+
+cache_dir = os.environ.get('FCN_TRACE_CACHE', '.trace_cache')
+max_cache_bytes = int(os.environ.get('FCN_TRACE_CACHE_BYTES', 512 * 1024 * 1024))
+
+
+def _file_key(filename, hash_content):
+    st = os.stat(filename)
+    key = [os.path.abspath(filename), st.st_size, st.st_mtime_ns]
+    if hash_content:
+        digest = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        key.append(digest.hexdigest())
+    return key
+
+
+def cache_key(kind, filenames, params, hash_content=False):
+    # Raw file identity (path, size, mtime and optionally content) + parser version + parser arguments.
+    key = [kind, traces.parser_version, params, [_file_key(f, hash_content) for f in filenames]]
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _load(path):
+    data = dict()
+    with np.load(path) as npz:
+        for name in npz.files:
+            flow, _, col = name.partition('/')
+            data.setdefault(flow, dict())[col] = npz[name]
+    os.utime(path)  # mtime doubles as the LRU clock for evict()
+    return data
+
+
+def _store(path, data):
+    arrays = dict(('{0}/{1}'.format(flow, col), values)
+                  for flow, cols in data.items() for col, values in cols.items())
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def evict(limit=None):
+    # Drop least recently used entries until the cache fits in `limit` bytes.
+    limit = max_cache_bytes if limit is None else limit
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz'):
+            st = os.stat(os.path.join(cache_dir, name))
+            entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= limit:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
+
+
+def load_or_parse(kind, filenames, params, parse, hash_content=False):
+    # Return parse() for the given raw files, going through the on-disk .npz cache.
+    path = os.path.join(cache_dir, '{0}_{1}.npz'.format(kind, cache_key(kind, filenames, params, hash_content)))
+    if os.path.exists(path):
+        try:
+            return _load(path)
+        except (OSError, ValueError):
+            os.remove(path)  # truncated or corrupt entry, parse again
+    data = parse()
+    os.makedirs(cache_dir, exist_ok=True)
+    _store(path, data)
+    evict()
+    return data
+
+
+def cached_parse_tcpprobe(filename, flow_addrs, use_mmap=False, hash_content=False):
+    return load_or_parse('tcpprobe', [filename], flow_addrs,
+                         lambda: traces.parse_tcpprobe(filename, flow_addrs, use_mmap=use_mmap), hash_content)
+
+
+def cached_parse_sockstats(files, hash_content=False):
+    flows = sorted(files)
+    return load_or_parse('sockstats', [files[flow] for flow in flows], flows,
+                         lambda: traces.parse_sockstats(files), hash_content)
+
+
+def cached_parse_iperf(files, host_addrs=None, hash_content=False):
+    flows = sorted(files)
+    return load_or_parse('iperf', [files[flow] for flow in flows], [flows, host_addrs],
+                         lambda: traces.parse_iperf(files, host_addrs), hash_content)
+
+
+def cached_parse_iperf3(files, hash_content=False):
+    flows = sorted(files)
+    return load_or_parse('iperf3', [files[flow] for flow in flows], flows,
+                         lambda: traces.parse_iperf3(files), hash_content)
@@ -0,0 +1,283 @@
+import glob
+import mmap
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from time import mktime
+
+import numpy as np
+
+# Column layout of /proc/net/tcpprobe when tcp_probe is loaded with full=1.
+tcpprobe_csv_header = ['time', 'src_addr_port', 'dst_addr_port', 'bytes', 'next_seq', 'unacknowledged', 'cwnd',
+                       'slow_start', 'swnd', 'smoothedRTT', 'rwnd']
+iperf_csv_header = ['time', 'src_addr', 'src_port', 'dst_addr', 'dst_port', 'other', 'interval', 'B_sent', 'bps']
+# Columns kept by parse_tcpprobe: (name, index in a tcpprobe line, dtype).
+tcpprobe_columns = [('time', 0, np.float64), ('cwnd', 6, np.uint32), ('ssthresh', 7, np.uint32),
+                    ('srtt', 9, np.uint32)]
+chunk_size = 16 * 1024 * 1024
+# Bump whenever the output of parse_tcpprobe/parse_iperf changes; it is part of the trace_cache key.
+parser_version = 2
+
+
+def read_chunks(filename, size=chunk_size, use_mmap=False):
+    # Yield the file in blocks of roughly `size` bytes, always cut on a line boundary.
+    with open(filename, 'rb') as f:
+        if use_mmap:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # mmap refuses empty files
+            with buf:
+                start, total = 0, len(buf)
+                while start < total:
+                    end = min(start + size, total)
+                    if end < total:
+                        nl = buf.rfind(b'\n', start, end)
+                        end = nl + 1 if nl != -1 else (buf.find(b'\n', end) + 1 or total)
+                    yield buf[start:end]
+                    start = end
+            return
+        rest = b''
+        while True:
+            block = f.read(size)
+            if not block:
+                break
+            block = rest + block
+            nl = block.rfind(b'\n')
+            if nl == -1:
+                rest = block
+                continue
+            rest = block[nl + 1:]
+            yield block[:nl + 1]
+        if rest:
+            yield rest
+
+
+def parse_tcpprobe(filename, flow_addrs, size=chunk_size, use_mmap=False):
+    # Stream a tcpprobe trace and return {flow: {column: ndarray}} for the flows whose source
+    # address is in flow_addrs ({flow: 'ip'}). Times are relative to the first kept sample.
+    ncols = len(tcpprobe_csv_header)
+    needles = dict((name, (b' ' + addr.encode() + b':', addr.encode() + b':'))
+                   for name, addr in flow_addrs.items())
+    parts = dict((name, dict((col, []) for col, _, _ in tcpprobe_columns)) for name in flow_addrs)
+    for chunk in read_chunks(filename, size, use_mmap):
+        lines = chunk.split(b'\n')
+        for name, (needle, prefix) in needles.items():
+            # Only complete lines survive, so the tokens of the joined block form an ncols-wide table.
+            tokens = b' '.join([l for l in lines if needle in l and l.count(b' ') == ncols - 1]).split()
+            if not tokens:
+                continue
+            keep = np.char.startswith(np.array(tokens[1::ncols]), prefix)
+            for col, idx, dtype in tcpprobe_columns:
+                values = np.array(tokens[idx::ncols]).astype(dtype)
+                parts[name][col].append(values if keep.all() else values[keep])
+
+    data = dict()
+    for name, cols in parts.items():
+        data[name] = dict((col, np.concatenate(chunks) if chunks else np.empty(0, dtype))
+                          for (col, _, dtype), chunks in zip(tcpprobe_columns, cols.values()))
+    starts = [flow['time'][0] for flow in data.values() if len(flow['time'])]
+    if starts:
+        time_init = min(starts)
+        for flow in data.values():
+            flow['time'] -= time_init
+    return data
+
+
+@lru_cache(maxsize=4096)
+def _stamp_seconds(stamp):
+    return mktime(datetime.strptime(stamp, '%Y%m%d%H%M%S').timetuple())
+
+
+def iperf_stamp_to_epoch(stamp):
+    # iperf2 prints %Y%m%d%H%M%S, with a fractional part when run with -e.
+    seconds, _, frac = stamp.partition('.')
+    return _stamp_seconds(seconds) + (float('0.' + frac) if frac else 0.0)
+
+
+def sockstats_filename(alg, host, delay):
+    return 'sockstats_{0}_{1}_{2}ms.bin'.format(alg, host, delay)
+
+
+def sockstats_files(alg, delay, directory='.'):
+    # {sender: filename} for every sockstats_<alg>_<sender>_<delay>ms.bin of a test cell.
+    pattern = re.compile(r'sockstats_{0}_([^-_/]+)_{1}ms\.bin$'.format(re.escape(alg), delay))
+    files = dict()
+    for filename in sorted(glob.glob(os.path.join(directory, 'sockstats_{0}_*_{1}ms.bin'.format(alg, delay)))):
+        m = pattern.search(filename)
+        if m:
+            files[m.group(1)] = filename
+    return files
+
+
+def parse_sockstats(files):
+    # Load {flow: filename} socket-stats logs into {flow: {column: ndarray}}, with the columns
+    # tcpprobe gave (time, cwnd, ssthresh, srtt) and the rest of what tcp_info holds. Only the flow's
+    # data connection is kept (sockstats.data_socket). Times are relative to the first sample of any flow.
+    from sockstats import data_records, load_log, record_dtype
+    logs = dict((flow, data_records(load_log(filename))) for flow, filename in files.items())
+    starts = [log['time'][0] for log in logs.values() if len(log)]
+    time_init = min(starts) if starts else 0.0
+    data = dict()
+    for flow, log in logs.items():
+        data[flow] = dict((col, log[col].copy()) for col in record_dtype.names)
+        data[flow]['time'] -= time_init
+    return data
+
+
+def qdisc_filename(alg, delay):
+    return 'qdisc_{0}_{1}ms.bin'.format(alg, delay)
+
+
+def parse_qdiscstats(filename, time_init=None):
+    # Load a qdisc-stats log into {intf: {'role', 'limit', 'mbps', 'delay_ms', column: ndarray}}. Times
+    # are relative to the epoch `time_init` (so that they line up with another series) or else to the
+    # first sample; drops, overlimits, packets and bytes stay cumulative.
+    from qdiscstats import load_log, record_dtype
+    devs, records = load_log(filename)
+    if time_init is None:
+        time_init = records['time'][0] if len(records) else 0.0
+    data = dict()
+    for i, dev in enumerate(devs):
+        rows = records[records['dev'] == i]
+        data[dev['intf']] = dict(dict((col, rows[col].copy()) for col in record_dtype.names if col != 'dev'),
+                                 role=dev['role'], limit=dev['limit'], mbps=dev.get('mbps'),
+                                 delay_ms=dev.get('delay_ms') or 0.0)
+        data[dev['intf']]['time'] -= time_init
+    return data
+
+
+def iperf_origin(files):
+    # The epoch parse_iperf(files) takes as t=0, from the first row of every file.
+    bases = []
+    for filename in files.values():
+        with open(filename, 'r') as f:
+            for line in f:
+                row = line.rstrip().split(',')
+                if len(row) >= len(iperf_csv_header):
+                    bases.append(iperf_stamp_to_epoch(row[0]) - float(row[6].partition('-')[2]))
+                    break
+    return min(bases) if bases else None
+
+
+def iperf3_origin(files):
+    # The epoch parse_iperf3(files) takes as t=0: the earliest 'start' event.
+    import json
+    starts = []
+    for filename in files.values():
+        with open(filename, 'rb') as f:
+            for line in f:
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    continue
+                if obj.get('event') == 'start':
+                    starts.append(float(obj['data']['timestamp']['timesecs']))
+                    break
+    return min(starts) if starts else None
+
+
+def sockstats_origin(files):
+    # The epoch parse_sockstats(files) takes as t=0: the earliest first sample of a data connection.
+    from sockstats import data_records, load_log
+    starts = []
+    for filename in files.values():
+        records = data_records(load_log(filename))
+        if len(records):
+            starts.append(float(records['time'][0]))
+    return min(starts) if starts else None
+
+
+def iperf_files(alg, delay, directory='.'):
+    # {client: filename} for every iperf_<alg>_<client>-<server>_<delay>ms.txt of a test cell.
+    pattern = re.compile(r'iperf_{0}_([^-_/]+)-([^-_/]+)_{1}ms\.txt$'.format(re.escape(alg), delay))
+    files = dict()
+    for filename in sorted(glob.glob(os.path.join(directory, 'iperf_{0}_*_{1}ms.txt'.format(alg, delay)))):
+        m = pattern.search(filename)
+        if m:
+            files[m.group(1)] = filename
+    return files
+
+
+def iperf3_filename(alg, client, server, delay):
+    return 'iperf3_{0}_{1}-{2}_{3}ms.json'.format(alg, client, server, delay)
+
+
+def iperf3_files(alg, delay, directory='.'):
+    # {client: filename} for every iperf3_<alg>_<client>-<server>_<delay>ms.json of a test cell.
+    pattern = re.compile(r'iperf3_{0}_([^-_/]+)-([^-_/]+)_{1}ms\.json$'.format(re.escape(alg), delay))
+    files = dict()
+    for filename in sorted(glob.glob(os.path.join(directory, 'iperf3_{0}_*_{1}ms.json'.format(alg, delay)))):
+        m = pattern.search(filename)
+        if m:
+            files[m.group(1)] = filename
+    return files
+
+
+def parse_iperf3(files):
+    # Parse {flow: filename} iperf3 --json-stream logs into {flow: {'time', 'Mbps', 'bytes',
+    # 'retransmits', 'cwnd', 'rtt', 'rttvar'}} arrays, t=0 being the start of the earliest flow.
+    # Times are the end of each interval, as iperf3 reports them.
+    from iperfstream import interval_dtype, read_json_stream
+    rows = dict((flow, read_json_stream(filename, flow).ring.view()) for flow, filename in files.items())
+    starts = [r['time'][0] - r['seconds'][0] for r in rows.values() if len(r)]
+    time_init = min(starts) if starts else 0.0
+    data = dict()
+    for flow, r in rows.items():
+        data[flow] = dict((col, r[col].copy()) for col in interval_dtype.names if col != 'seconds')
+        data[flow]['time'] -= time_init
+        data[flow]['bytes'] = data[flow]['bytes'].astype(np.int64)
+    return data
+
+
+def _read_iperf_streams(filename, src_addr=None):
+    # Group the rows of one iperf -y C file by transfer id. The SUM rows of `-P` runs have id -1.
+    streams = dict()
+    with open(filename, 'r') as f:
+        for line in f:
+            row = line.rstrip().split(',')
+            if len(row) < len(iperf_csv_header) or (src_addr is not None and row[1] != src_addr):
+                continue
+            start, _, end = row[6].partition('-')
+            start, end = float(start), float(end)
+            stream = streams.get(row[5])
+            if stream is None:
+                # Stamps are printed at the end of the interval, so this is the epoch of the stream's t=0.
+                stream = streams[row[5]] = dict(base=iperf_stamp_to_epoch(row[0]) - end, rows=dict())
+            elif start == 0.0:
+                continue  # the whole-run summary printed when the client exits
+            rows = stream['rows']
+            prev = rows.get(start, (0, 0))
+            rows[start] = (prev[0] + int(row[7]), prev[1] + int(row[8]))
+    return streams
+
+
+def parse_iperf(files, host_addrs=None):
+    # Parse {flow: filename} iperf client logs into {flow: {'time', 'Mbps', 'bytes'}} arrays on
+    # one time base, t=0 being the start of the earliest flow. `-P` runs are reduced to their SUM rows.
+    series = dict()
+    for flow, filename in files.items():
+        streams = _read_iperf_streams(filename, host_addrs.get(flow) if host_addrs else None)
+        if not streams:
+            series[flow] = (None, dict())
+            continue
+        if '-1' in streams:
+            series[flow] = (streams['-1']['base'], streams['-1']['rows'])
+            continue
+        rows = dict()
+        for stream in streams.values():
+            for start, (nbytes, bps) in stream['rows'].items():
+                prev = rows.get(start, (0, 0))
+                rows[start] = (prev[0] + nbytes, prev[1] + bps)
+        series[flow] = (min(stream['base'] for stream in streams.values()), rows)
+
+    bases = [base for base, _ in series.values() if base is not None]
+    time_init = min(bases) if bases else 0.0
+    data = dict()
+    for flow, (base, rows) in series.items():
+        starts = sorted(rows)
+        data[flow] = dict(time=np.array(starts, dtype=np.float64) + ((time_init if base is None else base) - time_init),
+                          Mbps=np.array([rows[s][1] for s in starts], dtype=np.float64) / 1000000,
+                          bytes=np.array([rows[s][0] for s in starts], dtype=np.int64))
+    return data
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+import argparse
+import signal
+import socket
+import struct
+from time import sleep, time
+
+import numpy as np
+
+# A timestamped UDP probe stream. The sender puts (sequence number, send time) in every datagram on a
+# fixed schedule, seq i due at start + i / rate, so a lost packet's send time is known too. The receiver
+# appends (seq, send time, receive time) records to a binary file. Mininet hosts share the root
+# namespace's clock, so receive - send is the one-way delay.
+packet = struct.Struct('!Qd')
+record_dtype = np.dtype([('seq', '<u8'), ('sent', '<f8'), ('recv', '<f8')])
+_record = struct.Struct('<Qdd')
+
+
+def send(dst, port, rate, duration, size=64):
+    # Prints "start rate count" once done, for the analysis to know what was sent.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    pad = b'\0' * max(0, size - packet.size)
+    interval = 1.0 / rate
+    start = time()
+    end = start + duration
+    seq = 0
+    while start + seq * interval < end:
+        delay = start + seq * interval - time()
+        if delay > 0:
+            sleep(delay)
+        try:
+            sock.sendto(packet.pack(seq, time()) + pad, (dst, port))
+        except OSError:
+            pass  # no route while the network reconverges: the packet is lost like any other
+        seq += 1
+    print('{0!r} {1!r} {2}'.format(start, rate, seq), flush=True)
+
+
+def receive(port, filename):
+    # Record until SIGTERM/SIGINT.
+    stop = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.append(True))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+    sock.bind(('', port))
+    sock.settimeout(0.2)
+    with open(filename, 'wb') as f:
+        while not stop:
+            try:
+                data = sock.recv(2048)
+            except (socket.timeout, InterruptedError):
+                continue
+            seq, sent = packet.unpack_from(data)
+            f.write(_record.pack(seq, sent, time()))
+
+
+def load_records(filename):
+    return np.fromfile(filename, dtype=record_dtype)
+
+
+def parse_sender_output(output):
+    # The sender's "start rate count" line -> (start, rate, count).
+    start, rate, count = output.split()[-3:]
+    return float(start), float(rate), int(count)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Timestamped UDP probe stream.')
+    sub = parser.add_subparsers(dest='mode')
+    p = sub.add_parser('send')
+    p.add_argument('dst')
+    p.add_argument('-p', '--port', type=int, default=5201)
+    p.add_argument('-r', '--rate', type=float, default=1000, help='Packets per second.')
+    p.add_argument('-t', '--time', type=float, default=30, help='Seconds to send for.')
+    p.add_argument('-s', '--size', type=int, default=64, help='UDP payload bytes.')
+    p = sub.add_parser('recv')
+    p.add_argument('output')
+    p.add_argument('-p', '--port', type=int, default=5201)
+    args = parser.parse_args()
+    if args.mode == 'send':
+        send(args.dst, args.port, args.rate, args.time, args.size)
+    elif args.mode == 'recv':
+        receive(args.port, args.output)
+    else:
+        parser.error('choose send or recv')